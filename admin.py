@@ -1,89 +1,176 @@
-import condottieri_events.models as events
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from django.utils.translation import ugettext_lazy as _
+
+import condottieri_events.models as events
+
+## tables with more rows than this are counted with the planner estimate
+ESTIMATE_THRESHOLD = getattr(settings, 'EVENTS_ADMIN_ESTIMATE_THRESHOLD', 100000)
+## number of recent games offered in the game filter
+GAME_FILTER_SIZE = getattr(settings, 'EVENTS_ADMIN_GAME_FILTER_SIZE', 20)
+
+class EstimatedCountPaginator(Paginator):
+	"""
+Paginator that, for unfiltered querysets in PostgreSQL, takes the number of
+rows from the planner statistics instead of counting the whole table.
+	"""
+	@cached_property
+	def count(self):
+		query = self.object_list.query
+		if not query.where:
+			estimate = self._estimate(self.object_list)
+			if estimate is not None and estimate > ESTIMATE_THRESHOLD:
+				return estimate
+		return self.object_list.count()
+
+	def _estimate(self, queryset):
+		connection = connections[queryset.db]
+		if connection.vendor != 'postgresql':
+			return None
+		with connection.cursor() as cursor:
+			cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s",
+				[queryset.model._meta.db_table])
+			row = cursor.fetchone()
+		if row is None:
+			return None
+		return int(row[0])
+
+class GameFilter(admin.SimpleListFilter):
+	""" Filters by game, offering only the most recent games with events.
+	Any other game can be selected with the ?game=<id> parameter. """
+	title = _('game')
+	parameter_name = 'game'
+
+	def lookups(self, request, model_admin):
+		games = events.SeasonIndex.objects.order_by('-game').values_list(
+			'game', flat=True).distinct()[:GAME_FILTER_SIZE]
+		lookups = [(str(g), str(g)) for g in games]
+		if self.value() and not self.value() in [l[0] for l in lookups]:
+			lookups.insert(0, (self.value(), self.value()))
+		return lookups
+
+	def queryset(self, request, queryset):
+		if self.value():
+			return queryset.filter(game__id=self.value())
+		return queryset
+
+class YearFilter(admin.SimpleListFilter):
+	""" Filters by year, reading the years from the season index instead of
+	the events table """
+	title = _('year')
+	parameter_name = 'year'
+
+	def lookups(self, request, model_admin):
+		years = events.SeasonIndex.objects.order_by('year').values_list(
+			'year', flat=True).distinct()
+		return [(str(y), str(y)) for y in years]
 
-class BaseEventAdmin(admin.ModelAdmin):
+	def queryset(self, request, queryset):
+		if self.value():
+			return queryset.filter(year=self.value())
+		return queryset
+
+class ConcreteChangeList(ChangeList):
+	""" ChangeList that loads the concrete events of a page in batches """
+	def get_results(self, request):
+		super(ConcreteChangeList, self).get_results(request)
+		parents = list(self.result_list)
+		self.result_list = events.load_concrete(parents)
+		for parent, child in zip(parents, self.result_list):
+			## keep the game loaded by list_select_related
+			child.game = parent.game
+
+class EventAdmin(admin.ModelAdmin):
 	ordering = ['-year']
 	list_per_page = 20
+	list_select_related = ('game',)
+	show_full_result_count = False
+	paginator = EstimatedCountPaginator
+	raw_id_fields = ('game',)
+
+class BaseEventAdmin(EventAdmin):
 	list_display = ('game', '__str__', 'year', 'season', 'phase')
-	list_filter = ('game', 'year', 'season', 'phase')
+	list_filter = (GameFilter, YearFilter, 'season', 'phase')
 
-class NewUnitEventAdmin(admin.ModelAdmin):
-	ordering = ['-year']
-	list_per_page = 20
+	def get_changelist(self, request, **kwargs):
+		return ConcreteChangeList
+
+class NewUnitEventAdmin(EventAdmin):
 	list_display = ('game', '__str__', 'year')
-	list_filter = ('game', 'year')
+	list_filter = (GameFilter, YearFilter)
+	raw_id_fields = ('game', 'country', 'area')
 
-class DisbandEventAdmin(admin.ModelAdmin):
-	ordering = ['-year']
-	list_per_page = 20
+class DisbandEventAdmin(EventAdmin):
 	list_display = ('game', '__str__', 'year', 'season', 'phase')
-	list_filter = ('game', 'year', 'season', 'phase')
+	list_filter = (GameFilter, YearFilter, 'season', 'phase')
+	raw_id_fields = ('game', 'country', 'area')
 
-class OrderEventAdmin(admin.ModelAdmin):
-	ordering = ['-year']
-	list_per_page = 20
+class OrderEventAdmin(EventAdmin):
 	list_display = ('game', 'country', '__str__', 'year', 'season')
-	list_filter = ('game', 'country', 'year', 'season')
+	list_filter = (GameFilter, 'country', YearFilter, 'season')
+	list_select_related = ('game', 'country')
+	raw_id_fields = ('game', 'country', 'origin', 'destination', 'suborigin',
+		'subdestination')
 
-class StandoffEventAdmin(admin.ModelAdmin):
-	ordering = ['-year']
-	list_per_page = 20
+class StandoffEventAdmin(EventAdmin):
 	list_display = ('game', '__str__', 'year', 'season')
-	list_filter = ('game', 'year', 'season')
+	list_filter = (GameFilter, YearFilter, 'season')
+	raw_id_fields = ('game', 'area')
 
-class ConversionEventAdmin(admin.ModelAdmin):
-	ordering = ['-year']
-	list_per_page = 20
+class ConversionEventAdmin(EventAdmin):
 	list_display = ('game', '__str__', 'year', 'season', 'phase')
-	list_filter = ('game', 'year', 'season', 'phase')
+	list_filter = (GameFilter, YearFilter, 'season', 'phase')
+	raw_id_fields = ('game', 'country', 'area')
 
-class ControlEventAdmin(admin.ModelAdmin):
-	ordering = ['-year']
-	list_per_page = 20
+class ControlEventAdmin(EventAdmin):
 	list_display = ('game', '__str__', 'year')
-	list_filter = ('game', 'year')
+	list_filter = (GameFilter, YearFilter)
+	raw_id_fields = ('game', 'country', 'area')
 
-class MovementEventAdmin(admin.ModelAdmin):
-	ordering = ['-year']
-	list_per_page = 20
+class MovementEventAdmin(EventAdmin):
 	list_display = ('game', '__str__', 'year', 'season', 'phase')
-	list_filter = ('game', 'year', 'season', 'phase')
+	list_filter = (GameFilter, YearFilter, 'season', 'phase')
+	raw_id_fields = ('game', 'country', 'origin', 'destination')
 
-class RetreatEventAdmin(admin.ModelAdmin):
-	ordering = ['-year']
-	list_per_page = 20
+class RetreatEventAdmin(EventAdmin):
 	list_display = ('game', '__str__', 'year', 'season', 'phase')
-	list_filter = ('game', 'year', 'season', 'phase')
+	list_filter = (GameFilter, YearFilter, 'season', 'phase')
+	raw_id_fields = ('game', 'country', 'origin', 'destination')
 
-class UnitEventAdmin(admin.ModelAdmin):
-	ordering = ['-year']
-	list_per_page = 20
+class UnitEventAdmin(EventAdmin):
 	list_display = ('game', '__str__', 'year', 'season', 'phase')
-	list_filter = ('game', 'year', 'season', 'phase', 'message')
+	list_filter = (GameFilter, YearFilter, 'season', 'phase', 'message')
+	raw_id_fields = ('game', 'country', 'area')
 
-class CountryEventAdmin(admin.ModelAdmin):
-	ordering = ['-year']
-	list_per_page = 20
+class CountryEventAdmin(EventAdmin):
 	list_display = ('game', '__str__', 'year', 'season', 'phase')
-	list_filter = ('game', 'year', 'season', 'phase', 'message')
+	list_filter = (GameFilter, YearFilter, 'season', 'phase', 'message')
+	raw_id_fields = ('game', 'country')
 
-class DisasterEventAdmin(admin.ModelAdmin):
-	ordering = ['-year']
-	list_per_page = 20
+class DisasterEventAdmin(EventAdmin):
 	list_display = ('game', '__str__', 'year', 'season', 'phase')
-	list_filter = ('game', 'year', 'season', 'phase', 'message')
+	list_filter = (GameFilter, YearFilter, 'season', 'phase', 'message')
+	raw_id_fields = ('game', 'area')
 
-class IncomeEventAdmin(admin.ModelAdmin):
-	ordering = ['-year']
-	list_per_page = 20
+class IncomeEventAdmin(EventAdmin):
 	list_display = ('game', '__str__', 'year')
-	list_filter = ('game', 'year')
+	list_filter = (GameFilter, YearFilter)
+	raw_id_fields = ('game', 'country')
 
-class ExpenseEventAdmin(admin.ModelAdmin):
-	ordering = ['-year']
-	list_per_page = 20
+class ExpenseEventAdmin(EventAdmin):
 	list_display = ('game', '__str__', 'year')
-	list_filter = ('game', 'year')
+	list_filter = (GameFilter, YearFilter)
+	raw_id_fields = ('game', 'country', 'area')
+
+class PackedOrdersAdmin(EventAdmin):
+	list_display = ('game', 'country', 'year', 'season', 'count')
+	list_filter = (GameFilter, YearFilter, 'season')
+	list_select_related = ('game', 'country')
+	raw_id_fields = ('game', 'country')
 
 admin.site.register(events.BaseEvent, BaseEventAdmin)
 admin.site.register(events.NewUnitEvent, NewUnitEventAdmin)
@@ -99,3 +186,4 @@ admin.site.register(events.CountryEvent, CountryEventAdmin)
 admin.site.register(events.DisasterEvent, DisasterEventAdmin)
 admin.site.register(events.IncomeEvent, IncomeEventAdmin)
 admin.site.register(events.ExpenseEvent, ExpenseEventAdmin)
+admin.site.register(events.PackedOrders, PackedOrdersAdmin)
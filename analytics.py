@@ -0,0 +1,117 @@
+## Copyright (c) 2010 by Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+## This program is free software: you can redistribute it and/or modify it
+## under the terms of the GNU Affero General Public License as published by the
+## Free Software Foundation, either version 3 of the License, or (at your option
+## any later version.
+##
+## This program is distributed in the hope that it will be useful, but WITHOUT
+## ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+## FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+## for more details.
+##
+## You should have received a copy of the GNU Affero General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/agpl.txt>.
+##
+## This license is also included in the file COPYING
+##
+## AUTHOR: Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+
+
+""" This module computes statistics over the columns exported by
+columnar.py, with vectorized NumPy operations. Every function takes the
+dictionary of arrays returned by columnar.export_arrays or load_arrays.
+
+"""
+
+from condottieri_events import columnar
+from condottieri_events import models
+
+np = columnar.np
+
+ORDER = models.KIND_CODES['OrderEvent']
+STANDOFF = models.KIND_CODES['StandoffEvent']
+UNIT = models.KIND_CODES['UnitEvent']
+DISASTER = models.KIND_CODES['DisasterEvent']
+EXPENSE = models.KIND_CODES['ExpenseEvent']
+
+DISBAND = models.KIND_CODES['DisbandEvent']
+
+## kinds of bribe: the types of the expenses (see EXPENSE_MESSAGES) and the
+## messages of the UnitEvent that show that the bribe succeeded (see
+## UNIT_EVENTS). A successful disband bribe may also leave a DisbandEvent.
+BRIBES = {
+	'buy': ((6, 9), (4,)),
+	'autonomous': ((7,), (5,)),
+	'disband': ((5, 8), (2,)),
+}
+## message of DisasterEvent for famine (see DISASTER_EVENTS)
+FAMINE = 0
+
+def _counts(values):
+	""" Returns a dictionary {value: count} """
+	keys, counts = np.unique(values, return_counts=True)
+	return dict(zip(keys.tolist(), counts.tolist()))
+
+def order_codes(a):
+	""" Returns the number of orders with each code """
+	codes = a['code'][a['kind'] == ORDER]
+	return dict((chr(k), v) for k, v in _counts(codes).items())
+
+def standoffs_per_area(a):
+	""" Returns the number of standoffs in each area """
+	return _counts(a['area'][a['kind'] == STANDOFF])
+
+def famine_per_area(a):
+	""" Returns the number of famines in each area """
+	mask = (a['kind'] == DISASTER) & (a['message'] == FAMINE)
+	return _counts(a['area'][mask])
+
+def _places(a):
+	""" Returns, for each event, an integer that identifies its game, year,
+	season and area """
+	if not len(a['kind']):
+		return np.zeros(0, dtype='int64')
+	rows = np.stack([a['game'], a['year'], a['season'], a['area']], axis=1)
+	return np.unique(rows, axis=0, return_inverse=True)[1].ravel()
+
+def bribe_success(a):
+	"""
+Returns, for each kind of bribe, the number of bribes paid, the number of
+them that succeeded and the success rate. A bribe succeeds if the expected
+outcome happens in the same game, season and area; each outcome is counted
+for one bribe at most.
+	"""
+	places = _places(a)
+	size = int(places.max()) + 1 if len(places) else 0
+	expenses = a['kind'] == EXPENSE
+	units = a['kind'] == UNIT
+	result = {}
+	for name, (types, messages) in BRIBES.items():
+		paid = np.bincount(places[expenses & np.isin(a['message'], types)],
+			minlength=size)
+		done = np.bincount(places[units & np.isin(a['message'], messages)],
+			minlength=size)
+		if name == 'disband':
+			## a surrendered unit is also disbanded, so the DisbandEvents
+			## only count where there is no surrender
+			disbanded = np.bincount(places[a['kind'] == DISBAND], minlength=size)
+			done = np.where(done > 0, done, disbanded)
+		attempts = int(paid.sum())
+		successes = int(np.minimum(paid, done).sum())
+		result[name] = {
+			'attempts': attempts,
+			'successes': successes,
+			'rate': float(successes) / attempts if attempts else None,
+		}
+	return result
+
+def summary(a):
+	""" Returns all the statistics """
+	return {
+		'events': int(len(a['kind'])),
+		'games': int(len(np.unique(a['game']))),
+		'order_codes': order_codes(a),
+		'standoffs_per_area': standoffs_per_area(a),
+		'famine_per_area': famine_per_area(a),
+		'bribes': bribe_success(a),
+	}
@@ -0,0 +1,240 @@
+## Copyright (c) 2010 by Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+## This program is free software: you can redistribute it and/or modify it
+## under the terms of the GNU Affero General Public License as published by the
+## Free Software Foundation, either version 3 of the License, or (at your option
+## any later version.
+##
+## This program is distributed in the hope that it will be useful, but WITHOUT
+## ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+## FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+## for more details.
+##
+## You should have received a copy of the GNU Affero General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/agpl.txt>.
+##
+## This license is also included in the file COPYING
+##
+## AUTHOR: Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+
+""" This module archives the log of a finished game in a compressed file,
+with one json record per line, and loads it back as read-only events.
+
+Each record holds the concrete fields of the event, the names of the related
+areas and countries, and the rendered text and html in every language of
+RENDER_LANGUAGES, so an archived log can be shown without the database.
+
+Typical usage::
+
+	path = archive_game(game, '/var/archive/events', purge=True)
+	log = load_archive(path)
+	paginator = SeasonPaginator(log, seasons=log.seasons())
+
+"""
+
+import gzip
+import json
+import os
+
+from django.conf import settings
+from django.utils import translation
+
+import condottieri_scenarios.models as scenarios
+
+from condottieri_events import models
+from condottieri_events import cleanup
+
+CHUNK_SIZE = 500
+
+class ArchiveError(Exception):
+	pass
+
+def archive_path(directory, game_id):
+	return os.path.join(directory, "game-%s.jsonl.gz" % game_id)
+
+def event_record(event, languages=models.RENDER_LANGUAGES):
+	""" Returns a dict with the data of a concrete or compact event """
+	pk = event.pk
+	event = event.get_concrete()
+	fields = {}
+	names = {}
+	for f in event._meta.concrete_fields:
+		if f.primary_key:
+			continue
+		fields[f.attname] = getattr(event, f.attname)
+		if f.is_relation and f.related_model is scenarios.Area:
+			area = event.get_area(f.name)
+			if area is not None:
+				names[f.name] = area.name
+	country = event.get_country()
+	if country is not None:
+		names['country'] = country.name
+	record = {
+		'id': pk,
+		'fields': fields,
+		'names': names,
+		'text': {},
+		'html': {},
+	}
+	for language in languages:
+		with translation.override(language):
+			record['text'][language] = str(event)
+			record['html'][language] = str(event.color_output())
+	return record
+
+def iter_game_chunks(game_id, chunk_size=CHUNK_SIZE):
+	""" Yields lists of events of a game in index order (newest first), from
+	the event tables and from CompactEvent (see models.iter_log). The events
+	of the event tables are concrete. """
+	chunk = []
+	for e in models.iter_log(game_id, newest_first=True, chunk_size=chunk_size):
+		chunk.append(e)
+		if len(chunk) == chunk_size:
+			yield chunk
+			chunk = []
+	if chunk:
+		yield chunk
+
+def iter_game_events(game_id, chunk_size=CHUNK_SIZE):
+	""" Yields the concrete events of a game in index order, loading them in
+	chunks """
+	for chunk in iter_game_chunks(game_id, chunk_size):
+		for e in chunk:
+			yield e
+
+def iter_packed_seasons(game_id):
+	""" Yields (year, season, orders) for each season of a game with packed
+	orders, newest first. The orders are unsaved OrderEvents, newest first. """
+	current = None
+	orders = []
+	records = models.PackedOrders.objects.filter(game__id=game_id).order_by(
+		'-year', '-season', '-id')
+	for record in records.iterator():
+		date = (record.year, record.season)
+		if date != current:
+			if orders:
+				yield current + (orders,)
+			current = date
+			orders = []
+		orders.extend(reversed(record.orders()))
+	if orders:
+		yield current + (orders,)
+
+def iter_archive_events(game_id, chunk_size=CHUNK_SIZE):
+	""" Yields the events of a game in index order, like iter_game_events,
+	with the packed orders of each season after its other events """
+	packed = iter_packed_seasons(game_id)
+	pending = next(packed, None)
+	for e in iter_game_events(game_id, chunk_size):
+		while pending is not None and pending[:2] > (e.year, e.season):
+			for o in pending[2]:
+				yield o
+			pending = next(packed, None)
+		yield e
+	while pending is not None:
+		for o in pending[2]:
+			yield o
+		pending = next(packed, None)
+
+def archive_game(game, directory, purge=False, batch_size=1000):
+	"""
+Writes the log of a game, with its packed orders, to a compressed file in
+directory, and returns its path. If purge is True, the events are deleted
+from the database after the file has been completely written.
+	"""
+	path = archive_path(directory, game.pk)
+	tmp_path = path + ".tmp"
+	count = 0
+	with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+		for e in iter_archive_events(game.pk):
+			f.write(json.dumps(event_record(e), sort_keys=True))
+			f.write("\n")
+			count += 1
+	expected = models.count_log(game.pk)
+	if count != expected:
+		os.remove(tmp_path)
+		raise ArchiveError("Game %s changed while it was archived" % game.pk)
+	os.rename(tmp_path, path)
+	if purge:
+		cleanup.purge_game(game.pk, batch_size)
+	return path
+
+class ArchivedEvent(object):
+	""" A read-only event loaded from an archive """
+	def __init__(self, record):
+		self.id = self.pk = record['id']
+		self.fields = record['fields']
+		self.names = record['names']
+		self.text = record['text']
+		self.html = record['html']
+		self.game_id = self.fields.get('game_id')
+		self.year = self.fields['year']
+		self.season = self.fields['season']
+		self.phase = self.fields['phase']
+		self.classname = self.fields['classname']
+
+	def _get_translated(self, values, language=None):
+		language = models.render_language(language)
+		if language in values:
+			return values[language]
+		default = models.render_language(settings.LANGUAGE_CODE)
+		if default in values:
+			return values[default]
+		return values[sorted(values)[0]]
+
+	def season_class(self):
+		return "season_%s" % self.season
+
+	def color_output(self, language=None):
+		return self._get_translated(self.html, language)
+
+	def __str__(self):
+		return self._get_translated(self.text)
+
+	def __repr__(self):
+		return "<ArchivedEvent %s: %s>" % (self.pk, self.classname)
+
+class ArchivedLog(object):
+	""" A read-only list of archived events, newest first, that can be used
+	as the object_list of a SeasonPaginator """
+	def __init__(self, events):
+		self.events = list(events)
+
+	def __iter__(self):
+		return iter(self.events)
+
+	def __len__(self):
+		return len(self.events)
+
+	def __getitem__(self, key):
+		return self.events[key]
+
+	def exists(self):
+		return len(self.events) > 0
+
+	def filter(self, year=None, season=None):
+		return ArchivedLog([e for e in self.events
+			if (year is None or e.year == year) and
+			(season is None or e.season == season)])
+
+	def for_season(self, year, season):
+		return self.filter(year=year, season=season)
+
+	def seasons(self):
+		""" Returns the list of (year, season) with events, newest first """
+		seasons = []
+		for e in self.events:
+			if not seasons or seasons[-1] != (e.year, e.season):
+				seasons.append((e.year, e.season))
+		return seasons
+
+	def render(self, language=None):
+		return "".join([e.color_output(language) for e in self.events])
+
+def load_archive(path):
+	""" Reads an archive file and returns an ArchivedLog """
+	events = []
+	with gzip.open(path, 'rt', encoding='utf-8') as f:
+		for line in f:
+			if line.strip():
+				events.append(ArchivedEvent(json.loads(line)))
+	return ArchivedLog(events)
@@ -0,0 +1,193 @@
+## Copyright (c) 2010 by Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+## This program is free software: you can redistribute it and/or modify it
+## under the terms of the GNU Affero General Public License as published by the
+## Free Software Foundation, either version 3 of the License, or (at your option
+## any later version.
+##
+## This program is distributed in the hope that it will be useful, but WITHOUT
+## ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+## FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+## for more details.
+##
+## You should have received a copy of the GNU Affero General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/agpl.txt>.
+##
+## This license is also included in the file COPYING
+##
+## AUTHOR: Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+
+""" This module writes the events in background threads.
+
+When EVENTS_ASYNC is True, ``log_event`` only builds a description of the
+event (a dict of plain values) and puts it in a bounded queue. Worker threads
+take the descriptions from the queue and write them in batches. If the queue
+is full, the event is dropped and counted.
+
+Call ``flush()`` to wait until every queued event has been written, e.g. at
+the end of a phase or in tests.
+
+Only the writes are moved to the workers. The signal handlers still resolve
+the game, areas and countries of an event in the calling thread, through the
+resolution context (see resolution.py), because the description must hold
+their ids.
+
+"""
+
+import atexit
+import logging
+import threading
+
+try:
+	import queue
+except ImportError:
+	import Queue as queue
+
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections, models
+
+from condottieri_events.writer import EventBatch
+
+logger = logging.getLogger(__name__)
+
+ASYNC = getattr(settings, 'EVENTS_ASYNC', False)
+QUEUE_SIZE = getattr(settings, 'EVENTS_ASYNC_QUEUE_SIZE', 10000)
+WORKERS = getattr(settings, 'EVENTS_ASYNC_WORKERS', 1)
+BATCH_SIZE = getattr(settings, 'EVENTS_ASYNC_BATCH_SIZE', 200)
+
+_STOP = object()
+
+def describe_event(event_class, game, **kwargs):
+	""" Returns a picklable dict that describes an event """
+	fields = {}
+	for name, value in kwargs.items():
+		if isinstance(value, models.Model):
+			fields["%s_id" % name] = value.pk
+		else:
+			fields[name] = value
+	fields.update({
+		'game_id': game.pk,
+		'year': game.year,
+		'season': game.season,
+		'phase': game.phase,
+	})
+	return {
+		'app_label': event_class._meta.app_label,
+		'model': event_class.__name__,
+		'fields': fields,
+	}
+
+def build_event(description):
+	""" Returns an unsaved event from its description """
+	model = apps.get_model(description['app_label'], description['model'])
+	event = model(**description['fields'])
+	from condottieri_events.models import STORAGE, CompactEvent
+	if STORAGE == 'compact':
+		event = CompactEvent.from_event(event)
+	return event
+
+class AsyncEventWriter(object):
+	"""
+AsyncEventWriter keeps a bounded queue of event descriptions and a pool of
+threads that write them.
+	"""
+	def __init__(self, maxsize=QUEUE_SIZE, workers=WORKERS, batch_size=BATCH_SIZE):
+		self.queue = queue.Queue(maxsize)
+		self.workers = workers
+		self.batch_size = batch_size
+		self.threads = []
+		self.lock = threading.Lock()
+		self.stats = {'queued': 0, 'written': 0, 'dropped': 0, 'errors': 0}
+
+	def _count(self, key, n=1):
+		with self.lock:
+			self.stats[key] += n
+
+	def get_stats(self):
+		with self.lock:
+			return dict(self.stats)
+
+	def start(self):
+		with self.lock:
+			if self.threads:
+				return
+			for i in range(self.workers):
+				t = threading.Thread(target=self._run,
+					name="condottieri-events-writer-%s" % i)
+				t.daemon = True
+				t.start()
+				self.threads.append(t)
+
+	def submit(self, description):
+		""" Queues an event description. Returns False if it was dropped """
+		self.start()
+		try:
+			self.queue.put_nowait(description)
+		except queue.Full:
+			self._count('dropped')
+			logger.warning("Event queue is full, event dropped: %s", description['model'])
+			return False
+		self._count('queued')
+		return True
+
+	def _run(self):
+		while True:
+			item = self.queue.get()
+			items = [item]
+			while item is not _STOP and len(items) < self.batch_size:
+				try:
+					item = self.queue.get_nowait()
+				except queue.Empty:
+					break
+				items.append(item)
+			descriptions = [i for i in items if i is not _STOP]
+			try:
+				self._write(descriptions)
+			finally:
+				for i in items:
+					self.queue.task_done()
+			if item is _STOP:
+				return
+
+	def _write(self, descriptions):
+		if not descriptions:
+			return
+		close_old_connections()
+		try:
+			batch = EventBatch()
+			for d in descriptions:
+				batch.add(build_event(d))
+			batch.flush()
+		except Exception:
+			self._count('errors', len(descriptions))
+			logger.exception("Could not write %s events", len(descriptions))
+		else:
+			self._count('written', len(descriptions))
+		finally:
+			close_old_connections()
+
+	def flush(self):
+		""" Blocks until all the queued events have been written """
+		self.queue.join()
+
+	def shutdown(self):
+		""" Writes the pending events and stops the threads """
+		with self.lock:
+			threads, self.threads = self.threads, []
+		for t in threads:
+			self.queue.put(_STOP)
+		for t in threads:
+			t.join()
+
+_writer = AsyncEventWriter()
+
+def submit(description):
+	return _writer.submit(description)
+
+def flush():
+	_writer.flush()
+
+def get_stats():
+	return _writer.get_stats()
+
+atexit.register(_writer.shutdown)
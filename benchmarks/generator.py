@@ -0,0 +1,189 @@
+## Copyright (c) 2010 by Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+## This program is free software: you can redistribute it and/or modify it
+## under the terms of the GNU Affero General Public License as published by the
+## Free Software Foundation, either version 3 of the License, or (at your option
+## any later version.
+##
+## This program is distributed in the hope that it will be useful, but WITHOUT
+## ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+## FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+## for more details.
+##
+## You should have received a copy of the GNU Affero General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/agpl.txt>.
+##
+## This license is also included in the file COPYING
+##
+## AUTHOR: Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+
+
+""" This module generates synthetic event logs for benchmarking.
+
+The events are logged with log_event, as the game would do, with a mix of
+classes similar to the one of real games: most of the log are orders and
+movements, and incomes are logged once a year.
+
+"""
+
+import bisect
+import random
+
+import machiavelli.models as machiavelli
+import condottieri_scenarios.models as scenarios
+
+from condottieri_events import models
+from condottieri_events import writer
+
+## relative weight of each class in a season
+EVENT_MIX = (
+	(models.OrderEvent, 40),
+	(models.MovementEvent, 20),
+	(models.ExpenseEvent, 8),
+	(models.StandoffEvent, 5),
+	(models.ControlEvent, 5),
+	(models.NewUnitEvent, 4),
+	(models.UnitEvent, 4),
+	(models.DisbandEvent, 3),
+	(models.RetreatEvent, 2),
+	(models.DisasterEvent, 2),
+	(models.UncoverEvent, 2),
+	(models.ConversionEvent, 1),
+	(models.CountryEvent, 1),
+)
+
+## classes whose events must have a country
+COUNTRY_REQUIRED = (models.NewUnitEvent, models.OrderEvent, models.ControlEvent,
+	models.CountryEvent, models.IncomeEvent, models.ExpenseEvent)
+
+def choices(choices):
+	return [c[0] for c in choices]
+
+UNIT_TYPES = choices(machiavelli.UNIT_TYPES)
+## codes of the orders that are rendered
+ORDER_CODES = [c for c in choices(machiavelli.ORDER_CODES)
+	if c in models.ORDER_MESSAGES or c == 'S']
+EXPENSE_TYPES = choices(machiavelli.EXPENSE_TYPES)
+
+class EventGenerator(object):
+	"""
+EventGenerator logs random events in a game, using the areas and countries
+of its setting. The same seed always produces the same log.
+	"""
+	def __init__(self, game, seed=0):
+		self.game = game
+		self.random = random.Random(seed)
+		setting = game.scenario.setting
+		self.areas = list(scenarios.Area.objects.filter(setting=setting))
+		if not self.areas:
+			raise ValueError("The setting of the game has no areas")
+		self.countries = list(scenarios.Country.objects.filter(setting=setting))
+		mix = [(c, w) for c, w in EVENT_MIX
+			if self.countries or not c in COUNTRY_REQUIRED]
+		self.classes = [c for c, w in mix]
+		self.cumulative = []
+		total = 0
+		for c, w in mix:
+			total += w
+			self.cumulative.append(total)
+
+	def country(self, required=False):
+		if not self.countries or (not required and self.random.random() < 0.1):
+			return None
+		return self.random.choice(self.countries)
+
+	def area(self):
+		return self.random.choice(self.areas)
+
+	def kwargs(self, event_class):
+		""" Returns random values for the fields of an event class """
+		r = self.random
+		kwargs = {'classname': event_class.__name__}
+		if event_class in (models.StandoffEvent, models.DisasterEvent,
+			models.UncoverEvent, models.ControlEvent, models.NewUnitEvent,
+			models.DisbandEvent, models.UnitEvent, models.ConversionEvent,
+			models.ExpenseEvent):
+			kwargs['area'] = self.area()
+		if event_class in (models.MovementEvent, models.RetreatEvent,
+			models.OrderEvent):
+			kwargs['origin'] = self.area()
+		if event_class in (models.MovementEvent, models.RetreatEvent):
+			kwargs['destination'] = self.area()
+		if not event_class in (models.StandoffEvent, models.DisasterEvent):
+			kwargs['country'] = self.country(event_class in COUNTRY_REQUIRED)
+		if event_class in (models.NewUnitEvent, models.DisbandEvent,
+			models.OrderEvent, models.MovementEvent, models.RetreatEvent,
+			models.UnitEvent):
+			kwargs['type'] = r.choice(UNIT_TYPES)
+		if event_class is models.OrderEvent:
+			kwargs['code'] = r.choice(ORDER_CODES)
+			if kwargs['code'] == '-':
+				kwargs['destination'] = self.area()
+			elif kwargs['code'] == 'C':
+				kwargs['subtype'] = 'A'
+				kwargs['suborigin'] = self.area()
+				kwargs['subdestination'] = self.area()
+			elif kwargs['code'] == 'S':
+				kwargs['subtype'] = r.choice(UNIT_TYPES)
+				kwargs['suborigin'] = self.area()
+				kwargs['subcode'] = r.choice(['H', '-', '='])
+				if kwargs['subcode'] == '-':
+					kwargs['subdestination'] = self.area()
+				elif kwargs['subcode'] == '=':
+					kwargs['subconversion'] = r.choice(UNIT_TYPES)
+			elif kwargs['code'] == '=':
+				kwargs['conversion'] = r.choice(UNIT_TYPES)
+		elif event_class is models.ConversionEvent:
+			kwargs['before'], kwargs['after'] = r.sample(UNIT_TYPES, 2)
+		elif event_class is models.ControlEvent:
+			kwargs['new_home'] = r.random() < 0.05
+		elif event_class is models.UnitEvent:
+			kwargs['message'] = r.choice(choices(models.UNIT_EVENTS))
+		elif event_class is models.CountryEvent:
+			kwargs['message'] = r.choice(choices(models.COUNTRY_EVENTS))
+		elif event_class is models.DisasterEvent:
+			kwargs['message'] = r.choice(choices(models.DISASTER_EVENTS))
+		elif event_class is models.ExpenseEvent:
+			kwargs['type'] = r.choice(EXPENSE_TYPES)
+			kwargs['unit_type'] = r.choice(UNIT_TYPES)
+			kwargs['ducats'] = r.randint(3, 30)
+		return kwargs
+
+	def events(self, count):
+		""" Yields count random (class, kwargs) pairs """
+		for i in range(count):
+			x = self.random.random() * self.cumulative[-1]
+			event_class = self.classes[bisect.bisect(self.cumulative, x)]
+			yield event_class, self.kwargs(event_class)
+
+	def season(self, year, season, count, batch=True):
+		""" Logs count events in the given season of the game """
+		self.game.year = year
+		self.game.season = season
+		events = list(self.events(count))
+		if season == 1:
+			for c in self.countries:
+				events.append((models.IncomeEvent, {'classname': 'IncomeEvent',
+					'country': c, 'ducats': self.random.randint(5, 40)}))
+		if batch:
+			with writer.event_batch():
+				for event_class, kwargs in events:
+					models.log_event(event_class, self.game, **kwargs)
+		else:
+			for event_class, kwargs in events:
+				models.log_event(event_class, self.game, **kwargs)
+		return len(events)
+
+def generate_game(game, years=10, events_per_season=100, first_year=1454,
+	seed=0, batch=True, progress=None):
+	"""
+Logs a synthetic history of years * 3 seasons in the game and returns the
+number of events. The game itself is not saved.
+	"""
+	generator = EventGenerator(game, seed)
+	total = 0
+	for year in range(first_year, first_year + years):
+		for season in (1, 2, 3):
+			total += generator.season(year, season, events_per_season, batch)
+		if progress:
+			progress(year, total)
+	return total
@@ -0,0 +1,171 @@
+## Copyright (c) 2010 by Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+## This program is free software: you can redistribute it and/or modify it
+## under the terms of the GNU Affero General Public License as published by the
+## Free Software Foundation, either version 3 of the License, or (at your option
+## any later version.
+##
+## This program is distributed in the hope that it will be useful, but WITHOUT
+## ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+## FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+## for more details.
+##
+## You should have received a copy of the GNU Affero General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/agpl.txt>.
+##
+## This license is also included in the file COPYING
+##
+## AUTHOR: Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+
+
+""" This module times the main operations of the events application.
+
+Each benchmark returns a dictionary with its name, the number of processed
+items, the elapsed seconds and the items per second, so that the results
+of different commits can be compared.
+
+The benchmarks write and delete events, so they must be run on a game that
+is only used for benchmarking.
+
+"""
+
+from datetime import datetime, timedelta
+from io import StringIO
+import platform
+import time
+from timeit import default_timer
+
+import django
+from django.core.management import call_command
+from django.db import connection
+from django.utils import translation
+
+import machiavelli.models as machiavelli
+
+from condottieri_events import models
+from condottieri_events import season_cache
+from condottieri_events.paginator import SeasonPaginator
+from condottieri_events.benchmarks.generator import EventGenerator, generate_game
+
+class Timer(object):
+	def __enter__(self):
+		self.start = default_timer()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.seconds = default_timer() - self.start
+		return False
+
+def result(name, count, seconds, **extra):
+	data = {
+		'name': name,
+		'count': count,
+		'seconds': round(seconds, 6),
+		'per_second': round(count / seconds, 2) if seconds else None,
+	}
+	data.update(extra)
+	return data
+
+def bench_generate(game, years, events_per_season, seed=0):
+	""" Times the logging of a whole synthetic game, in batches """
+	with Timer() as t:
+		count = generate_game(game, years, events_per_season, seed=seed)
+	return result('generate', count, t.seconds, years=years,
+		events_per_season=events_per_season)
+
+def bench_log_event(game, count, batch, year, seed=0):
+	""" Times log_event in a single season, with or without a batch """
+	generator = EventGenerator(game, seed)
+	with Timer() as t:
+		count = generator.season(year, 1, count, batch)
+	return result('log_event_batch' if batch else 'log_event', count, t.seconds)
+
+def bench_paginator(game, pages, language=None):
+	""" Times the navigation through the newest pages of the game, rendering
+	each page twice: with an empty season cache and with the cached html """
+	paginator = SeasonPaginator(models.BaseEvent.objects.for_game(game), game=game)
+	dates = (paginator.seasons or [])[:pages]
+	for year, season in dates:
+		season_cache.invalidate_season(game.pk, year, season)
+	results = []
+	for name in ('paginator_render_cold', 'paginator_render_warm'):
+		with Timer() as t:
+			for year, season in dates:
+				paginator.page(year, season).render(language)
+		results.append(result(name, len(dates), t.seconds))
+	return results
+
+def bench_concrete(game, count):
+	""" Times loading concrete events one by one and with load_concrete """
+	events = models.BaseEvent.objects.for_game(game).order_by('-id')[:count]
+	with Timer() as t:
+		n = len([e.get_concrete() for e in events.all()])
+	results = [result('get_concrete', n, t.seconds)]
+	with Timer() as t:
+		n = len(events.with_concrete())
+	results.append(result('load_concrete', n, t.seconds))
+	return results
+
+def bench_render(game, count, language=None):
+	""" Times rendering a season-sized list of concrete events with
+	color_output, one by one, and with the bulk renderer """
+	if language is None:
+		language = translation.get_language()
+	events = models.BaseEvent.objects.for_game(game).order_by('-id')[:count]
+	events = events.with_concrete()
+	with Timer() as t:
+		with translation.override(language):
+			"".join([str(e.color_output()) for e in events])
+	results = [result('color_output', len(events), t.seconds)]
+	with Timer() as t:
+		models.render_events(events, language)
+	results.append(result('render_events', len(events), t.seconds))
+	return results
+
+def bench_cleanup(game, batch_size=1000):
+	""" Times the clean_events command on the game, which is marked as
+	finished while the command runs """
+	games = machiavelli.Game.objects.filter(pk=game.pk)
+	saved = games.values('phase', 'slots', 'last_phase_change')[0]
+	games.update(phase=machiavelli.PHINACTIVE, slots=0,
+		last_phase_change=datetime.now() - timedelta(1))
+	try:
+		count = models.count_log(game.pk)
+		with Timer() as t:
+			call_command('clean_events', age=0, games=[game.pk],
+				batch_size=batch_size, stdout=StringIO())
+	finally:
+		games.update(**saved)
+	return result('clean_events', count, t.seconds, batch_size=batch_size)
+
+def run(game, years=10, events_per_season=100, log_count=1000, pages=10,
+	concrete_count=1000, render_count=500, batch_size=1000, seed=0, language=None, progress=None):
+	"""
+Runs all the benchmarks in a game and returns a dictionary with the results.
+All the events of the game are deleted at the end.
+	"""
+	def step(r):
+		if progress is not None:
+			progress(r)
+		return r
+	results = []
+	results.append(step(bench_generate(game, years, events_per_season, seed)))
+	extra_year = 1454 + years
+	results.append(step(bench_log_event(game, log_count, False, extra_year, seed)))
+	results.append(step(bench_log_event(game, log_count, True, extra_year + 1, seed)))
+	for r in bench_paginator(game, pages, language):
+		results.append(step(r))
+	for r in bench_concrete(game, concrete_count):
+		results.append(step(r))
+	for r in bench_render(game, render_count, language):
+		results.append(step(r))
+	results.append(step(bench_cleanup(game, batch_size)))
+	return {
+		'timestamp': int(time.time()),
+		'python': platform.python_version(),
+		'django': django.get_version(),
+		'database': connection.vendor,
+		'storage': models.STORAGE,
+		'game': game.pk,
+		'seed': seed,
+		'results': results,
+	}
@@ -0,0 +1,240 @@
+## Copyright (c) 2010 by Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+## This program is free software: you can redistribute it and/or modify it
+## under the terms of the GNU Affero General Public License as published by the
+## Free Software Foundation, either version 3 of the License, or (at your option
+## any later version.
+##
+## This program is distributed in the hope that it will be useful, but WITHOUT
+## ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+## FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+## for more details.
+##
+## You should have received a copy of the GNU Affero General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/agpl.txt>.
+##
+## This license is also included in the file COPYING
+##
+## AUTHOR: Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+
+""" This module reconstructs the board of a game at the end of any season,
+replaying the events of the log.
+
+The replay starts from the nearest BoardCheckpoint before the requested
+season. While replaying, a checkpoint is stored every CHECKPOINT_INTERVAL
+seasons, so later requests never replay more than that number of seasons.
+Only finished seasons are stored, because the current one may still change.
+
+"""
+
+import json
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from condottieri_events import models
+
+## a checkpoint is stored every CHECKPOINT_INTERVAL seasons
+CHECKPOINT_INTERVAL = getattr(settings, 'EVENTS_CHECKPOINT_INTERVAL', 6)
+CHUNK_SIZE = 500
+
+## events that change the board
+BOARD_EVENTS = ('NewUnitEvent', 'DisbandEvent', 'MovementEvent', 'RetreatEvent',
+	'ConversionEvent', 'ControlEvent', 'UnitEvent')
+
+def season_number(year, season):
+	return year * 3 + season - 1
+
+class BoardState(object):
+	"""
+BoardState holds the units in each area, as a list of (country_id, type)
+pairs, and the country that controls each area. Autonomous units have None
+as country_id.
+	"""
+	def __init__(self, units=None, control=None):
+		self.units = units or {}
+		self.control = control or {}
+
+	def add_unit(self, area_id, country_id, type):
+		self.units.setdefault(area_id, []).append((country_id, type))
+
+	def remove_unit(self, area_id, country_id, type):
+		""" Removes a unit and returns its (country_id, type), or None """
+		units = self.units.get(area_id, [])
+		candidates = [u for u in units if u[1] == type] or units
+		for u in candidates:
+			if u[0] == country_id:
+				break
+		else:
+			if not candidates:
+				return None
+			u = candidates[0]
+		units.remove(u)
+		if not units:
+			del self.units[area_id]
+		return u
+
+	def apply(self, event):
+		""" Applies a single concrete event to the board """
+		classname = event.classname
+		if classname == 'NewUnitEvent':
+			self.add_unit(event.area_id, event.country_id, event.type)
+		elif classname == 'DisbandEvent':
+			self.remove_unit(event.area_id, event.country_id, event.type)
+		elif classname in ('MovementEvent', 'RetreatEvent'):
+			self.apply_movements([event])
+		elif classname == 'ConversionEvent':
+			unit = self.remove_unit(event.area_id, event.country_id, event.before)
+			if unit is not None:
+				self.add_unit(event.area_id, unit[0], event.after)
+		elif classname == 'ControlEvent':
+			self.control[event.area_id] = event.country_id
+		elif classname == 'UnitEvent':
+			if event.message == 2:
+				## the unit surrenders
+				self.remove_unit(event.area_id, event.country_id, event.type)
+			elif event.message in (4, 5):
+				## the unit changes of country or becomes autonomous
+				unit = self.remove_unit(event.area_id, None, event.type)
+				if unit is not None:
+					if event.message == 4:
+						country_id = event.country_id
+					else:
+						country_id = None
+					self.add_unit(event.area_id, country_id, event.type)
+
+	def apply_movements(self, events):
+		""" Applies a group of movements that happen at the same time """
+		moved = []
+		for e in events:
+			unit = self.remove_unit(e.origin_id, e.country_id, e.type)
+			if unit is None:
+				unit = (e.country_id, e.type)
+			moved.append((e.destination_id, unit))
+		for area_id, unit in moved:
+			self.add_unit(area_id, unit[0], unit[1])
+
+	def replay(self, events):
+		""" Applies a sequence of events in chronological order. Consecutive
+		movements are applied at the same time. """
+		movements = []
+		for e in events:
+			if e.classname in ('MovementEvent', 'RetreatEvent'):
+				if movements and movements[0].phase != e.phase:
+					self.apply_movements(movements)
+					movements = []
+				movements.append(e)
+				continue
+			if movements:
+				self.apply_movements(movements)
+				movements = []
+			self.apply(e)
+		if movements:
+			self.apply_movements(movements)
+
+	def to_json(self):
+		return json.dumps({
+			'units': dict([(str(a), [list(u) for u in units])
+				for a, units in self.units.items()]),
+			'control': dict([(str(a), c) for a, c in self.control.items()]),
+		}, sort_keys=True)
+
+	@classmethod
+	def from_json(cls, data):
+		data = json.loads(data)
+		units = dict([(int(a), [tuple(u) for u in units])
+			for a, units in data['units'].items()])
+		control = dict([(int(a), c) for a, c in data['control'].items()])
+		return cls(units, control)
+
+def iter_season_events(game, start, end):
+	""" Yields the concrete board events of a game between two season numbers
+	(both included), oldest first, from both storages """
+	start_year, start_season = divmod(start, 3)
+	end_year, end_season = divmod(end, 3)
+	seasons = (Q(year__gt=start_year) |
+		Q(year=start_year, season__gte=start_season + 1)) & \
+		(Q(year__lt=end_year) | Q(year=end_year, season__lte=end_season + 1))
+	for e in models.iter_log(game.pk, classnames=BOARD_EVENTS, seasons=seasons,
+		chunk_size=CHUNK_SIZE):
+		yield e.get_concrete()
+
+def save_checkpoint(game, number, state):
+	year, season = divmod(number, 3)
+	try:
+		with transaction.atomic():
+			models.BoardCheckpoint.objects.create(game=game, year=year,
+				season=season + 1, state=state.to_json())
+	except IntegrityError:
+		## already stored by another process
+		pass
+
+def reconstruct(game, year, season, save_checkpoints=True):
+	""" Returns the BoardState of a game at the end of the given season """
+	target = season_number(year, season)
+	checkpoint = models.BoardCheckpoint.objects.filter(game=game).filter(
+		Q(year__lt=year) | Q(year=year, season__lte=season)).order_by(
+		'-year', '-season').first()
+	if checkpoint is None:
+		state = BoardState()
+		first = next(models.iter_log(game.pk, chunk_size=1), None)
+		if first is None:
+			return state
+		start = season_number(first.year, first.season)
+		if start > target:
+			return state
+	else:
+		state = BoardState.from_json(checkpoint.state)
+		start = season_number(checkpoint.year, checkpoint.season) + 1
+		if start > target:
+			return state
+	current = season_number(game.year, game.season)
+	season_events = []
+	number = start
+	def close_season(number):
+		state.replay(season_events)
+		del season_events[:]
+		if save_checkpoints and number < current and \
+			(number + 1) % CHECKPOINT_INTERVAL == 0:
+			save_checkpoint(game, number, state)
+	for e in iter_season_events(game, start, target):
+		n = season_number(e.year, e.season)
+		while number < n:
+			close_season(number)
+			number += 1
+		season_events.append(e)
+	while number <= target:
+		close_season(number)
+		number += 1
+	return state
+
+def save_all_checkpoints(game):
+	"""
+Stores a checkpoint at the end of every season of the log of a game,
+replaying it once from the beginning. The board events of a finished game
+can only be deleted after this (see retention.py), because reconstruct
+would need them. Returns the number of seasons replayed.
+	"""
+	first = next(models.iter_log(game.pk, chunk_size=1), None)
+	if first is None:
+		return 0
+	last = next(models.iter_log(game.pk, newest_first=True, chunk_size=1))
+	start = season_number(first.year, first.season)
+	end = season_number(last.year, last.season)
+	state = BoardState()
+	season_events = []
+	number = start
+	def close_season(number):
+		state.replay(season_events)
+		del season_events[:]
+		save_checkpoint(game, number, state)
+	for e in iter_season_events(game, start, end):
+		n = season_number(e.year, e.season)
+		while number < n:
+			close_season(number)
+			number += 1
+		season_events.append(e)
+	while number <= end:
+		close_season(number)
+		number += 1
+	return end - start + 1
@@ -0,0 +1,113 @@
+## Copyright (c) 2010 by Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+## This program is free software: you can redistribute it and/or modify it
+## under the terms of the GNU Affero General Public License as published by the
+## Free Software Foundation, either version 3 of the License, or (at your option
+## any later version.
+##
+## This program is distributed in the hope that it will be useful, but WITHOUT
+## ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+## FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+## for more details.
+##
+## You should have received a copy of the GNU Affero General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/agpl.txt>.
+##
+## This license is also included in the file COPYING
+##
+## AUTHOR: Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+
+""" This module deletes the events of a game in small batches, so that
+neither the memory used nor the time that the tables are locked grow with
+the size of the log.
+
+"""
+
+from collections import Counter
+import time
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from condottieri_events import models
+from condottieri_events import season_cache
+
+def delete_events(events, batch_size=1000, sleep=0, progress=None):
+	"""
+Deletes the events in a queryset, in batches of batch_size primary keys.
+Each batch is deleted in its own transaction, so the process can be stopped
+at any moment and run again later. The season index is updated in the same
+transaction, and the cached pages of the seasons that lose events are
+invalidated. progress is called with the number of events deleted after each
+batch. Returns the total number of deleted events.
+	"""
+	if issubclass(events.model, models.BaseEvent):
+		## the parent rows are deleted with their children
+		model = models.BaseEvent
+	else:
+		model = events.model
+	total = 0
+	events = events.order_by('pk')
+	while True:
+		rows = list(events.values_list('pk', 'game_id', 'year', 'season')[:batch_size])
+		if not rows:
+			break
+		pks = [r[0] for r in rows]
+		seasons = Counter([r[1:] for r in rows])
+		with transaction.atomic():
+			model.objects.filter(pk__in=pks).delete()
+			for (game_id, year, season), n in seasons.items():
+				models.SeasonIndex.objects.filter(game__id=game_id, year=year,
+					season=season).update(events=Greatest(F('events') - n, 0))
+		season_cache.invalidate_seasons(seasons)
+		total += len(pks)
+		if progress is not None:
+			progress(total)
+		if sleep:
+			time.sleep(sleep)
+	return total
+
+def delete_packed_orders(records, batch_size=1000, sleep=0, progress=None):
+	"""
+Deletes a queryset of PackedOrders in batches of batch_size rows, like
+delete_events. The packed orders are not counted in the season index, so
+only the cached pages of their seasons are invalidated. progress is called
+with the number of orders deleted after each batch. Returns the total number
+of deleted orders.
+	"""
+	total = 0
+	records = records.order_by('pk')
+	while True:
+		rows = list(records.values_list('pk', 'game_id', 'year', 'season',
+			'count')[:batch_size])
+		if not rows:
+			break
+		with transaction.atomic():
+			models.PackedOrders.objects.filter(pk__in=[r[0] for r in rows]).delete()
+		season_cache.invalidate_seasons([r[1:4] for r in rows])
+		total += sum([r[4] for r in rows])
+		if progress is not None:
+			progress(total)
+		if sleep:
+			time.sleep(sleep)
+	return total
+
+def purge_game(game_id, batch_size=1000, sleep=0, progress=None):
+	""" Deletes all the events of a game, in both storages, its packed orders,
+	its season index and its search index """
+	total = 0
+	def partial_progress(count):
+		if progress is not None:
+			progress(total + count)
+	total += delete_events(models.BaseEvent.objects.filter(game__id=game_id),
+		batch_size, sleep, partial_progress)
+	total += delete_events(models.CompactEvent.objects.filter(game__id=game_id),
+		batch_size, sleep, partial_progress)
+	total += delete_packed_orders(models.PackedOrders.objects.filter(
+		game__id=game_id), batch_size, sleep, partial_progress)
+	index = models.SeasonIndex.objects.filter(game__id=game_id)
+	season_cache.invalidate_seasons([(game_id, year, season)
+		for year, season in index.values_list('year', 'season')])
+	index.delete()
+	models.SearchEntry.objects.filter(game__id=game_id).delete()
+	return total
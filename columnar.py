@@ -0,0 +1,156 @@
+## Copyright (c) 2010 by Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+## This program is free software: you can redistribute it and/or modify it
+## under the terms of the GNU Affero General Public License as published by the
+## Free Software Foundation, either version 3 of the License, or (at your option
+## any later version.
+##
+## This program is distributed in the hope that it will be useful, but WITHOUT
+## ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+## FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+## for more details.
+##
+## You should have received a copy of the GNU Affero General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/agpl.txt>.
+##
+## This license is also included in the file COPYING
+##
+## AUTHOR: Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+
+
+""" This module exports the events to column-oriented NumPy arrays, for
+analyses over many games (see analytics.py).
+
+Each column has one value per event. Ids and codes that are not set are 0,
+and messages that are not set are -1. Codes and unit types are stored as
+their ASCII value. For ExpenseEvents, message is the type of the expense,
+as in CompactEvent.
+
+NumPy is only needed by this module and analytics.py.
+
+"""
+
+import os
+from array import array
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+from condottieri_events import models
+
+## name, array typecode and NumPy dtype of each column
+COLUMNS = (
+	('game', 'i', 'int32'),
+	('year', 'h', 'int16'),
+	('season', 'b', 'int8'),
+	('kind', 'b', 'int8'),
+	('country', 'i', 'int32'),
+	('area', 'i', 'int32'),
+	('destination', 'i', 'int32'),
+	('suborigin', 'i', 'int32'),
+	('subdestination', 'i', 'int32'),
+	('unit_type', 'B', 'uint8'),
+	('code', 'B', 'uint8'),
+	('subcode', 'B', 'uint8'),
+	('message', 'h', 'int16'),
+	('ducats', 'i', 'int32'),
+	('flag', 'b', 'int8'),
+)
+
+COLUMN_NAMES = [c[0] for c in COLUMNS]
+
+## columns that hold single characters
+CHAR_COLUMNS = ('unit_type', 'code', 'subcode')
+
+def require_numpy():
+	if np is None:
+		raise ImportError("NumPy is needed to export the events to arrays")
+
+def _convert(column, value):
+	if value is None or value == '':
+		return -1 if column == 'message' else 0
+	if column in CHAR_COLUMNS:
+		return ord(value)
+	return int(value)
+
+def _class_columns(model):
+	""" Returns the (column, attname) pairs of the fields of an event class
+	that are exported """
+	columns = models.compact_columns(model.__name__)
+	pairs = []
+	for f in model._meta.local_concrete_fields:
+		column = columns.get(f.name)
+		if f.primary_key or not column in COLUMN_NAMES:
+			continue
+		pairs.append((column, f.attname))
+	return pairs
+
+def _rows(games=None):
+	""" Yields a dictionary {column: value} for every event, including each
+	packed order """
+	for kind, classname in models.EVENT_KINDS:
+		model = getattr(models, classname)
+		pairs = _class_columns(model)
+		qs = model.objects.order_by()
+		if games is not None:
+			qs = qs.filter(game__in=games)
+		fields = ['game', 'year', 'season'] + [a for c, a in pairs]
+		for row in qs.values_list(*fields).iterator():
+			values = {'game': row[0], 'year': row[1], 'season': row[2], 'kind': kind}
+			for (column, attname), value in zip(pairs, row[3:]):
+				values[column] = value
+			yield values
+	compact = [c for c in COLUMN_NAMES if c != 'game']
+	qs = models.CompactEvent.objects.order_by()
+	if games is not None:
+		qs = qs.filter(game__in=games)
+	for row in qs.values_list('game', *compact).iterator():
+		values = dict(zip(compact, row[1:]))
+		values['game'] = row[0]
+		yield values
+	## packed orders, one per order
+	pairs = _class_columns(models.OrderEvent)
+	kind = models.KIND_CODES['OrderEvent']
+	qs = models.PackedOrders.objects.order_by()
+	if games is not None:
+		qs = qs.filter(game__in=games)
+	for record in qs.iterator():
+		for fields in models.unpack_orders(record.data):
+			fields['country_id'] = record.country_id
+			values = {'game': record.game_id, 'year': record.year,
+				'season': record.season, 'kind': kind}
+			for column, attname in pairs:
+				values[column] = fields.get(attname)
+			yield values
+
+def export_arrays(games=None):
+	"""
+Returns a dictionary {column: NumPy array} with the events of the given
+games (a list of ids), or of all the games. The events of each class are
+read with a single streamed query on its table, without building model
+instances.
+	"""
+	require_numpy()
+	data = dict((name, array(code)) for name, code, dtype in COLUMNS)
+	for values in _rows(games):
+		for name in COLUMN_NAMES:
+			data[name].append(_convert(name, values.get(name)))
+	return dict((name, np.frombuffer(data[name], dtype=dtype).copy())
+		for name, code, dtype in COLUMNS)
+
+def save_arrays(arrays, directory):
+	""" Writes each column to <directory>/<column>.npy """
+	require_numpy()
+	if not os.path.isdir(directory):
+		os.makedirs(directory)
+	for name in COLUMN_NAMES:
+		np.save(os.path.join(directory, "%s.npy" % name), arrays[name])
+
+def load_arrays(directory, mmap=True):
+	""" Reads the columns written by save_arrays. With mmap, the files are
+	memory-mapped instead of read """
+	require_numpy()
+	mode = 'r' if mmap else None
+	return dict((name, np.load(os.path.join(directory, "%s.npy" % name),
+		mmap_mode=mode)) for name in COLUMN_NAMES)
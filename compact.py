@@ -0,0 +1,64 @@
+## Copyright (c) 2010 by Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+## This program is free software: you can redistribute it and/or modify it
+## under the terms of the GNU Affero General Public License as published by the
+## Free Software Foundation, either version 3 of the License, or (at your option
+## any later version.
+##
+## This program is distributed in the hope that it will be useful, but WITHOUT
+## ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+## FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+## for more details.
+##
+## You should have received a copy of the GNU Affero General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/agpl.txt>.
+##
+## This license is also included in the file COPYING
+##
+## AUTHOR: Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+
+""" This module moves the log of a game from the event tables to the single
+CompactEvent table.
+
+"""
+
+from django.db import transaction
+
+from condottieri_events import models
+
+def compact_game(game_id, batch_size=1000, progress=None):
+	"""
+Copies the events of a game to CompactEvent, in batches of batch_size events,
+and deletes the original rows. Each batch is copied and deleted in the same
+transaction, with the search postings of the events, so an interrupted run
+can be resumed. The events keep their order, because they are copied in
+increasing id order. Returns the number of events moved.
+	"""
+	events = models.BaseEvent.objects.filter(game__id=game_id).order_by('pk')
+	total = 0
+	while True:
+		batch = list(events[:batch_size])
+		if not batch:
+			break
+		pks = [e.pk for e in batch]
+		with transaction.atomic():
+			concrete = models.load_concrete(batch)
+			compact = [models.CompactEvent.from_event(e) for e in concrete]
+			models.CompactEvent.objects.bulk_create(compact)
+			if compact[0].pk is None:
+				## the database does not return the ids of bulk inserts
+				ids = models.CompactEvent.objects.filter(game__id=game_id).order_by(
+					'-pk').values_list('pk', flat=True)[:len(compact)]
+				for e, pk in zip(compact, reversed(list(ids))):
+					e.pk = pk
+			postings = models.SearchEntry.objects.filter(game__id=game_id,
+				compact=False, event_id__in=pks)
+			if postings.delete()[0]:
+				entries = []
+				for e in compact:
+					entries.extend(models.search_entries(e))
+				models.SearchEntry.objects.bulk_create(entries, batch_size=500)
+			models.BaseEvent.objects.filter(pk__in=pks).delete()
+		total += len(batch)
+		if progress is not None:
+			progress(total)
+	return total
@@ -0,0 +1,101 @@
+## Copyright (c) 2010 by Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+## This program is free software: you can redistribute it and/or modify it
+## under the terms of the GNU Affero General Public License as published by the
+## Free Software Foundation, either version 3 of the License, or (at your option
+## any later version.
+##
+## This program is distributed in the hope that it will be useful, but WITHOUT
+## ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+## FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+## for more details.
+##
+## You should have received a copy of the GNU Affero General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/agpl.txt>.
+##
+## This license is also included in the file COPYING
+##
+## AUTHOR: Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+
+""" This module reads and rebuilds the economy rollups of the games.
+
+"""
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from condottieri_events import models
+
+def economy_series(game):
+	"""
+Returns the income and expenses of each country in a game, with one query.
+The result is a dict of lists, keyed by country id, and each list has one
+dict per season, oldest first, like::
+
+	{'year': 1454, 'season': 3, 'income': 12, 'expense': 6,
+		'expenses': {0: 3, 4: 3}}
+	"""
+	rows = models.EconomyRollup.objects.filter(game=game).order_by(
+		'country', 'year', 'season').values_list('country', 'year', 'season',
+		'kind', 'type', 'ducats')
+	series = {}
+	for country_id, year, season, kind, type, ducats in rows:
+		seasons = series.setdefault(country_id, [])
+		if not seasons or (seasons[-1]['year'], seasons[-1]['season']) != (year, season):
+			seasons.append({'year': year, 'season': season, 'income': 0,
+				'expense': 0, 'expenses': {}})
+		data = seasons[-1]
+		if kind == 0:
+			data['income'] += ducats
+		else:
+			data['expense'] += ducats
+			data['expenses'][type] = data['expenses'].get(type, 0) + ducats
+	return series
+
+def rebuild_economy(game_id):
+	"""
+Computes again the economy rollups of a game from its events, in the event
+tables and in CompactEvent. A rollup that sums more events than the log still
+has was collapsed by the retention policy (see retention.py), so it is kept
+as it is instead of being computed from the remaining events.
+
+The rollups of the game are locked while they are rebuilt, so that upsert
+calls from new events wait for the rebuild to finish.
+	"""
+	with transaction.atomic():
+		stored = list(models.EconomyRollup.objects.select_for_update().filter(
+			game__id=game_id).values_list('country', 'year', 'season', 'kind',
+			'type', 'ducats', 'events'))
+		totals = _source_totals(game_id)
+		for row in stored:
+			key, ducats, n = row[:5], row[5], row[6]
+			if totals.get(key, (0, 0))[1] < n:
+				totals[key] = (ducats, n)
+		rows = [models.EconomyRollup(game_id=game_id, country_id=country_id,
+			year=year, season=season, kind=kind, type=type, ducats=ducats, events=n)
+			for (country_id, year, season, kind, type), (ducats, n) in totals.items()]
+		models.EconomyRollup.objects.filter(game__id=game_id).delete()
+		models.EconomyRollup.objects.bulk_create(rows, batch_size=500)
+	return len(rows)
+
+def _source_totals(game_id):
+	""" Returns {(country, year, season, kind, type): (ducats, events)} from
+	the incomes and expenses of a game """
+	compact = models.CompactEvent.objects.filter(game__id=game_id).order_by()
+	sources = [
+		(0, models.IncomeEvent.objects.filter(game__id=game_id).order_by(), None),
+		(1, models.ExpenseEvent.objects.filter(game__id=game_id).order_by(), 'type'),
+		(0, compact.filter(kind=models.KIND_CODES['IncomeEvent']), None),
+		## the type of a compact expense is stored in its message
+		(1, compact.filter(kind=models.KIND_CODES['ExpenseEvent']), 'message'),
+	]
+	totals = {}
+	for kind, qs, type_field in sources:
+		fields = ['country', 'year', 'season']
+		if type_field is not None:
+			fields.append(type_field)
+		for r in qs.values(*fields).annotate(total=Sum('ducats'), n=Count('pk')):
+			key = (r['country'], r['year'], r['season'], kind,
+				r[type_field] if type_field else 0)
+			ducats, n = totals.get(key, (0, 0))
+			totals[key] = (ducats + r['total'], n + r['n'])
+	return totals
@@ -0,0 +1,99 @@
+## Copyright (c) 2010 by Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+## This program is free software: you can redistribute it and/or modify it
+## under the terms of the GNU Affero General Public License as published by the
+## Free Software Foundation, either version 3 of the License, or (at your option
+## any later version.
+##
+## This program is distributed in the hope that it will be useful, but WITHOUT
+## ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+## FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+## for more details.
+##
+## You should have received a copy of the GNU Affero General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/agpl.txt>.
+##
+## This license is also included in the file COPYING
+##
+## AUTHOR: Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+
+
+""" This module writes the whole log of a game as a stream of html or plain
+text, reading and rendering the events in chunks, so that the memory used
+does not depend on the length of the game.
+
+"""
+
+from django.template.defaultfilters import capfirst
+from django.utils import translation
+from django.utils.html import escape
+
+from condottieri_events import models
+from condottieri_events.archive import iter_game_chunks, CHUNK_SIZE
+from condottieri_events.paginator import SEASONS
+
+def iter_seasons(game, chunk_size=CHUNK_SIZE):
+	"""
+Yields (year, season, events) for each part of a season, newest first. A
+season may be split in several parts, but the packed orders of a season
+always come as its last part.
+	"""
+	current = None
+	for chunk in iter_game_chunks(game.pk, chunk_size):
+		part = []
+		for e in chunk:
+			date = (e.year, e.season)
+			if date != current:
+				if part:
+					yield current + (part,)
+					part = []
+				if current is not None:
+					orders = models.get_packed_orders(game, *current)
+					if orders:
+						yield current + (list(reversed(orders)),)
+				current = date
+			part.append(e)
+		if part:
+			yield current + (part,)
+	if current is not None:
+		orders = models.get_packed_orders(game, *current)
+		if orders:
+			yield current + (list(reversed(orders)),)
+
+def season_title(year, season):
+	return "%s, %s" % (SEASONS[season], year)
+
+def iter_html(game, language, chunk_size=CHUNK_SIZE):
+	""" Yields the log of a game as a html document """
+	with translation.override(language):
+		title = escape(str(game))
+	yield "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>%s</title></head><body>\n<h1>%s</h1>\n" % (title, title)
+	current = None
+	for year, season, events in iter_seasons(game, chunk_size):
+		if (year, season) != current:
+			if current is not None:
+				yield "</ul>\n"
+			with translation.override(language):
+				title = season_title(year, season)
+			yield "<h2>%s</h2>\n<ul class=\"events\">\n" % title
+			current = (year, season)
+		yield "\n".join(models.render_fragments(events, language)) + "\n"
+	if current is not None:
+		yield "</ul>\n"
+	yield "</body></html>\n"
+
+def iter_text(game, language, chunk_size=CHUNK_SIZE):
+	""" Yields the log of a game as plain text, one event per line """
+	current = None
+	with translation.override(language):
+		title = "%s\n" % game
+	yield title
+	for year, season, events in iter_seasons(game, chunk_size):
+		with translation.override(language):
+			lines = []
+			if (year, season) != current:
+				lines.append("\n%s\n" % season_title(year, season))
+				current = (year, season)
+			t = models.Translator()
+			for e in events:
+				lines.append("%s\n" % capfirst(e.get_concrete().render_message(t)))
+		yield "".join(lines)
@@ -0,0 +1,73 @@
+## Copyright (c) 2010 by Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+## This program is free software: you can redistribute it and/or modify it
+## under the terms of the GNU Affero General Public License as published by the
+## Free Software Foundation, either version 3 of the License, or (at your option
+## any later version.
+##
+## This program is distributed in the hope that it will be useful, but WITHOUT
+## ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+## FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+## for more details.
+##
+## You should have received a copy of the GNU Affero General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/agpl.txt>.
+##
+## This license is also included in the file COPYING
+##
+## AUTHOR: Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+
+
+""" This module reads and rebuilds the area activity counters of the games.
+
+"""
+
+from django.db import transaction
+from django.db.models import Sum
+
+from condottieri_events import models
+from condottieri_events.archive import iter_game_chunks
+
+def heatmap(game, per_season=False):
+	"""
+Returns the activity of each area of a game, with one query, as a dict keyed
+by area id, like::
+
+	{12: {'moves_in': 3, 'moves_out': 2, 'standoffs': 1, 'sieges': 0,
+		'disasters': 0, 'control_changes': 1}}
+
+If per_season is True, the values are dicts keyed by (year, season) instead.
+	"""
+	rows = models.AreaActivity.objects.filter(game=game)
+	result = {}
+	if per_season:
+		rows = rows.order_by('area', 'year', 'season').values_list('area', 'year',
+			'season', *models.ACTIVITY_COUNTERS)
+		for row in rows:
+			seasons = result.setdefault(row[0], {})
+			seasons[(row[1], row[2])] = dict(zip(models.ACTIVITY_COUNTERS, row[3:]))
+		return result
+	rows = rows.order_by('area').values('area').annotate(**dict((c, Sum(c))
+		for c in models.ACTIVITY_COUNTERS))
+	for row in rows:
+		result[row['area']] = dict((c, row[c]) for c in models.ACTIVITY_COUNTERS)
+	return result
+
+def rebuild_activity(game_id):
+	""" Computes again the activity counters of a game from its events """
+	totals = {}
+	for chunk in iter_game_chunks(game_id):
+		_add(totals, models.count_activity(chunk))
+	rows = []
+	for (game, area_id, year, season), counters in totals.items():
+		rows.append(models.AreaActivity(game_id=game, area_id=area_id,
+			year=year, season=season, **counters))
+	with transaction.atomic():
+		models.AreaActivity.objects.filter(game__id=game_id).delete()
+		models.AreaActivity.objects.bulk_create(rows, batch_size=500)
+	return len(rows)
+
+def _add(totals, counts):
+	for key, counters in counts.items():
+		t = totals.setdefault(key, {})
+		for c, n in counters.items():
+			t[c] = t.get(c, 0) + n
@@ -0,0 +1,179 @@
+## Copyright (c) 2010 by Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+## This program is free software: you can redistribute it and/or modify it
+## under the terms of the GNU Affero General Public License as published by the
+## Free Software Foundation, either version 3 of the License, or (at your option
+## any later version.
+##
+## This program is distributed in the hope that it will be useful, but WITHOUT
+## ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+## FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+## for more details.
+##
+## You should have received a copy of the GNU Affero General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/agpl.txt>.
+##
+## This license is also included in the file COPYING
+##
+## AUTHOR: Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+
+
+""" This module measures the cost of logging events.
+
+When EVENTS_INSTRUMENTATION is True, each signal handler and each event class
+records its number of calls, wall time, number of queries and failures.
+When it is False, the instrumented functions are called directly.
+
+The counters of each process are saved in the cache every
+EVENTS_METRICS_FLUSH seconds, and the event_metrics command shows them.
+EVENTS_METRICS_HOOK can be the dotted path of a function that is called
+after each measure with the arguments (kind, name, seconds, queries, failed).
+
+"""
+
+import atexit
+import functools
+import os
+import socket
+import threading
+from timeit import default_timer
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from condottieri_events import season_cache
+
+enabled = getattr(settings, 'EVENTS_INSTRUMENTATION', False)
+
+FLUSH_INTERVAL = getattr(settings, 'EVENTS_METRICS_FLUSH', 60)
+
+KEYS_KEY = 'condottieri_events:metrics:keys'
+
+_hook = None
+_hook_path = getattr(settings, 'EVENTS_METRICS_HOOK', None)
+if _hook_path:
+	_hook = import_string(_hook_path)
+
+_lock = threading.Lock()
+_stats = {}
+_last_flush = default_timer()
+
+def _empty():
+	return {'calls': 0, 'seconds': 0.0, 'queries': 0, 'failures': 0}
+
+def record(kind, name, seconds, queries, failed):
+	""" Adds a measure to the counters of kind ('handler' or 'event') """
+	global _last_flush
+	with _lock:
+		s = _stats.setdefault((kind, name), _empty())
+		s['calls'] += 1
+		s['seconds'] += seconds
+		s['queries'] += queries
+		if failed:
+			s['failures'] += 1
+		flush = default_timer() - _last_flush > FLUSH_INTERVAL
+		if flush:
+			_last_flush = default_timer()
+	if _hook is not None:
+		_hook(kind, name, seconds, queries, failed)
+	if flush:
+		save_snapshot()
+
+class _QueryCounter(object):
+	def __init__(self):
+		self.count = 0
+
+	def __call__(self, execute, sql, params, many, context):
+		self.count += 1
+		return execute(sql, params, many, context)
+
+class measure(object):
+	""" Context manager that records the cost of a block of code """
+	def __init__(self, kind, name):
+		self.kind = kind
+		self.name = name
+
+	def __enter__(self):
+		self.counter = _QueryCounter()
+		self.wrapper = None
+		if hasattr(connection, 'execute_wrapper'):
+			self.wrapper = connection.execute_wrapper(self.counter)
+			self.wrapper.__enter__()
+		self.start = default_timer()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		seconds = default_timer() - self.start
+		if self.wrapper is not None:
+			self.wrapper.__exit__(exc_type, exc_value, traceback)
+		record(self.kind, self.name, seconds, self.counter.count,
+			exc_type is not None)
+		return False
+
+def instrumented(func):
+	""" Decorator for the signal handlers """
+	name = func.__name__
+	@functools.wraps(func)
+	def wrapper(*args, **kwargs):
+		if not enabled:
+			return func(*args, **kwargs)
+		with measure('handler', name):
+			return func(*args, **kwargs)
+	return wrapper
+
+def get_stats():
+	""" Returns the counters of this process, as a dictionary
+	{kind: {name: counters}} """
+	stats = {}
+	with _lock:
+		for (kind, name), s in _stats.items():
+			stats.setdefault(kind, {})[name] = dict(s)
+	return stats
+
+def reset_stats():
+	with _lock:
+		_stats.clear()
+
+def _snapshot_key():
+	return 'condottieri_events:metrics:%s:%s' % (socket.gethostname(), os.getpid())
+
+def save_snapshot():
+	""" Saves the counters of this process in the cache """
+	stats = get_stats()
+	if not stats:
+		return
+	cache = caches[season_cache.CACHE_ALIAS]
+	key = _snapshot_key()
+	cache.set(key, stats, None)
+	keys = cache.get(KEYS_KEY) or []
+	if not key in keys:
+		keys.append(key)
+		cache.set(KEYS_KEY, keys, None)
+
+def load_snapshots():
+	""" Returns the sum of the counters saved by all the processes """
+	cache = caches[season_cache.CACHE_ALIAS]
+	keys = cache.get(KEYS_KEY) or []
+	total = {}
+	for stats in cache.get_many(keys).values():
+		for kind, names in stats.items():
+			for name, s in names.items():
+				t = total.setdefault(kind, {}).setdefault(name, _empty())
+				for counter, value in s.items():
+					t[counter] += value
+	return total
+
+def clear_snapshots():
+	cache = caches[season_cache.CACHE_ALIAS]
+	keys = cache.get(KEYS_KEY) or []
+	cache.delete_many(keys + [KEYS_KEY])
+
+def _save_at_exit():
+	if enabled:
+		try:
+			save_snapshot()
+		except Exception:
+			pass
+
+atexit.register(_save_at_exit)
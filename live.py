@@ -0,0 +1,193 @@
+## Copyright (c) 2010 by Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+## This program is free software: you can redistribute it and/or modify it
+## under the terms of the GNU Affero General Public License as published by the
+## Free Software Foundation, either version 3 of the License, or (at your option
+## any later version.
+##
+## This program is distributed in the hope that it will be useful, but WITHOUT
+## ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+## FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+## for more details.
+##
+## You should have received a copy of the GNU Affero General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/agpl.txt>.
+##
+## This license is also included in the file COPYING
+##
+## AUTHOR: Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+
+""" This module publishes the new events of each game to the clients that are
+watching it, without polling the database.
+
+Every saved event is published to an in-process hub. Each subscriber has a
+bounded buffer; a subscriber that does not read fast enough is dropped.
+
+If the site runs in several processes, EVENTS_LIVE_RELAY_ADDRESSES can list
+a local UDP address for each process, and EVENTS_LIVE_RELAY_BIND the address
+of the current one. Processes that share the settings can take their address
+from the EVENTS_LIVE_RELAY_BIND environment variable instead, as "host:port".
+The events published in a process are then relayed to the hubs of the other
+processes. The socket is bound when the first event is published or the
+first stream is opened, not when the module is imported.
+
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+
+try:
+	import queue
+except ImportError:
+	import Queue as queue
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+BUFFER_SIZE = getattr(settings, 'EVENTS_LIVE_BUFFER_SIZE', 100)
+RELAY_ADDRESSES = [tuple(a) for a in getattr(settings, 'EVENTS_LIVE_RELAY_ADDRESSES', [])]
+RELAY_BIND = getattr(settings, 'EVENTS_LIVE_RELAY_BIND', None)
+if os.environ.get('EVENTS_LIVE_RELAY_BIND'):
+	_host, _port = os.environ['EVENTS_LIVE_RELAY_BIND'].rsplit(':', 1)
+	RELAY_BIND = (_host, int(_port))
+
+class Subscription(object):
+	""" A bounded buffer of the messages of a game """
+	def __init__(self, game_id, maxsize=BUFFER_SIZE):
+		self.game_id = game_id
+		self.queue = queue.Queue(maxsize)
+		self.closed = False
+
+	def put(self, message):
+		""" Returns False if the buffer is full """
+		try:
+			self.queue.put_nowait(message)
+		except queue.Full:
+			return False
+		return True
+
+	def get(self, timeout=None):
+		""" Returns the next message, or None if there is none in timeout
+		seconds or the subscription has been closed """
+		try:
+			return self.queue.get(timeout=timeout)
+		except queue.Empty:
+			return None
+
+	def close(self):
+		self.closed = True
+		## wake up the reader
+		try:
+			self.queue.put_nowait(None)
+		except queue.Full:
+			pass
+
+class Hub(object):
+	""" Hub keeps the subscriptions of each game and fans out the messages """
+	def __init__(self):
+		self.subscriptions = {}
+		self.lock = threading.Lock()
+		self.stats = {'published': 0, 'delivered': 0, 'dropped': 0}
+
+	def has_subscribers(self, game_id):
+		return bool(self.subscriptions.get(game_id))
+
+	def subscribe(self, game_id, maxsize=BUFFER_SIZE):
+		subscription = Subscription(game_id, maxsize)
+		with self.lock:
+			self.subscriptions.setdefault(game_id, set()).add(subscription)
+		return subscription
+
+	def unsubscribe(self, subscription):
+		with self.lock:
+			subscriptions = self.subscriptions.get(subscription.game_id, set())
+			subscriptions.discard(subscription)
+			if not subscriptions:
+				self.subscriptions.pop(subscription.game_id, None)
+
+	def publish(self, game_id, message):
+		""" Sends a message to all the subscribers of a game. Subscribers with
+		a full buffer are dropped. """
+		with self.lock:
+			subscriptions = list(self.subscriptions.get(game_id, ()))
+			self.stats['published'] += 1
+		for s in subscriptions:
+			if s.put(message):
+				with self.lock:
+					self.stats['delivered'] += 1
+			else:
+				self.unsubscribe(s)
+				s.close()
+				with self.lock:
+					self.stats['dropped'] += 1
+				logger.info("Slow subscriber of game %s dropped", game_id)
+
+	def get_stats(self):
+		with self.lock:
+			return dict(self.stats)
+
+hub = Hub()
+
+class UDPRelay(object):
+	""" Relays the messages published in this process to other processes in
+	the same host, and publishes the messages that they send """
+	def __init__(self, bind, addresses, hub=hub):
+		self.bind = tuple(bind)
+		self.peers = [a for a in addresses if a != self.bind]
+		self.hub = hub
+		self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.sock.bind(self.bind)
+		self.thread = threading.Thread(target=self._listen,
+			name="condottieri-events-relay")
+		self.thread.daemon = True
+		self.thread.start()
+
+	def send(self, game_id, message):
+		data = json.dumps({'game': game_id, 'message': message}).encode('utf-8')
+		for peer in self.peers:
+			try:
+				self.sock.sendto(data, peer)
+			except socket.error:
+				logger.warning("Could not relay event to %s:%s", *peer)
+
+	def _listen(self):
+		while True:
+			try:
+				data, address = self.sock.recvfrom(65535)
+			except socket.error:
+				## the socket has been closed
+				return
+			try:
+				data = json.loads(data.decode('utf-8'))
+				self.hub.publish(data['game'], data['message'])
+			except Exception:
+				logger.exception("Invalid relayed message from %s:%s", *address)
+
+_relay = None
+_relay_lock = threading.Lock()
+
+def get_relay():
+	""" Returns the relay of this process, binding its socket the first time,
+	or None if no relay is configured """
+	global _relay
+	if not RELAY_BIND:
+		return None
+	with _relay_lock:
+		if _relay is None:
+			_relay = UDPRelay(RELAY_BIND, RELAY_ADDRESSES)
+	return _relay
+
+def publish_saved_events(sender, events, **kwargs):
+	""" Publishes the saved events to the hub and to the relay """
+	from condottieri_events.views import serialize_event
+	relay = get_relay()
+	for e in events:
+		if relay is None and not hub.has_subscribers(e.game_id):
+			continue
+		message = serialize_event(e)
+		hub.publish(e.game_id, message)
+		if relay is not None:
+			relay.send(e.game_id, message)
@@ -0,0 +1,151 @@
+## Copyright (c) 2010 by Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+## This program is free software: you can redistribute it and/or modify it
+## under the terms of the GNU Affero General Public License as published by the
+## Free Software Foundation, either version 3 of the License, or (at your option
+## any later version.
+##
+## This program is distributed in the hope that it will be useful, but WITHOUT
+## ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+## FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+## for more details.
+##
+## You should have received a copy of the GNU Affero General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/agpl.txt>.
+##
+## This license is also included in the file COPYING
+##
+## AUTHOR: Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+
+""" This module keeps an in-process cache of the scenario areas and countries
+that the events refer to.
+
+Areas and countries never change during a game, so the events are rendered
+from this cache instead of loading the related rows. The cache is keyed on
+the id and the active language, because the names are translated, and it
+has a bounded size with LRU eviction.
+
+"""
+
+import threading
+from collections import namedtuple, OrderedDict
+
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.utils import translation
+
+import condottieri_scenarios.models as scenarios
+
+## max number of entries in each cache
+CACHE_SIZE = getattr(settings, 'EVENTS_LOOKUP_CACHE_SIZE', 5000)
+
+class AreaInfo(namedtuple('AreaInfo', ['id', 'name', 'code', 'label'])):
+	__slots__ = ()
+
+	def __str__(self):
+		return self.label
+
+class CountryInfo(namedtuple('CountryInfo', ['id', 'name', 'static_name', 'label'])):
+	__slots__ = ()
+
+	def __str__(self):
+		return self.label
+
+class LRUCache(object):
+	""" A thread safe mapping with a bounded size """
+	def __init__(self, maxsize=CACHE_SIZE):
+		self.maxsize = maxsize
+		self.data = OrderedDict()
+		self.lock = threading.Lock()
+		self.hits = self.misses = 0
+
+	def __len__(self):
+		return len(self.data)
+
+	def get(self, key):
+		with self.lock:
+			try:
+				value = self.data.pop(key)
+			except KeyError:
+				self.misses += 1
+				return None
+			self.data[key] = value
+			self.hits += 1
+			return value
+
+	def put(self, key, value):
+		with self.lock:
+			self.data.pop(key, None)
+			self.data[key] = value
+			while len(self.data) > self.maxsize:
+				self.data.popitem(last=False)
+
+	def discard(self, id):
+		""" Removes all the entries of an id, in any language """
+		with self.lock:
+			for key in [k for k in self.data if k[0] == id]:
+				del self.data[key]
+
+	def clear(self):
+		with self.lock:
+			self.data.clear()
+			self.hits = self.misses = 0
+
+areas = LRUCache()
+countries = LRUCache()
+
+def area_info(area):
+	return AreaInfo(area.pk, str(area.name), area.code, str(area))
+
+def country_info(country):
+	return CountryInfo(country.pk, str(country.name), country.static_name, str(country))
+
+def get_area(area_id):
+	""" Returns an AreaInfo for the id, in the active language """
+	if area_id is None:
+		return None
+	key = (area_id, translation.get_language())
+	info = areas.get(key)
+	if info is None:
+		info = area_info(scenarios.Area.objects.get(pk=area_id))
+		areas.put(key, info)
+	return info
+
+def get_country(country_id):
+	""" Returns a CountryInfo for the id, in the active language """
+	if country_id is None:
+		return None
+	key = (country_id, translation.get_language())
+	info = countries.get(key)
+	if info is None:
+		info = country_info(scenarios.Country.objects.get(pk=country_id))
+		countries.put(key, info)
+	return info
+
+def warmup(setting, languages=None):
+	""" Loads all the areas of a setting, and all the countries, in the given
+	languages (by default, the active one) """
+	if languages is None:
+		languages = [translation.get_language()]
+	area_list = list(scenarios.Area.objects.filter(setting=setting))
+	country_list = list(scenarios.Country.objects.all())
+	for language in languages:
+		with translation.override(language):
+			for a in area_list:
+				areas.put((a.pk, language), area_info(a))
+			for c in country_list:
+				countries.put((c.pk, language), country_info(c))
+
+def clear():
+	areas.clear()
+	countries.clear()
+
+def _discard_area(sender, instance, **kwargs):
+	areas.discard(instance.pk)
+
+def _discard_country(sender, instance, **kwargs):
+	countries.discard(instance.pk)
+
+post_save.connect(_discard_area, sender=scenarios.Area)
+post_delete.connect(_discard_area, sender=scenarios.Area)
+post_save.connect(_discard_country, sender=scenarios.Country)
+post_delete.connect(_discard_country, sender=scenarios.Country)
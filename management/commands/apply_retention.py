@@ -0,0 +1,50 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from condottieri_events import retention
+
+BATCH_SIZE=1000
+
+class Command(BaseCommand):
+	"""
+This script applies the retention policy (EVENTS_RETENTION) to the events of
+finished games and reports the rows and bytes reclaimed in each tier.
+
+The events are deleted in batches, so the command can be interrupted and run
+again to resume the work.
+	"""
+	help = 'This command applies the retention policy to the events of finished games.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--batch-size', type=int, dest='batch_size',
+			default=BATCH_SIZE, help='Number of events deleted in each batch')
+		parser.add_argument('--sleep', type=float, dest='sleep', default=0,
+			help='Seconds to wait between batches')
+		parser.add_argument('--dry-run', action='store_true', dest='dry_run',
+			default=False, help='Only count the events that would be deleted')
+		parser.add_argument('--json', action='store_true', dest='json',
+			default=False, help='Write the report as JSON')
+
+	def handle(self, *args, **options):
+		if options['batch_size'] <= 0:
+			raise CommandError('The batch size must be a positive integer')
+		def progress(classname, game_id, count):
+			if not options['json']:
+				self.stdout.write("Game %s: %s %s events deleted" % (game_id,
+					count, classname))
+		try:
+			report = retention.apply_policy(batch_size=options['batch_size'],
+				sleep=options['sleep'], dry_run=options['dry_run'],
+				progress=progress)
+		except ValueError as e:
+			raise CommandError(str(e))
+		if options['json']:
+			self.stdout.write(json.dumps(report, indent=2, sort_keys=True))
+			return
+		for tier in sorted(report.keys()):
+			r = report[tier]
+			self.stdout.write("%s: %s rows, %.1f KB" % (tier, r['rows'],
+				r['bytes'] / 1024.0))
+			for classname, rows in sorted(r['classes'].items()):
+				self.stdout.write("  %s: %s rows" % (classname, rows))
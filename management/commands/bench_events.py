@@ -0,0 +1,62 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from condottieri_events.benchmarks import suite
+import machiavelli.models as machiavelli
+
+class Command(BaseCommand):
+	"""
+This script generates a synthetic log in a game and times the main operations
+of the events application. The results are written as JSON.
+
+All the events of the game are deleted, so it must only be run on a game
+that is used for benchmarking.
+	"""
+	help = 'This command times the main operations of the events application on a synthetic game log.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('game', type=int,
+			help='Id of the game. ALL ITS EVENTS WILL BE DELETED')
+		parser.add_argument('--years', type=int, dest='years', default=10,
+			help='Number of years in the synthetic log')
+		parser.add_argument('--events', type=int, dest='events', default=100,
+			help='Number of events in each season')
+		parser.add_argument('--log-count', type=int, dest='log_count',
+			default=1000, help='Number of events logged in the log_event benchmarks')
+		parser.add_argument('--pages', type=int, dest='pages', default=10,
+			help='Number of pages rendered')
+		parser.add_argument('--concrete-count', type=int, dest='concrete_count',
+			default=1000, help='Number of events loaded in the concrete benchmarks')
+		parser.add_argument('--render-count', type=int, dest='render_count',
+			default=500, help='Number of events in the render benchmarks')
+		parser.add_argument('--batch-size', type=int, dest='batch_size',
+			default=1000, help='Number of events deleted in each batch')
+		parser.add_argument('--seed', type=int, dest='seed', default=0,
+			help='Seed of the random generator')
+		parser.add_argument('--output', dest='output', default=None,
+			help='File where the results are written. Default is stdout')
+
+	def handle(self, *args, **options):
+		try:
+			game = machiavelli.Game.objects.get(pk=options['game'])
+		except machiavelli.Game.DoesNotExist:
+			raise CommandError('Game %s does not exist' % options['game'])
+		def progress(r):
+			self.stderr.write("%(name)s: %(count)s in %(seconds)ss" % r)
+		results = suite.run(game,
+			years=options['years'],
+			events_per_season=options['events'],
+			log_count=options['log_count'],
+			pages=options['pages'],
+			concrete_count=options['concrete_count'],
+			render_count=options['render_count'],
+			batch_size=options['batch_size'],
+			seed=options['seed'],
+			progress=progress)
+		data = json.dumps(results, indent=2, sort_keys=True)
+		if options['output']:
+			with open(options['output'], 'w') as f:
+				f.write(data)
+		else:
+			self.stdout.write(data)
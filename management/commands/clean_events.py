@@ -1,24 +1,87 @@
 from datetime import datetime, timedelta
 
 from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Sum
 
 from condottieri_events import models
+from condottieri_events import cleanup
+from condottieri_events import archive
 import machiavelli.models as machiavelli
 
 AGE=30*24*60*60
+BATCH_SIZE=1000
 
 class Command(BaseCommand):
 	"""
 This script deletes all events in finished games that are older than AGE days.
+
+The events are deleted one game at a time, in batches of primary keys, so
+the command can be interrupted and run again to resume the work.
 	"""
 	help = 'This command deletes all events in finished games that are older than AGE days.'
 
+	def add_arguments(self, parser):
+		parser.add_argument('--age', type=int, dest='age', default=AGE,
+			help='Minimum age, in seconds, of the last phase change')
+		parser.add_argument('--batch-size', type=int, dest='batch_size',
+			default=BATCH_SIZE, help='Number of events deleted in each batch')
+		parser.add_argument('--sleep', type=float, dest='sleep', default=0,
+			help='Seconds to wait between batches')
+		parser.add_argument('--dry-run', action='store_true', dest='dry_run',
+			default=False, help='Only count the events that would be deleted')
+		parser.add_argument('--archive', dest='archive', default=None,
+			help='Directory where the logs are archived before being deleted')
+		parser.add_argument('--game', type=int, action='append', dest='games',
+			default=None, help='Only clean this game (can be repeated)')
+
 	def handle_noargs(self, **options):
-		age = timedelta(0, AGE)
+		self.handle(**options)
+
+	def handle(self, *args, **options):
+		age = timedelta(0, options.get('age', AGE))
+		batch_size = options.get('batch_size', BATCH_SIZE)
+		if batch_size <= 0:
+			raise CommandError('The batch size must be a positive integer')
+		sleep = options.get('sleep', 0)
 		threshold = datetime.now() - age
-		print("Deleting events that were added before %s" % threshold)
-		old_events = models.BaseEvent.objects.filter(game__phase__exact=machiavelli.PHINACTIVE,
-									game__slots__exact=0,
-									game__last_phase_change__lt=threshold)
-		print("%s events will be deleted" % len(old_events))
-		old_events.delete()
+		self.stdout.write("Deleting events that were added before %s" % threshold)
+		finished = machiavelli.Game.objects.filter(phase=machiavelli.PHINACTIVE,
+			slots=0, last_phase_change__lt=threshold)
+		if options.get('games'):
+			finished = finished.filter(pk__in=options['games'])
+		counts = {}
+		for model in (models.BaseEvent, models.CompactEvent):
+			old_events = model.objects.filter(game__in=finished)
+			for game_id, n in old_events.order_by('game').values_list('game').annotate(
+				events=Count('id')):
+				counts[game_id] = counts.get(game_id, 0) + n
+		packed = models.PackedOrders.objects.filter(game__in=finished)
+		for game_id, n in packed.order_by('game').values_list('game').annotate(
+			orders=Sum('count')):
+			counts[game_id] = counts.get(game_id, 0) + n
+		games = sorted(counts.items())
+		## games whose events are gone but still have index rows
+		orphans = set(models.SeasonIndex.objects.filter(game__in=finished).values_list(
+			'game', flat=True))
+		orphans.update(models.SearchEntry.objects.filter(game__in=finished).values_list(
+			'game', flat=True))
+		orphans.difference_update([game_id for game_id, n in games])
+		games.extend([(game_id, 0) for game_id in sorted(orphans)])
+		total = sum([n for game_id, n in games])
+		self.stdout.write("%s events will be deleted in %s games" % (total, len(games)))
+		if options.get('dry_run', False):
+			for game_id, n in games:
+				self.stdout.write("Game %s: %s events" % (game_id, n))
+			return
+		archive_dir = options.get('archive', None)
+		deleted = 0
+		for game_id, n in games:
+			def progress(count):
+				self.stdout.write("Game %s: %s/%s events deleted (%s/%s in total)" % (
+					game_id, count, n, deleted + count, total))
+			if archive_dir and n:
+				game = machiavelli.Game.objects.get(pk=game_id)
+				path = archive.archive_game(game, archive_dir)
+				self.stdout.write("Game %s archived in %s" % (game_id, path))
+			deleted += cleanup.purge_game(game_id, batch_size, sleep, progress)
+		self.stdout.write("%s events deleted" % deleted)
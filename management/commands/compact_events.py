@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from condottieri_events import models
+from condottieri_events import compact
+
+class Command(BaseCommand):
+	"""
+This script moves the events of the given games (or of all the games) to the
+single CompactEvent table.
+	"""
+	help = 'This command moves the events of the given games to the CompactEvent table.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('games', nargs='*', type=int,
+			help='Ids of the games. If empty, all the games are compacted')
+		parser.add_argument('--batch-size', type=int, dest='batch_size',
+			default=1000, help='Number of events moved in each batch')
+
+	def handle(self, *args, **options):
+		games = options['games']
+		if not games:
+			games = models.BaseEvent.objects.order_by('game').values_list(
+				'game', flat=True).distinct()
+		for game_id in list(games):
+			def progress(count):
+				self.stdout.write("Game %s: %s events moved" % (game_id, count))
+			compact.compact_game(game_id, options['batch_size'], progress)
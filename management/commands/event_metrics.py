@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from condottieri_events import instrumentation
+
+class Command(BaseCommand):
+	"""
+This script shows the counters of the signal handlers and event classes,
+as saved by all the processes with EVENTS_INSTRUMENTATION enabled.
+	"""
+	help = 'This command shows the time and queries spent by each event handler and class.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--json', action='store_true', dest='json',
+			default=False, help='Write the counters as JSON')
+		parser.add_argument('--reset', action='store_true', dest='reset',
+			default=False, help='Delete the saved counters after showing them')
+
+	def handle(self, *args, **options):
+		stats = instrumentation.load_snapshots()
+		if options['json']:
+			self.stdout.write(json.dumps(stats, indent=2, sort_keys=True))
+		else:
+			for kind in sorted(stats.keys()):
+				self.stdout.write("%-32s %8s %10s %8s %8s %8s" % (kind, 'calls',
+					'seconds', 'ms/call', 'queries', 'failures'))
+				rows = sorted(stats[kind].items(), key=lambda r: -r[1]['seconds'])
+				for name, s in rows:
+					self.stdout.write("%-32s %8d %10.3f %8.2f %8d %8d" % (name,
+						s['calls'], s['seconds'], 1000 * s['seconds'] / s['calls'],
+						s['queries'], s['failures']))
+				self.stdout.write("")
+		if options['reset']:
+			instrumentation.clear_snapshots()
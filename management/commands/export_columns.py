@@ -0,0 +1,34 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from condottieri_events import columnar
+from condottieri_events import analytics
+
+class Command(BaseCommand):
+	"""
+This script exports the events of the given games (or of all the games) to
+a directory of .npy files, one per column, and optionally prints the
+statistics of analytics.py. It needs NumPy.
+	"""
+	help = 'This command exports the events to NumPy arrays.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('directory', help='Directory of the .npy files')
+		parser.add_argument('games', nargs='*', type=int,
+			help='Ids of the games. If empty, all the games are exported')
+		parser.add_argument('--summary', action='store_true', dest='summary',
+			default=False, help='Print the statistics of the exported events')
+
+	def handle(self, *args, **options):
+		try:
+			columnar.require_numpy()
+		except ImportError as e:
+			raise CommandError(str(e))
+		arrays = columnar.export_arrays(options['games'] or None)
+		columnar.save_arrays(arrays, options['directory'])
+		self.stdout.write("%s events exported to %s" % (len(arrays['game']),
+			options['directory']))
+		if options['summary']:
+			self.stdout.write(json.dumps(analytics.summary(arrays), indent=2,
+				sort_keys=True))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from condottieri_events import models
+from condottieri_events import packing
+import machiavelli.models as machiavelli
+
+class Command(BaseCommand):
+	"""
+This script packs the orders of the finished seasons of the given games (or
+of all the games) into PackedOrders, one row per country and phase.
+	"""
+	help = 'This command packs the orders of the finished seasons of the given games.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('games', nargs='*', type=int,
+			help='Ids of the games. If empty, all the games are packed')
+
+	def handle(self, *args, **options):
+		games = options['games']
+		if not games:
+			games = models.OrderEvent.objects.order_by('game').values_list(
+				'game', flat=True).distinct()
+		for game in machiavelli.Game.objects.filter(pk__in=list(games)):
+			def progress(year, season, count):
+				self.stdout.write("Game %s: %s orders packed (%s, %s)" % (game.pk,
+					count, year, season))
+			packing.pack_game(game, progress)
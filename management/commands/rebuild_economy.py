@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from condottieri_events import models
+from condottieri_events import economy
+
+class Command(BaseCommand):
+	"""
+This script computes again the economy rollups of the given games (or of
+all the games) from their IncomeEvents and ExpenseEvents, in the event
+tables and in CompactEvent.
+	"""
+	help = 'This command computes again the economy rollups of the given games.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('games', nargs='*', type=int,
+			help='Ids of the games. If empty, all the games are rebuilt')
+
+	def handle(self, *args, **options):
+		games = options['games']
+		if not games:
+			games = set(models.BaseEvent.objects.filter(
+				classname__in=('IncomeEvent', 'ExpenseEvent')).order_by(
+				'game').values_list('game', flat=True).distinct())
+			games.update(models.CompactEvent.objects.filter(
+				kind__in=(models.KIND_CODES['IncomeEvent'],
+				models.KIND_CODES['ExpenseEvent'])).order_by(
+				'game').values_list('game', flat=True).distinct())
+		for game_id in sorted(games):
+			rows = economy.rebuild_economy(game_id)
+			self.stdout.write("Game %s: %s rows" % (game_id, rows))
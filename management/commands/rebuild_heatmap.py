@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from condottieri_events import models
+from condottieri_events import heatmap
+
+class Command(BaseCommand):
+	"""
+This script computes again the area activity counters of the given games (or
+of all the games) from their events.
+	"""
+	help = 'This command computes again the area activity counters of the given games.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('games', nargs='*', type=int,
+			help='Ids of the games. If empty, all the games are rebuilt')
+
+	def handle(self, *args, **options):
+		games = options['games']
+		if not games:
+			games = set(models.BaseEvent.objects.order_by('game').values_list(
+				'game', flat=True).distinct())
+			games.update(models.CompactEvent.objects.order_by('game').values_list(
+				'game', flat=True).distinct())
+			games = sorted(games)
+		for game_id in games:
+			rows = heatmap.rebuild_activity(game_id)
+			self.stdout.write("Game %s: %s rows" % (game_id, rows))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction, IntegrityError
+
+from condottieri_events import models
+
+class Command(BaseCommand):
+	"""
+This script renders again the stored html of the events, e.g. after the
+translations have changed.
+	"""
+	help = 'This command renders again the stored html of the events.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--game', type=int, dest='game',
+			help='Only rebuild the events of this game')
+		parser.add_argument('--batch-size', type=int, dest='batch_size',
+			default=500, help='Number of events rendered in each batch')
+
+	def handle(self, *args, **options):
+		events = models.BaseEvent.objects.order_by('id')
+		if options['game']:
+			events = events.filter(game__id=options['game'])
+		batch_size = options['batch_size']
+		last_id = 0
+		total = 0
+		while True:
+			batch = list(events.filter(id__gt=last_id)[:batch_size])
+			if not batch:
+				break
+			last_id = batch[-1].pk
+			concrete = models.load_concrete(batch)
+			self.replace(concrete)
+			total += len(batch)
+			self.stdout.write("%s events rendered" % total)
+
+	def replace(self, events):
+		""" Replaces the stored html of the events in a single transaction.
+		If get_rendered_html stores any of them in between, the transaction
+		fails and is run again. """
+		while True:
+			try:
+				with transaction.atomic():
+					models.RenderedEvent.objects.filter(
+						event__in=[e.pk for e in events]).delete()
+					models.store_rendered_events(events)
+				return
+			except IntegrityError:
+				continue
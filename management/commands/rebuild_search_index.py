@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from condottieri_events import models
+from condottieri_events import search
+
+class Command(BaseCommand):
+	"""
+This script builds again the search index of the given games (or of all the
+games) from their events.
+	"""
+	help = 'This command builds again the search index of the given games.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('games', nargs='*', type=int,
+			help='Ids of the games. If empty, all the games are indexed')
+		parser.add_argument('--chunk-size', type=int, dest='chunk_size',
+			default=500, help='Number of events indexed in each chunk')
+
+	def handle(self, *args, **options):
+		games = options['games']
+		if not games:
+			games = set(models.BaseEvent.objects.order_by('game').values_list(
+				'game', flat=True).distinct())
+			games.update(models.CompactEvent.objects.order_by('game').values_list(
+				'game', flat=True).distinct())
+			games = sorted(games)
+		for game_id in games:
+			def progress(count):
+				self.stdout.write("Game %s: %s events indexed" % (game_id, count))
+			search.rebuild_game(game_id, options['chunk_size'], progress)
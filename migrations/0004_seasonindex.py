@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+import django.db.models.deletion
+
+
+def fill_season_index(apps, schema_editor):
+    BaseEvent = apps.get_model('condottieri_events', 'BaseEvent')
+    SeasonIndex = apps.get_model('condottieri_events', 'SeasonIndex')
+    seasons = BaseEvent.objects.order_by().values('game', 'year', 'season').annotate(
+        events=Count('id'), first=Min('id'), last=Max('id'))
+    SeasonIndex.objects.bulk_create([
+        SeasonIndex(game_id=s['game'], year=s['year'], season=s['season'],
+            events=s['events'], first_event_id=s['first'],
+            last_event_id=s['last']) for s in seasons.iterator()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('machiavelli', '__first__'),
+        ('condottieri_events', '0003_baseevent_season_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeasonIndex',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField()),
+                ('season', models.PositiveIntegerField(choices=[(1, 'Spring'), (2, 'Summer'), (3, 'Fall')])),
+                ('events', models.PositiveIntegerField(default=0)),
+                ('first_event_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('last_event_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='machiavelli.Game')),
+            ],
+            options={
+                'ordering': ['-year', '-season'],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='seasonindex',
+            unique_together=set([('game', 'year', 'season')]),
+        ),
+        migrations.RunPython(fill_season_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('condottieri_events', '0004_seasonindex'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenderedEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(max_length=8)),
+                ('html', models.TextField()),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='condottieri_events.BaseEvent')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='renderedevent',
+            unique_together=set([('event', 'language')]),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('machiavelli', '__first__'),
+        ('condottieri_scenarios', '__first__'),
+        ('condottieri_events', '0005_renderedevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompactEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('season', models.PositiveSmallIntegerField(choices=[(1, 'Spring'), (2, 'Summer'), (3, 'Fall')])),
+                ('phase', models.PositiveSmallIntegerField(choices=[(0, 'Inactive game'), (1, 'Military adjustments'), (2, 'Order writing'), (3, 'Retreats'), (4, 'Strategic movement')])),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'NewUnitEvent'), (2, 'DisbandEvent'), (3, 'OrderEvent'), (4, 'StandoffEvent'), (5, 'ConversionEvent'), (6, 'ControlEvent'), (7, 'MovementEvent'), (8, 'RetreatEvent'), (9, 'UnitEvent'), (10, 'CountryEvent'), (11, 'DisasterEvent'), (12, 'IncomeEvent'), (13, 'ExpenseEvent'), (14, 'UncoverEvent')])),
+                ('unit_type', models.CharField(blank=True, max_length=1, null=True)),
+                ('code', models.CharField(blank=True, max_length=1, null=True)),
+                ('conversion', models.CharField(blank=True, max_length=1, null=True)),
+                ('subtype', models.CharField(blank=True, max_length=1, null=True)),
+                ('subcode', models.CharField(blank=True, max_length=1, null=True)),
+                ('subconversion', models.CharField(blank=True, max_length=1, null=True)),
+                ('message', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('ducats', models.PositiveIntegerField(blank=True, null=True)),
+                ('flag', models.BooleanField(default=False)),
+                ('area', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='condottieri_scenarios.Area')),
+                ('country', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='condottieri_scenarios.Country')),
+                ('destination', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='condottieri_scenarios.Area')),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='machiavelli.Game')),
+                ('subdestination', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='condottieri_scenarios.Area')),
+                ('suborigin', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='condottieri_scenarios.Area')),
+            ],
+            options={
+                'ordering': ['-year', '-season', '-id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='compactevent',
+            index=models.Index(fields=['game', 'year', 'season', 'id'], name='compact_game_season_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('machiavelli', '__first__'),
+        ('condottieri_events', '0006_compactevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BoardCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField()),
+                ('season', models.PositiveIntegerField(choices=[(1, 'Spring'), (2, 'Summer'), (3, 'Fall')])),
+                ('state', models.TextField()),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='machiavelli.Game')),
+            ],
+            options={
+                'ordering': ['-year', '-season'],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='boardcheckpoint',
+            unique_together=set([('game', 'year', 'season')]),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('machiavelli', '__first__'),
+        ('condottieri_scenarios', '__first__'),
+        ('condottieri_events', '0007_boardcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EconomyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField()),
+                ('season', models.PositiveIntegerField(choices=[(1, 'Spring'), (2, 'Summer'), (3, 'Fall')])),
+                ('kind', models.PositiveSmallIntegerField(choices=[(0, 'Income'), (1, 'Expense')])),
+                ('type', models.PositiveSmallIntegerField(default=0)),
+                ('ducats', models.PositiveIntegerField(default=0)),
+                ('events', models.PositiveIntegerField(default=0)),
+                ('country', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='condottieri_scenarios.Country')),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='machiavelli.Game')),
+            ],
+            options={
+                'ordering': ['game', 'country', 'year', 'season'],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='economyrollup',
+            unique_together=set([('game', 'country', 'year', 'season', 'kind', 'type')]),
+        ),
+    ]
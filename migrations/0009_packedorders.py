@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('machiavelli', '__first__'),
+        ('condottieri_scenarios', '__first__'),
+        ('condottieri_events', '0008_economyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackedOrders',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField()),
+                ('season', models.PositiveIntegerField(choices=[(1, 'Spring'), (2, 'Summer'), (3, 'Fall')])),
+                ('phase', models.PositiveSmallIntegerField(choices=[(0, 'Inactive game'), (1, 'Military adjustments'), (2, 'Order writing'), (3, 'Retreats'), (4, 'Strategic movement')])),
+                ('count', models.PositiveSmallIntegerField(default=0)),
+                ('data', models.BinaryField()),
+                ('country', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='condottieri_scenarios.Country')),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='machiavelli.Game')),
+            ],
+            options={
+                'ordering': ['game', 'year', 'season', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='packedorders',
+            index=models.Index(fields=['game', 'year', 'season'], name='packed_game_season_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('machiavelli', '__first__'),
+        ('condottieri_events', '0009_packedorders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key_type', models.PositiveSmallIntegerField(choices=[(0, 'area'), (1, 'country'), (2, 'kind'), (3, 'message')])),
+                ('key', models.PositiveIntegerField()),
+                ('year', models.PositiveIntegerField()),
+                ('season', models.PositiveIntegerField(choices=[(1, 'Spring'), (2, 'Summer'), (3, 'Fall')])),
+                ('event_id', models.PositiveIntegerField()),
+                ('compact', models.BooleanField(default=False)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='machiavelli.Game')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='searchentry',
+            index=models.Index(fields=['game', 'key_type', 'key', 'year', 'season', 'event_id'], name='search_key_idx'),
+        ),
+    ]
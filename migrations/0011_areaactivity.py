@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('machiavelli', '__first__'),
+        ('condottieri_scenarios', '__first__'),
+        ('condottieri_events', '0010_searchentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AreaActivity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField()),
+                ('season', models.PositiveIntegerField(choices=[(1, 'Spring'), (2, 'Summer'), (3, 'Fall')])),
+                ('moves_in', models.PositiveIntegerField(default=0)),
+                ('moves_out', models.PositiveIntegerField(default=0)),
+                ('standoffs', models.PositiveIntegerField(default=0)),
+                ('sieges', models.PositiveIntegerField(default=0)),
+                ('disasters', models.PositiveIntegerField(default=0)),
+                ('control_changes', models.PositiveIntegerField(default=0)),
+                ('area', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='condottieri_scenarios.Area')),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='machiavelli.Game')),
+            ],
+            options={
+                'ordering': ['game', 'area', 'year', 'season'],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='areaactivity',
+            unique_together=set([('game', 'area', 'year', 'season')]),
+        ),
+    ]
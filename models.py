@@ -20,8 +20,17 @@
 
 """
 
+import heapq
+import logging
+import struct
+
 ## django
-from django.db import models
+from django.apps import apps
+from django.conf import settings
+from django.db import models, transaction, IntegrityError
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import translation
+from django.utils.functional import Promise
 from django.utils.translation import ugettext_lazy as _
 from django.template.defaultfilters import capfirst
 
@@ -31,6 +40,58 @@ import machiavelli.signals as signals
 
 import condottieri_scenarios.models as scenarios
 
+from condottieri_events import writer
+from condottieri_events import async_writer
+from condottieri_events import season_cache
+from condottieri_events import lookups
+from condottieri_events import resolution
+from condottieri_events import live
+from condottieri_events import instrumentation
+from condottieri_events import signals as event_signals
+
+logger = logging.getLogger(__name__)
+
+EVENT_HTML = "<li class=\"%s %s\"><span class=\"%s\">%s</span></li>"
+
+## max number of ids in a single IN clause, to stay below the SQLite limit
+CONCRETE_CHUNK_SIZE = 500
+
+def load_concrete(events, select_related=False):
+	""" Takes a sequence of BaseEvents and returns a list with their concrete
+	events, in the same order. The child rows are loaded with one query per
+	child table. The events are rendered from the lookups cache, so the
+	relations in the related_fields of each class are only followed if
+	select_related is True.
+	"""
+	events = list(events)
+	by_class = {}
+	for e in events:
+		if type(e) is BaseEvent:
+			by_class.setdefault(e.classname, []).append(e.pk)
+	loaded = {}
+	for classname, ids in by_class.items():
+		model = apps.get_model(BaseEvent._meta.app_label, classname)
+		for i in range(0, len(ids), CONCRETE_CHUNK_SIZE):
+			qs = model.objects.filter(pk__in=ids[i:i + CONCRETE_CHUNK_SIZE])
+			if select_related:
+				qs = qs.select_related(*model.related_fields)
+			for obj in qs:
+				loaded[obj.pk] = obj
+	return [loaded.get(e.pk, e) for e in events]
+
+class EventQuerySet(models.QuerySet):
+	def for_game(self, game):
+		""" Returns the events of a game """
+		return self.filter(game=game)
+
+	def for_season(self, year, season):
+		""" Returns the events of a season, newest first """
+		return self.filter(year=year, season=season).order_by('-id')
+
+	def with_concrete(self):
+		""" Evaluates the queryset and returns a list of concrete events """
+		return load_concrete(self)
+
 class BaseEvent(models.Model):
 	"""
 BaseEvent is the parent class for all kind of game events.
@@ -40,19 +101,38 @@ BaseEvent is the parent class for all kind of game events.
 	season = models.PositiveIntegerField(choices=machiavelli.SEASONS)
 	phase = models.PositiveIntegerField(choices=machiavelli.GAME_PHASES)
 	classname = models.CharField(max_length=32, editable=False)
-	
+
+	objects = EventQuerySet.as_manager()
+
+	## relations that are needed to render the event
+	related_fields = ()
+
 	def get_concrete(self):
-		""" Gets the name of the child class of this BaseEvent """
+		""" Gets the child event of this BaseEvent. Child events, even unsaved
+		ones without a classname, are already concrete. """
+		if type(self) is not BaseEvent:
+			return self
 		return self.__getattribute__(self.classname.lower())
 
-	def unit_string(self, type, area):
+	def get_area(self, field='area'):
+		""" Returns the cached AreaInfo of an area field of the event """
+		return lookups.get_area(getattr(self, "%s_id" % field))
+
+	def get_country(self):
+		""" Returns the cached CountryInfo of the country of the event """
+		return lookups.get_country(getattr(self.get_concrete(), 'country_id', None))
+
+	def unit_string(self, type, area, t=str):
 		""" Returns a string like **the garrison in Naples** """
-		if type == 'A':
-			return _("the army in %s") % area.name
-		elif type == 'F':
-			return _("the fleet in %s") % area.name
-		elif type == 'G':
-			return _("the garrison in %s") % area.name
+		msg = UNIT_STRINGS.get(type)
+		if msg is None:
+			return None
+		return t(msg) % area.name
+
+	def render_message(self, t):
+		""" Returns the text of the event, translating the templates with
+		the function t (see Translator) """
+		return self.get_concrete().render_message(t)
 
 	def season_class(self):
 		""" Returns a css class name for the game season """
@@ -64,35 +144,116 @@ BaseEvent is the parent class for all kind of game events.
 
 	def country_class(self):
 		""" Returns a css class name if the event is related to a country """
-		try:
-			country = self.get_concrete().country.static_name
-		except:
-			country = ''
-		return country
+		country = self.get_country()
+		if country is None:
+			return ''
+		return country.static_name
 	
 	def color_output(self):
 		""" Returns a html list item with season and event styles """
-		return "<li class=\"%(season_class)s %(event_class)s\"><span class=\"%(country_class)s\">%(log)s</span></li>" % {
-							'season_class': self.season_class(),
-							'event_class': self.event_class(),
-							'country_class': self.country_class(),
-							'log': capfirst(self)
-							}
+		return EVENT_HTML % (self.season_class(), self.event_class(),
+			self.country_class(), capfirst(self))
 
 	def __str__(self):
-		return str(self.get_concrete())
+		return self.render_message(str)
 	
 	class Meta:
 		abstract = False
 		ordering = ['-year', '-season', '-id']
+		## every read is filtered by game and sorted by date, so this index
+		## serves both the season pages and the newest/oldest lookups
+		indexes = [
+			models.Index(fields=['game', 'year', 'season', 'id'],
+				name='events_game_season_idx'),
+		]
+
+## templates and names used to render the events
+UNIT_STRINGS = {
+	'A': _("the army in %s"),
+	'F': _("the fleet in %s"),
+	'G': _("the garrison in %s"),
+}
+
+UNIT_TYPE_NAMES = dict(machiavelli.UNIT_TYPES)
+
+class Translator(object):
+	"""
+Translator returns the text of lazy translated strings in the active language.
+Each string is translated only once, so a single Translator should be used
+to render a batch of events in the same language.
+	"""
+	def __init__(self):
+		self.cache = {}
+
+	def __call__(self, s):
+		if not isinstance(s, Promise):
+			return s
+		## the string is kept with its text, so that its id is not reused
+		## by another string while it is in the cache
+		try:
+			return self.cache[id(s)][1]
+		except KeyError:
+			text = str(s)
+			self.cache[id(s)] = (s, text)
+			return text
+
+def render_fragments(events, language=None):
+	""" Returns a list with the html of each event, in the given language or
+	in the active one """
+	if language is None:
+		language = translation.get_language()
+	events = load_concrete(events)
+	fragments = []
+	with translation.override(language):
+		t = Translator()
+		for e in events:
+			e = e.get_concrete()
+			if not hasattr(e, 'render_message'):
+				fragments.append(str(e.color_output()))
+				continue
+			fragments.append(EVENT_HTML % (e.season_class(), e.event_class(),
+				e.country_class(), capfirst(e.render_message(t))))
+	return fragments
+
+def render_events(events, language=None):
+	""" Returns the html of a sequence of events """
+	return "".join(render_fragments(events, language))
+
+models.signals.post_save.connect(resolution.game_saved, sender=machiavelli.Game)
 
 def log_event(event_class, game, **kwargs):
-	""" Creates a new BaseEvent and its child event. """
+	""" Creates a new BaseEvent and its child event.
+
+	If EVENTS_STORAGE is 'compact', a CompactEvent is created instead.
+	If EVENTS_ASYNC is True, the event is handed to the background writer.
+	If there is an open batch (see writer.event_batch) the event is added to
+	it and written when the batch is flushed. Otherwise, it is saved at once.
+	Errors are logged, but never stop the game processing.
+	"""
 	try:
-		event = event_class(game=game, year=game.year, season=game.season, phase=game.phase, **kwargs)
-		event.save()
-	except:
-		pass
+		if instrumentation.enabled:
+			with instrumentation.measure('event', event_class.__name__):
+				_log_event(event_class, game, **kwargs)
+		else:
+			_log_event(event_class, game, **kwargs)
+	except Exception:
+		logger.exception("Could not log %s in game %s", event_class.__name__, game.pk)
+
+def _log_event(event_class, game, **kwargs):
+	if async_writer.ASYNC:
+		async_writer.submit(async_writer.describe_event(event_class, game, **kwargs))
+		return
+	event = event_class(game=game, year=game.year, season=game.season, phase=game.phase, **kwargs)
+	if STORAGE == 'compact':
+		event = CompactEvent.from_event(event)
+	batch = writer.current_batch()
+	if batch is not None:
+		batch.add(event)
+	else:
+		writer.save_event(event)
+
+## template of NewUnitEvent
+NEW_UNIT_MESSAGE = _("New %(type)s in %(area)s.")
 
 class NewUnitEvent(BaseEvent):
 	""" Event triggered when a new unit is placed in the map. """
@@ -100,58 +261,77 @@ class NewUnitEvent(BaseEvent):
 	country = models.ForeignKey(scenarios.Country, on_delete=models.CASCADE)
 	type = models.CharField(max_length=1, choices=machiavelli.UNIT_TYPES)
 	area = models.ForeignKey(scenarios.Area, on_delete=models.CASCADE)
-	
+	related_fields = ('country', 'area')
+
 	def event_class(self):
 		return "new-unit-event"
 
-	def __str__(self):
-		return _("New %(type)s in %(area)s.") % {
-						'country': self.country,
-						'type': self.get_type_display(),
-						'area': self.area.name
+	def render_message(self, t):
+		return t(NEW_UNIT_MESSAGE) % {
+						'country': self.get_country(),
+						'type': t(UNIT_TYPE_NAMES.get(self.type, self.type)),
+						'area': self.get_area('area').name
 						}
 
+@instrumentation.instrumented
 def log_new_unit(sender, **kwargs):
 	assert isinstance(sender, machiavelli.Unit), "sender must be a Unit"
-	log_event(NewUnitEvent, sender.player.game,
+	log_event(NewUnitEvent, resolution.game(resolution.player(sender)),
 					classname="NewUnitEvent",
-					country=sender.player.contender.country,
+					country=resolution.country(resolution.player(sender)),
 					type=sender.type,
-					area=sender.area.board_area)
+					area=resolution.area(sender))
 
 signals.unit_placed.connect(log_new_unit)
 
+## templates of DisbandEvent
+DISBAND_MESSAGE = _("%(type)s in %(area)s is disbanded.")
+AUTONOMOUS_DISBAND_MESSAGE = _("Autonomous %(type)s in %(area)s is disbanded.")
+
 class DisbandEvent(BaseEvent):
 	""" Event triggered when a unit is disbanded. """
 	country = models.ForeignKey(scenarios.Country, blank=True, null=True, on_delete=models.CASCADE)
 	type = models.CharField(max_length=1, choices=machiavelli.UNIT_TYPES)
 	area = models.ForeignKey(scenarios.Area, on_delete=models.CASCADE)
+	related_fields = ('country', 'area')
 
 	def event_class(self):
 		return "disband-event"
 
-	def __str__(self):
-		if self.country:
-			return _("%(type)s in %(area)s is disbanded.") % {
-						'country': self.country,
-						'type': self.get_type_display(),
-						'area': self.area.name
+	def render_message(self, t):
+		if self.country_id:
+			return t(DISBAND_MESSAGE) % {
+						'country': self.get_country(),
+						'type': t(UNIT_TYPE_NAMES.get(self.type, self.type)),
+						'area': self.get_area('area').name
 						}
 		else:
-			return _("Autonomous %(type)s in %(area)s is disbanded.") % {
-						'type': self.get_type_display(),
-						'area': self.area.name}
+			return t(AUTONOMOUS_DISBAND_MESSAGE) % {
+						'type': t(UNIT_TYPE_NAMES.get(self.type, self.type)),
+						'area': self.get_area('area').name}
 			
+@instrumentation.instrumented
 def log_disband(sender, **kwargs):
 	assert isinstance(sender, machiavelli.Unit), "sender must be a Unit"
-	log_event(DisbandEvent, sender.player.game,
+	log_event(DisbandEvent, resolution.game(resolution.player(sender)),
 					classname="DisbandEvent",
-					country=sender.player.contender.country,
+					country=resolution.country(resolution.player(sender)),
 					type=sender.type,
-					area=sender.area.board_area)
+					area=resolution.area(sender))
 
 signals.unit_disbanded.connect(log_disband)
 
+## templates of the orders, by code, and by code and subcode for supports
+ORDER_MESSAGES = {
+	'-': _("%(unit)s tries to go to %(area)s."),
+	'B': _("%(unit)s besieges the city."),
+	'=': _("%(unit)s tries to convert into %(type)s."),
+	'C': _("%(unit)s must convoy %(subunit)s to %(area)s."),
+	('S', 'H'): _("%(unit)s supports %(subunit)s to hold its position."),
+	('S', '-'): _("%(unit)s supports %(subunit)s to go to %(area)s."),
+	('S', '='): _("%(unit)s supports %(subunit)s to convert into %(type)s."),
+}
+
 class OrderEvent(BaseEvent):
 	""" Event triggered when an order is confirmed. """
 	country = models.ForeignKey(scenarios.Country, on_delete=models.CASCADE)
@@ -165,81 +345,50 @@ class OrderEvent(BaseEvent):
 	subcode = models.CharField(max_length=1, choices=machiavelli.ORDER_CODES, blank=True, null=True)
 	subdestination = models.ForeignKey(scenarios.Area, blank=True, null=True, related_name='event_subdestination', on_delete=models.CASCADE)
 	subconversion = models.CharField(max_length=1, choices=machiavelli.UNIT_TYPES, blank=True, null=True)
+	related_fields = ('country', 'origin', 'destination', 'suborigin', 'subdestination')
 
 	def event_class(self):
 		return "order-event"
 
-	def __str__(self):
-		return self.get_message()
-		#country_info = "<small>(%s)</small>" % (unicode(self.country),)
-		#msg = self.get_message()
-		#return "%s %s" % (country_info, msg)
-	
-	def get_message(self):
-		unit = self.unit_string(self.type, self.origin)
+	def render_message(self, t):
+		if self.code == 'S':
+			msg = ORDER_MESSAGES[(self.code, self.subcode)]
+		else:
+			msg = ORDER_MESSAGES[self.code]
+		data = {'unit': self.unit_string(self.type, self.get_area('origin'), t)}
 		if self.code == '-':
-			msg = _("%(unit)s tries to go to %(area)s.") % {
-							'unit': unit,
-							'area': self.destination.name
-							}
-		elif self.code == 'B':
-			msg = _("%(unit)s besieges the city.") % {'unit': unit}
+			data['area'] = self.get_area('destination').name
 		elif self.code == '=':
-			msg = _("%(unit)s tries to convert into %(type)s.") % {
-							'unit': unit,
-							'type': self.get_conversion_display()
-							}
-		elif self.code == 'C':
-			msg = _("%(unit)s must convoy %(subunit)s to %(area)s.") % {
-							'unit': unit,
-							'subunit': self.unit_string(self.subtype,
-														self.suborigin),
-							'area': self.subdestination.name
-							}
-		elif self.code == 'S':
-			if self.subcode == 'H':
-				msg=_("%(unit)s supports %(subunit)s to hold its position.") % {
-							'unit': unit,
-							'subunit': self.unit_string(self.subtype,
-														self.suborigin)
-							}
-			elif self.subcode == '-':
-				msg = _("%(unit)s supports %(subunit)s to go to %(area)s.") % {
-							'unit': unit,
-							'subunit': self.unit_string(self.subtype,
-														self.suborigin),
-							'area': self.subdestination.name
-							}
+			data['type'] = t(UNIT_TYPE_NAMES.get(self.conversion, self.conversion))
+		elif self.code in ('C', 'S'):
+			data['subunit'] = self.unit_string(self.subtype,
+				self.get_area('suborigin'), t)
+			if self.code == 'C' or self.subcode == '-':
+				data['area'] = self.get_area('subdestination').name
 			elif self.subcode == '=':
-				msg = _("%(unit)s supports %(subunit)s to convert into %(type)s.") % {
-							'unit': unit,
-							'subunit': self.unit_string(self.subtype,
-														self.suborigin),
-							'type': self.get_subconversion_display()
-							}
-		return msg
+				data['type'] = t(UNIT_TYPE_NAMES.get(self.subconversion,
+					self.subconversion))
+		return t(msg) % data
 
+	def get_message(self):
+		return self.render_message(str)
+
+@instrumentation.instrumented
 def log_order(sender, **kwargs):
 	assert isinstance(sender, machiavelli.Order), "sender must be an Order"
-	try:
-		destination = sender.destination.board_area
-	except:
-		destination = None
+	destination = resolution.board_area(sender.destination)
 	if isinstance(sender.subunit, machiavelli.Unit):
 		subtype = sender.subunit.type
-		suborigin = sender.subunit.area.board_area
+		suborigin = resolution.area(sender.subunit)
 	else:
 		subtype = None
 		suborigin = None
-	try:
-		subdestination = sender.subdestination.board_area
-	except:
-		subdestination = None
-	log_event(OrderEvent, sender.unit.player.game,
+	subdestination = resolution.board_area(sender.subdestination)
+	log_event(OrderEvent, resolution.game(resolution.player(sender.unit)),
 					classname="OrderEvent",
-					country = sender.player.contender.country,
+					country = resolution.country(resolution.player(sender)),
 					type = sender.unit.type,
-					origin = sender.unit.area.board_area,
+					origin = resolution.area(sender.unit),
 					code = sender.code,
 					destination = destination,
 					conversion = sender.type,
@@ -251,26 +400,34 @@ def log_order(sender, **kwargs):
 
 signals.order_placed.connect(log_order)
 
+## template of StandoffEvent
+STANDOFF_MESSAGE = _("Conflicts in %(area)s result in a standoff.")
+
 class StandoffEvent(BaseEvent):
 	""" Event triggered when a standoff happens. """
 	area = models.ForeignKey(scenarios.Area, on_delete=models.CASCADE)
+	related_fields = ('area',)
 
 	def event_class(self):
 		return "standoff-event"
 
-	def __str__(self):
-		return _("Conflicts in %(area)s result in a standoff.") % {
-						'area': self.area.name,
+	def render_message(self, t):
+		return t(STANDOFF_MESSAGE) % {
+						'area': self.get_area('area').name,
 						}
 
+@instrumentation.instrumented
 def log_standoff(sender, **kwargs):
 	assert isinstance(sender, machiavelli.GameArea), "sender must be a GameArea"
-	log_event(StandoffEvent, sender.game,
+	log_event(StandoffEvent, resolution.game(sender),
 					classname="StandoffEvent",
-					area = sender.board_area)
+					area = resolution.board_area(sender))
 
 signals.standoff_happened.connect(log_standoff)
 
+## template of ConversionEvent
+CONVERSION_MESSAGE = _("%(unit)s converts into %(type)s.")
+
 class ConversionEvent(BaseEvent):
 	""" Event triggered when a unit changes its type. """
 
@@ -278,58 +435,69 @@ class ConversionEvent(BaseEvent):
 	area = models.ForeignKey(scenarios.Area, on_delete=models.CASCADE)
 	before = models.CharField(max_length=1, choices=machiavelli.UNIT_TYPES)
 	after = models.CharField(max_length=1, choices=machiavelli.UNIT_TYPES)
+	related_fields = ('country', 'area')
 
 	def event_class(self):
 		return "conversion-event"
 
-	def __str__(self):
-		return _("%(unit)s converts into %(type)s.") % {
-						'unit': self.unit_string(self.before, self.area),
-						'type': self.get_after_display()
+	def render_message(self, t):
+		return t(CONVERSION_MESSAGE) % {
+						'unit': self.unit_string(self.before, self.get_area('area'), t),
+						'type': t(UNIT_TYPE_NAMES.get(self.after, self.after))
 						}
 
+@instrumentation.instrumented
 def log_conversion(sender, **kwargs):
 	assert isinstance(sender, machiavelli.Unit), "sender must be a Unit"
-	log_event(ConversionEvent, sender.player.game,
+	log_event(ConversionEvent, resolution.game(resolution.player(sender)),
 					classname="ConversionEvent",
-					country=sender.player.contender.country,
-					area=sender.area.board_area,
+					country=resolution.country(resolution.player(sender)),
+					area=resolution.area(sender),
 					before=kwargs["before"],
 					after=kwargs["after"])
 
 signals.unit_converted.connect(log_conversion)
 
+## templates of ControlEvent
+NEW_HOME_MESSAGE = _("%(area)s is now home of %(country)s.")
+CONTROL_MESSAGE = _("%(country)s gets control of %(area)s.")
+
 class ControlEvent(BaseEvent):
 	""" Event triggered when a player gets the control of a province. """
 	country = models.ForeignKey(scenarios.Country, on_delete=models.CASCADE)
 	area = models.ForeignKey(scenarios.Area, on_delete=models.CASCADE)
 	new_home = models.BooleanField(default=False)
+	related_fields = ('country', 'area')
 
 	def event_class(self):
 		return "control-event"
 
-	def __str__(self):
+	def render_message(self, t):
 		if self.new_home:
-			return _("%(area)s is now home of %(country)s.") % {
-						'country': self.country,
-						'area': self.area.name
+			return t(NEW_HOME_MESSAGE) % {
+						'country': self.get_country(),
+						'area': self.get_area('area').name
 						}
 		else:
-			return _("%(country)s gets control of %(area)s.") % {
-						'country': self.country,
-						'area': self.area.name
+			return t(CONTROL_MESSAGE) % {
+						'country': self.get_country(),
+						'area': self.get_area('area').name
 						}
 
+@instrumentation.instrumented
 def log_control(sender, **kwargs):
 	assert isinstance(sender, machiavelli.GameArea), "sender must be a GameArea"
-	log_event(ControlEvent, sender.player.game,
+	log_event(ControlEvent, resolution.game(resolution.player(sender)),
 					classname="ControlEvent",
-					country=sender.player.contender.country,
-					area=sender.board_area,
+					country=resolution.country(resolution.player(sender)),
+					area=resolution.board_area(sender),
 					new_home=kwargs["new_home"])
 
 signals.area_controlled.connect(log_control)
 
+## template of MovementEvent
+MOVEMENT_MESSAGE = _("%(unit)s advances into %(destination)s.")
+
 class MovementEvent(BaseEvent):
 	""" Event triggered when a unit moves to a different province. """
 
@@ -337,27 +505,33 @@ class MovementEvent(BaseEvent):
 	type = models.CharField(max_length=1, choices=machiavelli.UNIT_TYPES)
 	origin = models.ForeignKey(scenarios.Area, related_name="movement_origin", on_delete=models.CASCADE)
 	destination = models.ForeignKey(scenarios.Area, related_name="movement_destination", on_delete=models.CASCADE)
+	related_fields = ('country', 'origin', 'destination')
 
 	def event_class(self):
 		return "movement-event"
 
-	def __str__(self):
-		return _("%(unit)s advances into %(destination)s.") % {
-				'unit': self.unit_string(self.type,	self.origin),
-				'destination': self.destination.name
+	def render_message(self, t):
+		return t(MOVEMENT_MESSAGE) % {
+				'unit': self.unit_string(self.type,	self.get_area('origin'), t),
+				'destination': self.get_area('destination').name
 				}
 
+@instrumentation.instrumented
 def log_movement(sender, **kwargs):
 	assert isinstance(sender, machiavelli.Unit), "sender must be a Unit"
-	log_event(MovementEvent, sender.player.game,
+	log_event(MovementEvent, resolution.game(resolution.player(sender)),
 					classname="MovementEvent",
-					country = sender.player.contender.country,
+					country = resolution.country(resolution.player(sender)),
 					type=sender.type,
-					origin=sender.area.board_area,
-					destination=kwargs['destination'].board_area)
+					origin=resolution.area(sender),
+					destination=resolution.board_area(kwargs['destination']))
 
 signals.unit_moved.connect(log_movement)
 
+## templates of RetreatEvent
+GARRISON_MESSAGE = _("%(unit)s garrisons in the city.")
+RETREAT_MESSAGE = _("%(unit)s retreats to %(destination)s.")
+
 class RetreatEvent(BaseEvent):
 	""" Event triggered when a unit retreats. """
 
@@ -365,30 +539,32 @@ class RetreatEvent(BaseEvent):
 	type = models.CharField(max_length=1, choices=machiavelli.UNIT_TYPES)
 	origin = models.ForeignKey(scenarios.Area, related_name="retreat_origin", on_delete=models.CASCADE)
 	destination = models.ForeignKey(scenarios.Area, related_name="retreat_destination", on_delete=models.CASCADE)
+	related_fields = ('country', 'origin', 'destination')
 
 	def event_class(self):
 		return "movement-event"
 
-	def __str__(self):
-		if self.origin == self.destination:
-			return _("%(unit)s garrisons in the city.") % {
-					'unit': self.unit_string(self.type,	self.origin),
-					'destination': self.destination.name
+	def render_message(self, t):
+		if self.origin_id == self.destination_id:
+			return t(GARRISON_MESSAGE) % {
+					'unit': self.unit_string(self.type,	self.get_area('origin'), t),
+					'destination': self.get_area('destination').name
 					}
 		else:
-			return _("%(unit)s retreats to %(destination)s.") % {
-					'unit': self.unit_string(self.type,	self.origin),
-					'destination': self.destination.name
+			return t(RETREAT_MESSAGE) % {
+					'unit': self.unit_string(self.type,	self.get_area('origin'), t),
+					'destination': self.get_area('destination').name
 					}
 
+@instrumentation.instrumented
 def log_retreat(sender, **kwargs):
 	assert isinstance(sender, machiavelli.Unit), "sender must be a Unit"
-	log_event(RetreatEvent, sender.player.game,
+	log_event(RetreatEvent, resolution.game(resolution.player(sender)),
 					classname="RetreatEvent",
-					country = sender.player.contender.country,
+					country = resolution.country(resolution.player(sender)),
 					type=sender.type,
-					origin=sender.area.board_area,
-					destination=kwargs['destination'].board_area)
+					origin=resolution.area(sender),
+					destination=resolution.board_area(kwargs['destination']))
 
 signals.unit_retreated.connect(log_retreat)
 
@@ -401,6 +577,17 @@ UNIT_EVENTS = (
 	(5, _('becomes autonomous.')),
 )
 
+UNIT_EVENT_MESSAGES = dict(UNIT_EVENTS)
+
+UNIT_EVENT_CLASSES = {
+	0: 'broken-support-event',
+	1: 'retreat-event',
+	2: 'surrender-event',
+	3: 'besieging-event',
+	4: 'bribe-event',
+	5: 'bribe-event',
+}
+
 class UnitEvent(BaseEvent):
 	""" Event triggered when a unit is subject to some conditions.
 
@@ -425,87 +612,85 @@ class UnitEvent(BaseEvent):
 	type = models.CharField(max_length=1, choices=machiavelli.UNIT_TYPES)
 	area = models.ForeignKey(scenarios.Area, on_delete=models.CASCADE)
 	message = models.PositiveIntegerField(choices=UNIT_EVENTS)
-	
+	related_fields = ('country', 'area')
+
 	def event_class(self):
-		if self.message == 0:
-			return 'broken-support-event'
-		elif self.message == 1:
-			return 'retreat-event'
-		elif self.message == 2:
-			return 'surrender-event'
-		elif self.message == 3:
-			return 'besieging-event'
-		elif self.message == 4 or self.message == 5:
-			return 'bribe-event'
+		return UNIT_EVENT_CLASSES.get(self.message)
 
-	def __str__(self):
+	def render_message(self, t):
 		return "%(unit)s %(message)s" % {
-						'unit': self.unit_string(self.type, self.area),
-						'message': self.get_message_display()
+						'unit': self.unit_string(self.type, self.get_area('area'), t),
+						'message': t(UNIT_EVENT_MESSAGES.get(self.message, self.message))
 						}
 
+@instrumentation.instrumented
 def log_broken_support(sender, **kwargs):
 	assert isinstance(sender, machiavelli.Unit), "sender must be a Unit"
-	log_event(UnitEvent, sender.player.game,
+	log_event(UnitEvent, resolution.game(resolution.player(sender)),
 					classname="UnitEvent",
-					country = sender.player.contender.country,
+					country = resolution.country(resolution.player(sender)),
 					type=sender.type,
-					area=sender.area.board_area,
+					area=resolution.area(sender),
 					message=0)
 
 signals.support_broken.connect(log_broken_support)
 
+@instrumentation.instrumented
 def log_forced_retreat(sender, **kwargs):
 	assert isinstance(sender, machiavelli.Unit), "sender must be a Unit"
-	log_event(UnitEvent, sender.player.game,
+	log_event(UnitEvent, resolution.game(resolution.player(sender)),
 				classname="UnitEvent",
-				country = sender.player.contender.country,
+				country = resolution.country(resolution.player(sender)),
 				type=sender.type,
-				area=sender.area.board_area,
+				area=resolution.area(sender),
 				message=1)
 
 signals.forced_to_retreat.connect(log_forced_retreat)
 
+@instrumentation.instrumented
 def log_unit_surrender(sender, **kwargs):
 	assert isinstance(sender, machiavelli.Unit), "sender must be a Unit"
-	log_event(UnitEvent, sender.player.game,
+	log_event(UnitEvent, resolution.game(resolution.player(sender)),
 				classname="UnitEvent",
-				country = sender.player.contender.country,
+				country = resolution.country(resolution.player(sender)),
 				type=sender.type,
-				area=sender.area.board_area,
+				area=resolution.area(sender),
 				message=2)
 
 signals.unit_surrendered.connect(log_unit_surrender)
 
+@instrumentation.instrumented
 def log_siege_start(sender, **kwargs):
 	assert isinstance(sender, machiavelli.Unit), "sender must be a Unit"
-	log_event(UnitEvent, sender.player.game,
+	log_event(UnitEvent, resolution.game(resolution.player(sender)),
 				classname="UnitEvent",
-				country = sender.player.contender.country,
+				country = resolution.country(resolution.player(sender)),
 				type=sender.type,
-				area=sender.area.board_area,
+				area=resolution.area(sender),
 				message=3)
 
 signals.siege_started.connect(log_siege_start)
 	
+@instrumentation.instrumented
 def log_change_country(sender, **kwargs):
 	assert isinstance(sender, machiavelli.Unit), "sender must be a Unit"
-	log_event(UnitEvent, sender.player.game,
+	log_event(UnitEvent, resolution.game(resolution.player(sender)),
 				classname="UnitEvent",
-				country = sender.player.contender.country,
+				country = resolution.country(resolution.player(sender)),
 				type=sender.type,
-				area=sender.area.board_area,
+				area=resolution.area(sender),
 				message=4)
 
 signals.unit_changed_country.connect(log_change_country)
 
+@instrumentation.instrumented
 def log_to_autonomous(sender, **kwargs):
 	assert isinstance(sender, machiavelli.Unit), "sender must be a Unit"
-	log_event(UnitEvent, sender.player.game,
+	log_event(UnitEvent, resolution.game(resolution.player(sender)),
 				classname="UnitEvent",
-				country = sender.player.contender.country,
+				country = resolution.country(resolution.player(sender)),
 				type=sender.type,
-				area=sender.area.board_area,
+				area=resolution.area(sender),
 				message=5)
 
 signals.unit_to_autonomous.connect(log_to_autonomous)
@@ -520,6 +705,8 @@ COUNTRY_EVENTS = (
 	(6, _('Leader suffered an assassination attempt')),
 )
 
+COUNTRY_EVENT_MESSAGES = dict(COUNTRY_EVENTS)
+
 class CountryEvent(BaseEvent):
 	""" Event triggered when a country is subject to some conditions.
 
@@ -543,75 +730,83 @@ class CountryEvent(BaseEvent):
 	"""
 	country = models.ForeignKey(scenarios.Country, on_delete=models.CASCADE)
 	message = models.PositiveIntegerField(choices=COUNTRY_EVENTS)
+	related_fields = ('country',)
 
-	def __str__(self):
+	def render_message(self, t):
 		return "%(country)s: %(message)s" % {
-									'country': self.country.name,
-									'message': self.get_message_display()
+									'country': self.get_country().name,
+									'message': t(COUNTRY_EVENT_MESSAGES.get(self.message, self.message))
 									}
 	
 	def event_class(self):
 		return "season_%(season)s" % {'season': self.season}
 
+@instrumentation.instrumented
 def log_overthrow(sender, **kwargs):
 	assert isinstance(sender, machiavelli.Revolution), "sender must be a Revolution"
-	log_event(CountryEvent, sender.game,
+	log_event(CountryEvent, resolution.game(sender),
 					classname="CountryEvent",
 					country = sender.country,
 					message = 0)
 
 signals.government_overthrown.connect(log_overthrow)
 
+@instrumentation.instrumented
 def log_conquering(sender, **kwargs):
 	assert isinstance(sender, machiavelli.Player), "sender must be a Player"
-	log_event(CountryEvent, sender.game,
+	log_event(CountryEvent, resolution.game(sender),
 					classname="CountryEvent",
 					country = kwargs['country'],
 					message = 1)
 
 signals.country_conquered.connect(log_conquering)
 
+@instrumentation.instrumented
 def log_excommunication(sender, **kwargs):
 	assert isinstance(sender, machiavelli.Player), "sender must be a Player"
-	log_event(CountryEvent, sender.game,
+	log_event(CountryEvent, resolution.game(sender),
 					classname="CountryEvent",
-					country = sender.contender.country,
+					country = resolution.country(sender),
 					message = 2)
 
 signals.country_excommunicated.connect(log_excommunication)
 
+@instrumentation.instrumented
 def log_elimination(sender, **kwargs):
 	assert isinstance(sender, machiavelli.Player), "sender must be a Player"
-	log_event(CountryEvent, sender.game,
+	log_event(CountryEvent, resolution.game(sender),
 					classname="CountryEvent",
 					country = kwargs['country'],
 					message = 3)
 
 signals.country_eliminated.connect(log_elimination)
 
+@instrumentation.instrumented
 def log_assassination(sender, **kwargs):
 	assert isinstance(sender, machiavelli.Player), "sender must be a Player"
-	log_event(CountryEvent, sender.game,
+	log_event(CountryEvent, resolution.game(sender),
 					classname="CountryEvent",
-					country = sender.contender.country,
+					country = resolution.country(sender),
 					message = 4)
 
 signals.player_assassinated.connect(log_assassination)
 
+@instrumentation.instrumented
 def log_lifted_excommunication(sender, **kwargs):
 	assert isinstance(sender, machiavelli.Player), "sender must be a Player"
-	log_event(CountryEvent, sender.game,
+	log_event(CountryEvent, resolution.game(sender),
 					classname="CountryEvent",
-					country = sender.contender.country,
+					country = resolution.country(sender),
 					message = 5)
 
 signals.country_forgiven.connect(log_lifted_excommunication)
 
+@instrumentation.instrumented
 def log_assassination_attempt(sender, **kwargs):
 	assert isinstance(sender, machiavelli.Player), "sender must be a Player"
-	log_event(CountryEvent, sender.game,
+	log_event(CountryEvent, resolution.game(sender),
 					classname="CountryEvent",
-					country = sender.contender.country,
+					country = resolution.country(sender),
 					message = 6)
 
 signals.assassination_attempted.connect(log_assassination_attempt)
@@ -623,6 +818,15 @@ DISASTER_EVENTS = (
 	(3, _('%(area)s is affected by a storm.')),
 )
 
+DISASTER_MESSAGES = dict(DISASTER_EVENTS)
+
+DISASTER_EVENT_CLASSES = {
+	0: "famine-event",
+	1: "plague-event",
+	2: "rebellion-event",
+	3: "storm-event",
+}
+
 class DisasterEvent(BaseEvent):
 	""" Event triggered when a province is affected by a disaster.
 
@@ -640,129 +844,130 @@ class DisasterEvent(BaseEvent):
 	"""
 	area = models.ForeignKey(scenarios.Area, on_delete=models.CASCADE)
 	message = models.PositiveIntegerField(choices=DISASTER_EVENTS)
+	related_fields = ('area',)
 
-	def __str__(self):
-		msg = self.get_message_display()
-		return msg % {'area': self.area.name,}
+	def render_message(self, t):
+		msg = t(DISASTER_MESSAGES.get(self.message, self.message))
+		return msg % {'area': self.get_area('area').name,}
 	
 	def event_class(self):
-		if self.message == 0:
-			return "famine-event"
-		elif self.message == 1:
-			return "plague-event"
-		elif self.message == 2:
-			return "rebellion-event"
-		elif self.message == 3:
-			return "storm-event"
-		else:
-			return ""
+		return DISASTER_EVENT_CLASSES.get(self.message, "")
 
+@instrumentation.instrumented
 def log_famine_marker(sender, **kwargs):
 	assert isinstance(sender, machiavelli.GameArea), "sender must be a GameArea"
-	log_event(DisasterEvent, sender.game,
+	log_event(DisasterEvent, resolution.game(sender),
 					classname="DisasterEvent",
-					area = sender.board_area,
+					area = resolution.board_area(sender),
 					message = 0)
 
 signals.famine_marker_placed.connect(log_famine_marker)
 
+@instrumentation.instrumented
 def log_plague(sender, **kwargs):
 	assert isinstance(sender, machiavelli.GameArea), "sender must be a GameArea"
-	log_event(DisasterEvent, sender.game,
+	log_event(DisasterEvent, resolution.game(sender),
 					classname="DisasterEvent",
-					area = sender.board_area,
+					area = resolution.board_area(sender),
 					message = 1)
 
 signals.plague_placed.connect(log_plague)
 
+@instrumentation.instrumented
 def log_rebellion(sender, **kwargs):
 	assert isinstance(sender, machiavelli.GameArea), "sender must be a GameArea"
-	log_event(DisasterEvent, sender.game,
+	log_event(DisasterEvent, resolution.game(sender),
 					classname="DisasterEvent",
-					area = sender.board_area,
+					area = resolution.board_area(sender),
 					message = 2)
 
 signals.rebellion_started.connect(log_rebellion)
 
+@instrumentation.instrumented
 def log_storm_marker(sender, **kwargs):
 	assert isinstance(sender, machiavelli.GameArea), "sender must be a GameArea"
-	log_event(DisasterEvent, sender.game,
+	log_event(DisasterEvent, resolution.game(sender),
 					classname="DisasterEvent",
-					area = sender.board_area,
+					area = resolution.board_area(sender),
 					message = 3)
 
 signals.storm_marker_placed.connect(log_storm_marker)
 
+## template of IncomeEvent
+INCOME_MESSAGE = _("%(country)s raises %(ducats)s ducats.")
+
 class IncomeEvent(BaseEvent):
 	""" Event triggered when a country receives income """
 	country = models.ForeignKey(scenarios.Country, on_delete=models.CASCADE)
 	ducats = models.PositiveIntegerField()
+	related_fields = ('country',)
 
 	def event_class(self):
 		return "income-event"
 
-	def __str__(self):
-		return _("%(country)s raises %(ducats)s ducats.") % {
-						'country': self.country,
+	def render_message(self, t):
+		return t(INCOME_MESSAGE) % {
+						'country': self.get_country(),
 						'ducats': self.ducats,
 						}
 
+@instrumentation.instrumented
 def log_income(sender, **kwargs):
 	assert isinstance(sender, machiavelli.Player), "sender must be a Player"
-	log_event(IncomeEvent, sender.game,
+	log_event(IncomeEvent, resolution.game(sender),
 					classname="IncomeEvent",
-					country=sender.contender.country,
+					country=resolution.country(sender),
 					ducats=kwargs['ducats'])
 
 signals.income_raised.connect(log_income)
 
+EXPENSE_MESSAGES = {
+	0: _("%(country)s pays %(ducats)sd to relief famine in %(area)s"),
+	1: _("%(country)s pays %(ducats)sd to pacify the rebellion in %(area)s"),
+	2: _("%(country)s pays %(ducats)sd to cause a rebellion in %(area)s"),
+	4: _("%(country)s pays %(ducats)sd to protect %(unit)s from bribes"),
+	5: _("%(country)s pays %(ducats)sd to disband %(unit)s"),
+	6: _("%(country)s pays %(ducats)sd to buy %(unit)s"),
+	7: _("%(country)s pays %(ducats)sd to turn %(unit)s into an autonomous garrison"),
+}
+EXPENSE_MESSAGES[3] = EXPENSE_MESSAGES[2]
+EXPENSE_MESSAGES[8] = EXPENSE_MESSAGES[5]
+EXPENSE_MESSAGES[9] = EXPENSE_MESSAGES[6]
+
+UNKNOWN_EXPENSE = _("Unknown expense")
+
 class ExpenseEvent(BaseEvent):
 	country = models.ForeignKey(scenarios.Country, on_delete=models.CASCADE)
 	ducats = models.PositiveIntegerField(default=0)
 	type = models.PositiveIntegerField(choices=machiavelli.EXPENSE_TYPES)
 	area = models.ForeignKey(scenarios.Area, null=True, blank=True, on_delete=models.CASCADE)
 	unit_type = models.CharField(max_length=1, choices=machiavelli.UNIT_TYPES, null=True, blank=True)
+	related_fields = ('country', 'area')
 
 	def event_class(self):
 		return "expense-event"
 
-	def __str__(self):
+	def render_message(self, t):
 		data = {
-			'country': self.country,
+			'country': self.get_country(),
 			'ducats' : self.ducats,
-			'area'   : self.area,
-			'unit'   : self.unit_string(self.unit_type, self.area),
+			'area'   : self.get_area('area'),
+			'unit'   : self.unit_string(self.unit_type, self.get_area('area'), t),
 		}
+		return t(EXPENSE_MESSAGES.get(self.type, UNKNOWN_EXPENSE)) % data
 
-		if self.type == 0:
-			msg = _("%(country)s pays %(ducats)sd to relief famine in %(area)s")
-		elif self.type == 1:
-			msg = _("%(country)s pays %(ducats)sd to pacify the rebellion in %(area)s")
-		elif self.type in (2, 3):
-			msg = _("%(country)s pays %(ducats)sd to cause a rebellion in %(area)s")
-		elif self.type == 4:
-			msg = _("%(country)s pays %(ducats)sd to protect %(unit)s from bribes")
-		elif self.type in (5, 8):
-			msg = _("%(country)s pays %(ducats)sd to disband %(unit)s")
-		elif self.type in (6, 9):
-			msg = _("%(country)s pays %(ducats)sd to buy %(unit)s")
-		elif self.type == 7:
-			msg = _("%(country)s pays %(ducats)sd to turn %(unit)s into an autonomous garrison")
-		else:
-			msg = _("Unknown expense")
-		return msg % data
-
+@instrumentation.instrumented
 def log_expense(sender, **kwargs):
 	assert isinstance(sender, machiavelli.Expense), "sender must be an Expense"
 	if sender.unit:
-		_area = sender.unit.area.board_area
+		_area = resolution.area(sender.unit)
 		_unit_type = sender.unit.type
 	else:
-		_area = sender.area.board_area
+		_area = resolution.area(sender)
 		_unit_type = ""
-	log_event(ExpenseEvent, sender.player.game,
+	log_event(ExpenseEvent, resolution.game(resolution.player(sender)),
 					classname="ExpenseEvent",
-					country=sender.player.contender.country,
+					country=resolution.country(resolution.player(sender)),
 					ducats=sender.ducats,
 					type=sender.type,
 					area=_area,
@@ -770,26 +975,711 @@ def log_expense(sender, **kwargs):
 
 signals.expense_paid.connect(log_expense)
 
+## template of UncoverEvent
+UNCOVER_MESSAGE = _("A spy from %(country)s is uncovered in %(area)s.")
+
 class UncoverEvent(BaseEvent):
 	""" Event triggered when a diplomat is uncovered. """
 	country = models.ForeignKey(scenarios.Country, blank=True, null=True, on_delete=models.CASCADE)
 	area = models.ForeignKey(scenarios.Area, on_delete=models.CASCADE)
+	related_fields = ('country', 'area')
 
 	def event_class(self):
 		return "uncover-event"
 
-	def __str__(self):
-		return _("A spy from %(country)s is uncovered in %(area)s.") % {
-					'country': self.country,
-					'area': self.area.name
+	def render_message(self, t):
+		return t(UNCOVER_MESSAGE) % {
+					'country': self.get_country(),
+					'area': self.get_area('area').name
 					}
 			
+@instrumentation.instrumented
 def log_uncover(sender, **kwargs):
 	assert isinstance(sender, machiavelli.Diplomat), "sender must be a Diplomat"
-	log_event(UncoverEvent, sender.player.game,
+	log_event(UncoverEvent, resolution.game(resolution.player(sender)),
 					classname="UncoverEvent",
-					country=sender.player.contender.country,
-					area=sender.area.board_area)
+					country=resolution.country(resolution.player(sender)),
+					area=resolution.area(sender))
 
 signals.diplomat_uncovered.connect(log_uncover)
 
+
+class SeasonIndex(models.Model):
+	"""
+SeasonIndex keeps one row for each season of a game that has events, so that
+the log can be paginated without scanning the events table.
+	"""
+	game = models.ForeignKey(machiavelli.Game, on_delete=models.CASCADE)
+	year = models.PositiveIntegerField()
+	season = models.PositiveIntegerField(choices=machiavelli.SEASONS)
+	events = models.PositiveIntegerField(default=0)
+	first_event_id = models.PositiveIntegerField(null=True, blank=True)
+	last_event_id = models.PositiveIntegerField(null=True, blank=True)
+
+	def __str__(self):
+		return "%s %s %s" % (self.game_id, self.year, self.season)
+
+	class Meta:
+		unique_together = (('game', 'year', 'season'),)
+		ordering = ['-year', '-season']
+
+def upsert(model, lookup, create, update):
+	"""
+Updates the row of model that matches lookup with the update expressions,
+or creates it with the create values if it does not exist yet.
+	"""
+	if model.objects.filter(**lookup).update(**update):
+		return
+	values = dict(lookup)
+	values.update(create)
+	try:
+		with transaction.atomic():
+			model.objects.create(**values)
+	except IntegrityError:
+		## created by a concurrent writer
+		model.objects.filter(**lookup).update(**update)
+
+def update_season_index(sender, events, **kwargs):
+	""" Adds the saved events to the season index of their games. Compact
+	events are counted, but first_event_id and last_event_id are ids of
+	BaseEvents only. """
+	counts = {}
+	for e in events:
+		if e.pk is None:
+			continue
+		key = (e.game_id, e.year, e.season)
+		n, first, last = counts.get(key, (0, None, None))
+		if isinstance(e, BaseEvent):
+			first = e.pk if first is None else min(first, e.pk)
+			last = e.pk if last is None else max(last, e.pk)
+		counts[key] = (n + 1, first, last)
+	for (game_id, year, season), (n, first, last) in counts.items():
+		update = {'events': models.F('events') + n}
+		if last is not None:
+			update['first_event_id'] = Coalesce('first_event_id', first)
+			update['last_event_id'] = Greatest(Coalesce('last_event_id', last), last)
+		upsert(SeasonIndex,
+			{'game_id': game_id, 'year': year, 'season': season},
+			{'events': n, 'first_event_id': first, 'last_event_id': last},
+			update)
+
+event_signals.events_saved.connect(update_season_index)
+
+## languages in which the events are rendered and stored when they are logged
+RENDER_LANGUAGES = getattr(settings, 'EVENTS_RENDER_LANGUAGES', ('ca', 'de', 'es', 'en'))
+## if True, the html of each event is stored when it is logged
+RENDER_STORE = getattr(settings, 'EVENTS_RENDER_STORE', False)
+
+class RenderedEvent(models.Model):
+	"""
+RenderedEvent stores the html output of an event in a given language, so that
+the log pages can be built without rendering the events again.
+	"""
+	event = models.ForeignKey(BaseEvent, on_delete=models.CASCADE)
+	language = models.CharField(max_length=8)
+	html = models.TextField()
+
+	def __str__(self):
+		return "%s (%s)" % (self.event_id, self.language)
+
+	class Meta:
+		unique_together = (('event', 'language'),)
+
+def store_rendered_events(events, languages=RENDER_LANGUAGES):
+	""" Renders and stores a list of saved, concrete events """
+	rows = []
+	for language in languages:
+		for e, html in zip(events, render_fragments(events, language)):
+			rows.append(RenderedEvent(event_id=e.pk, language=language,
+				html=html))
+	RenderedEvent.objects.bulk_create(rows, batch_size=500)
+
+def render_language(language=None):
+	"""
+Returns the code under which the events are rendered, stored and cached for
+the given language or the active one. Regional variants fall back to their
+generic language when only the latter is in RENDER_LANGUAGES (e.g. 'en-us' is
+stored as 'en').
+	"""
+	if language is None:
+		language = translation.get_language() or settings.LANGUAGE_CODE
+	language = translation.to_language(language)
+	if language in RENDER_LANGUAGES:
+		return language
+	generic = language.split('-')[0]
+	if generic in RENDER_LANGUAGES:
+		return generic
+	try:
+		return translation.get_supported_language_variant(language)
+	except LookupError:
+		return language
+
+def get_rendered_html(events, language=None):
+	"""
+Returns the html of a sequence of events, in the given language or in the
+active one. Stored fragments are used when they exist; the missing ones are
+rendered and, if the render store is enabled, stored for later reads. Compact
+events are never stored, and are always rendered.
+	"""
+	language = render_language(language)
+	events = list(events)
+	saved = [e for e in events if isinstance(e, BaseEvent)]
+	stored = {}
+	if saved:
+		stored = dict(RenderedEvent.objects.filter(language=language,
+			event__in=[e.pk for e in saved]).values_list('event_id', 'html'))
+	missing = [e for e in saved if not e.pk in stored]
+	if missing:
+		missing = load_concrete(missing)
+		for e, html in zip(missing, render_fragments(missing, language)):
+			stored[e.pk] = html
+		if RENDER_STORE and language in RENDER_LANGUAGES:
+			try:
+				with transaction.atomic():
+					RenderedEvent.objects.bulk_create([RenderedEvent(event_id=e.pk,
+						language=language, html=stored[e.pk]) for e in missing])
+			except IntegrityError:
+				## stored by a concurrent request
+				pass
+	compact = [e for e in events if not isinstance(e, BaseEvent)]
+	compact = dict(zip([id(e) for e in compact], render_fragments(compact, language)))
+	return "".join([stored[e.pk] if isinstance(e, BaseEvent) else compact[id(e)]
+		for e in events])
+
+def render_saved_events(sender, events, **kwargs):
+	if RENDER_STORE and issubclass(sender, BaseEvent):
+		store_rendered_events([e for e in events if e.pk is not None])
+
+event_signals.events_saved.connect(render_saved_events)
+event_signals.events_saved.connect(season_cache.invalidate_saved_events)
+event_signals.events_saved.connect(live.publish_saved_events)
+
+## storage engine for new events: 'default' (one table per event class) or
+## 'compact' (CompactEvent)
+STORAGE = getattr(settings, 'EVENTS_STORAGE', 'default')
+
+EVENT_KINDS = (
+	(1, 'NewUnitEvent'),
+	(2, 'DisbandEvent'),
+	(3, 'OrderEvent'),
+	(4, 'StandoffEvent'),
+	(5, 'ConversionEvent'),
+	(6, 'ControlEvent'),
+	(7, 'MovementEvent'),
+	(8, 'RetreatEvent'),
+	(9, 'UnitEvent'),
+	(10, 'CountryEvent'),
+	(11, 'DisasterEvent'),
+	(12, 'IncomeEvent'),
+	(13, 'ExpenseEvent'),
+	(14, 'UncoverEvent'),
+)
+
+KIND_CODES = dict([(name, code) for code, name in EVENT_KINDS])
+
+## column of CompactEvent where each field of the event classes is stored
+COMPACT_COLUMNS = {
+	'country': 'country',
+	'area': 'area',
+	'origin': 'area',
+	'destination': 'destination',
+	'suborigin': 'suborigin',
+	'subdestination': 'subdestination',
+	'type': 'unit_type',
+	'code': 'code',
+	'conversion': 'conversion',
+	'subtype': 'subtype',
+	'subcode': 'subcode',
+	'subconversion': 'subconversion',
+	'message': 'message',
+	'ducats': 'ducats',
+	'new_home': 'flag',
+}
+
+## exceptions to COMPACT_COLUMNS
+CLASS_COLUMNS = {
+	'ConversionEvent': {'before': 'unit_type', 'after': 'conversion'},
+	'ExpenseEvent': {'type': 'message', 'unit_type': 'unit_type'},
+}
+
+def compact_columns(classname):
+	columns = dict(COMPACT_COLUMNS)
+	columns.update(CLASS_COLUMNS.get(classname, {}))
+	return columns
+
+class CompactEvent(models.Model):
+	"""
+CompactEvent stores any kind of event in a single row of a single table,
+with the type of the event in a small integer and the data in typed,
+nullable columns. It renders like the event classes by building an unsaved
+instance of the right class (see as_event).
+	"""
+	game = models.ForeignKey(machiavelli.Game, on_delete=models.CASCADE)
+	year = models.PositiveSmallIntegerField()
+	season = models.PositiveSmallIntegerField(choices=machiavelli.SEASONS)
+	phase = models.PositiveSmallIntegerField(choices=machiavelli.GAME_PHASES)
+	kind = models.PositiveSmallIntegerField(choices=EVENT_KINDS)
+	country = models.ForeignKey(scenarios.Country, null=True, blank=True, related_name='+', on_delete=models.CASCADE)
+	area = models.ForeignKey(scenarios.Area, null=True, blank=True, related_name='+', on_delete=models.CASCADE)
+	destination = models.ForeignKey(scenarios.Area, null=True, blank=True, related_name='+', on_delete=models.CASCADE)
+	suborigin = models.ForeignKey(scenarios.Area, null=True, blank=True, related_name='+', on_delete=models.CASCADE)
+	subdestination = models.ForeignKey(scenarios.Area, null=True, blank=True, related_name='+', on_delete=models.CASCADE)
+	unit_type = models.CharField(max_length=1, null=True, blank=True)
+	code = models.CharField(max_length=1, null=True, blank=True)
+	conversion = models.CharField(max_length=1, null=True, blank=True)
+	subtype = models.CharField(max_length=1, null=True, blank=True)
+	subcode = models.CharField(max_length=1, null=True, blank=True)
+	subconversion = models.CharField(max_length=1, null=True, blank=True)
+	message = models.PositiveSmallIntegerField(null=True, blank=True)
+	ducats = models.PositiveIntegerField(null=True, blank=True)
+	flag = models.BooleanField(default=False)
+
+	objects = EventQuerySet.as_manager()
+
+	@classmethod
+	def from_event(cls, event):
+		""" Returns an unsaved CompactEvent with the data of a concrete event """
+		classname = event.__class__.__name__
+		compact = cls(game_id=event.game_id, year=event.year,
+			season=event.season, phase=event.phase, kind=KIND_CODES[classname])
+		columns = compact_columns(classname)
+		for f in event._meta.local_concrete_fields:
+			if f.primary_key:
+				continue
+			column = columns[f.name]
+			if f.is_relation:
+				setattr(compact, "%s_id" % column, getattr(event, f.attname))
+			else:
+				setattr(compact, column, getattr(event, f.attname))
+		return compact
+
+	def as_event(self):
+		""" Returns an unsaved instance of the concrete event class """
+		if not hasattr(self, '_event'):
+			classname = self.get_kind_display()
+			model = apps.get_model(self._meta.app_label, classname)
+			columns = compact_columns(classname)
+			kwargs = {}
+			for f in model._meta.local_concrete_fields:
+				if f.primary_key:
+					continue
+				column = columns[f.name]
+				if f.is_relation:
+					kwargs[f.attname] = getattr(self, "%s_id" % column)
+				else:
+					kwargs[f.attname] = getattr(self, column)
+			event = model(game_id=self.game_id, year=self.year,
+				season=self.season, phase=self.phase, classname=classname,
+				**kwargs)
+			event.compact_id = self.pk
+			self._event = event
+		return self._event
+
+	@property
+	def classname(self):
+		return self.get_kind_display()
+
+	def get_concrete(self):
+		return self.as_event()
+
+	def season_class(self):
+		return "season_%s" % self.season
+
+	def event_class(self):
+		return self.as_event().event_class()
+
+	def country_class(self):
+		return self.as_event().country_class()
+
+	def color_output(self):
+		return self.as_event().color_output()
+
+	def __str__(self):
+		return str(self.as_event())
+
+	class Meta:
+		ordering = ['-year', '-season', '-id']
+		indexes = [
+			models.Index(fields=['game', 'year', 'season', 'id'],
+				name='compact_game_season_idx'),
+		]
+
+def log_key(event):
+	"""
+Returns the chronological sort key of an event of the log. The log of a game
+may be split between the event tables and CompactEvent while it is being
+compacted, and compact_game moves the oldest events first, so the compact
+rows of a season come before the others.
+	"""
+	if isinstance(event, CompactEvent):
+		return (event.year, event.season, 0, event.pk)
+	return (event.year, event.season, 1, event.pk)
+
+def _iter_log_table(qs, rank, newest_first, after, chunk_size):
+	""" Yields the events of a queryset with keyset queries, in log order """
+	if newest_first:
+		qs = qs.order_by('-year', '-season', '-id')
+	else:
+		qs = qs.order_by('year', 'season', 'id')
+	last = None
+	if after is not None:
+		year, season, after_rank, pk = after
+		if rank == after_rank:
+			last = (year, season, pk)
+		elif (rank > after_rank) != newest_first:
+			## the whole season of the cursor comes after it
+			qs = qs.filter(_past_season(year, season, newest_first) |
+				models.Q(year=year, season=season))
+		else:
+			qs = qs.filter(_past_season(year, season, newest_first))
+	while True:
+		chunk = qs
+		if last is not None:
+			year, season, pk = last
+			if newest_first:
+				q = models.Q(year=year, season=season, id__lt=pk)
+			else:
+				q = models.Q(year=year, season=season, id__gt=pk)
+			chunk = chunk.filter(_past_season(year, season, newest_first) | q)
+		chunk = list(chunk[:chunk_size])
+		if not chunk:
+			break
+		for e in load_concrete(chunk):
+			yield e
+		e = chunk[-1]
+		last = (e.year, e.season, e.pk)
+
+def _past_season(year, season, newest_first):
+	if newest_first:
+		return models.Q(year__lt=year) | models.Q(year=year, season__lt=season)
+	return models.Q(year__gt=year) | models.Q(year=year, season__gt=season)
+
+def iter_log(game_id, newest_first=False, after=None, classnames=None,
+	seasons=None, chunk_size=CONCRETE_CHUNK_SIZE):
+	"""
+Yields the events of a game from the event tables and from CompactEvent,
+ordered by log_key. The events of the event tables are concrete, and the
+compact ones are CompactEvents (call get_concrete() to build the event).
+
+If after is the log_key of an event, only the events past it are yielded.
+classnames restricts the classes of the events, and seasons is an optional Q
+object on year and season. Both tables are read in chunks of chunk_size rows.
+	"""
+	base = BaseEvent.objects.filter(game__id=game_id)
+	compact = CompactEvent.objects.filter(game__id=game_id)
+	if classnames is not None:
+		base = base.filter(classname__in=classnames)
+		compact = compact.filter(kind__in=[KIND_CODES[c] for c in classnames])
+	if seasons is not None:
+		base = base.filter(seasons)
+		compact = compact.filter(seasons)
+	tables = [_iter_log_table(compact, 0, newest_first, after, chunk_size),
+		_iter_log_table(base, 1, newest_first, after, chunk_size)]
+	return heapq.merge(*tables, key=log_key, reverse=newest_first)
+
+def season_log(game_id, year, season):
+	""" Returns a list with the events of a season, newest first """
+	return list(iter_log(game_id, newest_first=True,
+		seasons=models.Q(year=year, season=season)))
+
+def count_log(game_id):
+	""" Returns the number of events of a game in both storages, plus its
+	packed orders """
+	packed = PackedOrders.objects.filter(game__id=game_id).aggregate(
+		orders=models.Sum('count'))['orders'] or 0
+	return BaseEvent.objects.filter(game__id=game_id).count() + \
+		CompactEvent.objects.filter(game__id=game_id).count() + packed
+
+class BoardCheckpoint(models.Model):
+	"""
+BoardCheckpoint stores the position of the units and the control of the
+provinces at the end of a season, so that the board can be reconstructed
+from the log without replaying it from the beginning (see board.py).
+	"""
+	game = models.ForeignKey(machiavelli.Game, on_delete=models.CASCADE)
+	year = models.PositiveIntegerField()
+	season = models.PositiveIntegerField(choices=machiavelli.SEASONS)
+	state = models.TextField()
+
+	def __str__(self):
+		return "%s %s %s" % (self.game_id, self.year, self.season)
+
+	class Meta:
+		unique_together = (('game', 'year', 'season'),)
+		ordering = ['-year', '-season']
+
+ECONOMY_KINDS = (
+	(0, _('Income')),
+	(1, _('Expense')),
+)
+
+class EconomyRollup(models.Model):
+	"""
+EconomyRollup keeps the total income of a country in a season, and its
+expenses of each type, so that the finance history of a game can be read
+without adding up the IncomeEvents and ExpenseEvents. Income rows have
+kind 0 and type 0; expense rows have kind 1 and the type of the expense.
+	"""
+	game = models.ForeignKey(machiavelli.Game, on_delete=models.CASCADE)
+	country = models.ForeignKey(scenarios.Country, related_name='+', on_delete=models.CASCADE)
+	year = models.PositiveIntegerField()
+	season = models.PositiveIntegerField(choices=machiavelli.SEASONS)
+	kind = models.PositiveSmallIntegerField(choices=ECONOMY_KINDS)
+	type = models.PositiveSmallIntegerField(default=0)
+	ducats = models.PositiveIntegerField(default=0)
+	events = models.PositiveIntegerField(default=0)
+
+	def __str__(self):
+		return "%s %s %s %s" % (self.game_id, self.country_id, self.year, self.season)
+
+	class Meta:
+		unique_together = (('game', 'country', 'year', 'season', 'kind', 'type'),)
+		ordering = ['game', 'country', 'year', 'season']
+
+def update_economy(sender, events, **kwargs):
+	""" Adds the saved income and expense events to the economy rollups """
+	totals = {}
+	for e in events:
+		if isinstance(e, CompactEvent):
+			e = e.as_event()
+		if e.classname == 'IncomeEvent':
+			key = (e.game_id, e.country_id, e.year, e.season, 0, 0)
+		elif e.classname == 'ExpenseEvent':
+			key = (e.game_id, e.country_id, e.year, e.season, 1, e.type)
+		else:
+			continue
+		ducats, n = totals.get(key, (0, 0))
+		totals[key] = (ducats + e.ducats, n + 1)
+	for (game_id, country_id, year, season, kind, type), (ducats, n) in totals.items():
+		upsert(EconomyRollup,
+			{'game_id': game_id, 'country_id': country_id, 'year': year,
+			'season': season, 'kind': kind, 'type': type},
+			{'ducats': ducats, 'events': n},
+			{'ducats': models.F('ducats') + ducats, 'events': models.F('events') + n})
+
+event_signals.events_saved.connect(update_economy, sender=IncomeEvent)
+event_signals.events_saved.connect(update_economy, sender=ExpenseEvent)
+event_signals.events_saved.connect(update_economy, sender=CompactEvent)
+
+## format of the packed orders: a version byte, then one record per order
+## with the unit type, code, conversion, subtype, subcode and subconversion
+## as single bytes and the origin, destination, suborigin and subdestination
+## as area ids (0 is None). Version 1 uses 2-byte ids, version 2 4-byte ids.
+PACKED_FORMATS = {1: struct.Struct('<6s4H'), 2: struct.Struct('<6s4I')}
+PACKED_CODES = ('type', 'code', 'conversion', 'subtype', 'subcode', 'subconversion')
+PACKED_AREAS = ('origin_id', 'destination_id', 'suborigin_id', 'subdestination_id')
+
+def pack_orders(orders):
+	""" Returns the packed bytes of a list of OrderEvents """
+	areas = [[getattr(o, f) or 0 for f in PACKED_AREAS] for o in orders]
+	version = 1
+	if any(a > 0xffff for ids in areas for a in ids):
+		version = 2
+	record = PACKED_FORMATS[version]
+	data = [struct.pack('<B', version)]
+	for o, ids in zip(orders, areas):
+		codes = "".join([getattr(o, f) or "\0" for f in PACKED_CODES])
+		data.append(record.pack(codes.encode('ascii'), *ids))
+	return b"".join(data)
+
+def unpack_orders(data):
+	""" Returns a list of dictionaries with the fields of the packed orders """
+	data = bytes(data)
+	record = PACKED_FORMATS[struct.unpack_from('<B', data)[0]]
+	orders = []
+	for offset in range(1, len(data), record.size):
+		values = record.unpack_from(data, offset)
+		fields = {}
+		for f, c in zip(PACKED_CODES, values[0].decode('ascii')):
+			fields[f] = None if c == "\0" else c
+		for f, a in zip(PACKED_AREAS, values[1:]):
+			fields[f] = a or None
+		orders.append(fields)
+	return orders
+
+class PackedOrders(models.Model):
+	"""
+PackedOrders stores all the orders of a country in a phase in a single row,
+as a binary record (see pack_orders). The orders of finished seasons can be
+moved here with the pack_orders command.
+	"""
+	game = models.ForeignKey(machiavelli.Game, on_delete=models.CASCADE)
+	year = models.PositiveIntegerField()
+	season = models.PositiveIntegerField(choices=machiavelli.SEASONS)
+	phase = models.PositiveSmallIntegerField(choices=machiavelli.GAME_PHASES)
+	country = models.ForeignKey(scenarios.Country, null=True, blank=True, related_name='+', on_delete=models.CASCADE)
+	count = models.PositiveSmallIntegerField(default=0)
+	data = models.BinaryField()
+
+	@classmethod
+	def from_orders(cls, orders):
+		""" Returns an unsaved record with a list of OrderEvents of the same
+		game, season, phase and country """
+		first = orders[0]
+		return cls(game_id=first.game_id, year=first.year, season=first.season,
+			phase=first.phase, country_id=first.country_id, count=len(orders),
+			data=pack_orders(orders))
+
+	def orders(self):
+		""" Returns the orders as unsaved OrderEvents """
+		return [OrderEvent(game_id=self.game_id, year=self.year,
+			season=self.season, phase=self.phase, classname='OrderEvent',
+			country_id=self.country_id, **fields)
+			for fields in unpack_orders(self.data)]
+
+	def __str__(self):
+		return "%s %s %s %s" % (self.game_id, self.country_id, self.year, self.season)
+
+	class Meta:
+		ordering = ['game', 'year', 'season', 'id']
+		indexes = [
+			models.Index(fields=['game', 'year', 'season'],
+				name='packed_game_season_idx'),
+		]
+
+def get_packed_orders(game, year, season):
+	""" Returns the packed orders of a season as a list of OrderEvents """
+	orders = []
+	for record in PackedOrders.objects.filter(game=game, year=year, season=season):
+		orders.extend(record.orders())
+	return orders
+
+## types of keys in the search index
+SEARCH_AREA = 0
+SEARCH_COUNTRY = 1
+SEARCH_KIND = 2
+SEARCH_MESSAGE = 3
+
+SEARCH_KEY_TYPES = (
+	(SEARCH_AREA, 'area'),
+	(SEARCH_COUNTRY, 'country'),
+	(SEARCH_KIND, 'kind'),
+	(SEARCH_MESSAGE, 'message'),
+)
+
+class SearchEntry(models.Model):
+	"""
+SearchEntry is a posting of the per-game inverted index of the log: it maps
+an area, a country, an event kind (see EVENT_KINDS) or a message (kind * 100
++ message) to an event. event_id is not a foreign key, so that deleting events
+does not touch the index; postings of deleted events are ignored when
+searching (see search.py).
+	"""
+	game = models.ForeignKey(machiavelli.Game, on_delete=models.CASCADE)
+	key_type = models.PositiveSmallIntegerField(choices=SEARCH_KEY_TYPES)
+	key = models.PositiveIntegerField()
+	year = models.PositiveIntegerField()
+	season = models.PositiveIntegerField(choices=machiavelli.SEASONS)
+	event_id = models.PositiveIntegerField()
+	compact = models.BooleanField(default=False)
+
+	def __str__(self):
+		return "%s %s %s %s" % (self.game_id, self.get_key_type_display(),
+			self.key, self.event_id)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['game', 'key_type', 'key', 'year', 'season', 'event_id'],
+				name='search_key_idx'),
+		]
+
+def search_entries(event):
+	""" Returns the unsaved SearchEntries of a saved event """
+	compact = isinstance(event, CompactEvent)
+	concrete = event.as_event() if compact else event.get_concrete()
+	kind = KIND_CODES[concrete.__class__.__name__]
+	keys = set([(SEARCH_KIND, kind)])
+	message = getattr(concrete, 'message', None)
+	if message is not None:
+		keys.add((SEARCH_MESSAGE, kind * 100 + message))
+	for field in concrete.related_fields:
+		value = getattr(concrete, "%s_id" % field)
+		if value is None:
+			continue
+		if field == 'country':
+			keys.add((SEARCH_COUNTRY, value))
+		else:
+			keys.add((SEARCH_AREA, value))
+	return [SearchEntry(game_id=event.game_id, key_type=key_type, key=key,
+		year=event.year, season=event.season, event_id=event.pk, compact=compact)
+		for key_type, key in sorted(keys)]
+
+def index_saved_events(sender, events, **kwargs):
+	""" Adds the saved events to the search index """
+	entries = []
+	for e in events:
+		if e.pk is not None:
+			entries.extend(search_entries(e))
+	SearchEntry.objects.bulk_create(entries, batch_size=500)
+
+event_signals.events_saved.connect(index_saved_events)
+
+## counters of AreaActivity
+ACTIVITY_COUNTERS = ('moves_in', 'moves_out', 'standoffs', 'sieges',
+	'disasters', 'control_changes')
+
+class AreaActivity(models.Model):
+	"""
+AreaActivity counts what happens in each area of a game in each season: the
+units that move in and out, standoffs, sieges, disasters and changes of
+control. The counters are updated when the events are saved, so the
+heatmap of a game can be read with one query (see heatmap.py).
+	"""
+	game = models.ForeignKey(machiavelli.Game, on_delete=models.CASCADE)
+	area = models.ForeignKey(scenarios.Area, related_name='+', on_delete=models.CASCADE)
+	year = models.PositiveIntegerField()
+	season = models.PositiveIntegerField(choices=machiavelli.SEASONS)
+	moves_in = models.PositiveIntegerField(default=0)
+	moves_out = models.PositiveIntegerField(default=0)
+	standoffs = models.PositiveIntegerField(default=0)
+	sieges = models.PositiveIntegerField(default=0)
+	disasters = models.PositiveIntegerField(default=0)
+	control_changes = models.PositiveIntegerField(default=0)
+
+	def __str__(self):
+		return "%s %s %s %s" % (self.game_id, self.area_id, self.year, self.season)
+
+	class Meta:
+		unique_together = (('game', 'area', 'year', 'season'),)
+		ordering = ['game', 'area', 'year', 'season']
+
+def activity_counts(event):
+	""" Returns a list of (area_id, counter) for a concrete event """
+	classname = event.__class__.__name__
+	if classname in ('MovementEvent', 'RetreatEvent'):
+		if event.origin_id == event.destination_id:
+			## a unit that retreats into the city does not move
+			return []
+		return [(event.origin_id, 'moves_out'), (event.destination_id, 'moves_in')]
+	if classname == 'StandoffEvent':
+		return [(event.area_id, 'standoffs')]
+	if classname == 'UnitEvent' and event.message == 3:
+		return [(event.area_id, 'sieges')]
+	if classname == 'DisasterEvent':
+		return [(event.area_id, 'disasters')]
+	if classname == 'ControlEvent':
+		return [(event.area_id, 'control_changes')]
+	return []
+
+def count_activity(events):
+	""" Returns {(game_id, area_id, year, season): {counter: n}} """
+	totals = {}
+	for e in events:
+		if isinstance(e, CompactEvent):
+			e = e.as_event()
+		for area_id, counter in activity_counts(e):
+			counters = totals.setdefault((e.game_id, area_id, e.year, e.season), {})
+			counters[counter] = counters.get(counter, 0) + 1
+	return totals
+
+def update_activity(sender, events, **kwargs):
+	""" Adds the saved events to the activity counters of their areas """
+	for (game_id, area_id, year, season), counters in count_activity(events).items():
+		upsert(AreaActivity,
+			{'game_id': game_id, 'area_id': area_id, 'year': year, 'season': season},
+			counters,
+			dict((c, models.F(c) + n) for c, n in counters.items()))
+
+for _sender in (MovementEvent, RetreatEvent, StandoffEvent, UnitEvent,
+	DisasterEvent, ControlEvent, CompactEvent):
+	event_signals.events_saved.connect(update_activity, sender=_sender)
@@ -0,0 +1,74 @@
+## Copyright (c) 2010 by Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+## This program is free software: you can redistribute it and/or modify it
+## under the terms of the GNU Affero General Public License as published by the
+## Free Software Foundation, either version 3 of the License, or (at your option
+## any later version.
+##
+## This program is distributed in the hope that it will be useful, but WITHOUT
+## ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+## FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+## for more details.
+##
+## You should have received a copy of the GNU Affero General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/agpl.txt>.
+##
+## This license is also included in the file COPYING
+##
+## AUTHOR: Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+
+
+""" This module moves the orders of finished seasons from OrderEvent to
+PackedOrders, with one row for each country and phase.
+
+"""
+
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models import F, Max, Min
+
+from condottieri_events import models
+from condottieri_events import season_cache
+
+def pack_season(game_id, year, season):
+	"""
+Packs the orders of a season and deletes the OrderEvents, their search
+postings and their rows of the season index, in a single transaction.
+Returns the number of orders packed.
+	"""
+	with transaction.atomic():
+		orders = list(models.OrderEvent.objects.filter(game__id=game_id,
+			year=year, season=season).order_by('pk'))
+		if not orders:
+			return 0
+		groups = OrderedDict()
+		for o in orders:
+			groups.setdefault((o.phase, o.country_id), []).append(o)
+		models.PackedOrders.objects.bulk_create([models.PackedOrders.from_orders(g)
+			for g in groups.values()])
+		pks = [o.pk for o in orders]
+		for i in range(0, len(pks), models.CONCRETE_CHUNK_SIZE):
+			chunk = pks[i:i + models.CONCRETE_CHUNK_SIZE]
+			models.SearchEntry.objects.filter(game__id=game_id, compact=False,
+				event_id__in=chunk).delete()
+			models.BaseEvent.objects.filter(pk__in=chunk).delete()
+		ids = models.BaseEvent.objects.filter(game__id=game_id, year=year,
+			season=season).aggregate(first=Min('id'), last=Max('id'))
+		models.SeasonIndex.objects.filter(game__id=game_id, year=year,
+			season=season).update(events=F('events') - len(orders),
+			first_event_id=ids['first'], last_event_id=ids['last'])
+	season_cache.invalidate_season(game_id, year, season)
+	return len(orders)
+
+def pack_game(game, progress=None):
+	""" Packs the orders of all the seasons of a game before the current one """
+	seasons = models.OrderEvent.objects.filter(game=game).order_by(
+		'year', 'season').values_list('year', 'season').distinct()
+	total = 0
+	for year, season in list(seasons):
+		if (year, season) >= (game.year, game.season):
+			break
+		total += pack_season(game.pk, year, season)
+		if progress is not None:
+			progress(year, season, total)
+	return total
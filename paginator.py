@@ -21,8 +21,11 @@ paginates the Events by season and year.
 
 """
 
+from django.db.models import Q
 from django.utils.translation import ugettext_lazy as _
 
+from condottieri_events import season_cache
+
 SEASONS = {
 	1: _('Spring'),
 	2: _('Summer'),
@@ -30,6 +33,21 @@ SEASONS = {
 }
 
 
+def for_season(object_list, year, season):
+	""" Returns the events of a season, newest first. Querysets of the event
+	classes have no for_season method, so they are filtered here. """
+	if hasattr(object_list, 'for_season'):
+		return object_list.for_season(year, season)
+	return object_list.filter(year=year, season=season).order_by('-id')
+
+def is_game_log(object_list, game):
+	""" Returns True if object_list is the unfiltered log of the game """
+	from condottieri_events.models import BaseEvent
+	if getattr(object_list, 'model', None) is not BaseEvent:
+		return False
+	log = BaseEvent.objects.filter(game=game)
+	return str(object_list.order_by().query) == str(log.order_by().query)
+
 class InvalidPage(Exception):
 	pass
 
@@ -46,11 +64,29 @@ class EmptyPage(InvalidPage):
 	pass
 
 class SeasonPaginator(object):
-	def __init__(self, object_list):
+	"""
+Paginates a queryset of events by season. If a game is given, the dates are
+read from its SeasonIndex, so that bounds, validation and navigation need no
+queries on the events table, and seasons without events are skipped.
+A list of (year, season) tuples, newest first, can be given instead.
+	"""
+	def __init__(self, object_list, game=None, seasons=None):
 		self.object_list = object_list
+		self.game = game
 		self._newest_year = self._oldest_year = None
 		self._newest_season = None
 		self._oldest_season = 1 ## oldest season is always spring
+		if seasons is None and game is not None:
+			from condottieri_events.models import SeasonIndex
+			seasons = SeasonIndex.objects.filter(game=game, events__gt=0).order_by(
+				'-year', '-season').values_list('year', 'season')
+		if seasons is not None:
+			seasons = [tuple(s) for s in seasons]
+			self._positions = dict((s, i) for i, s in enumerate(seasons))
+			if seasons:
+				self._newest_year, self._newest_season = seasons[0]
+				self._oldest_year, self._oldest_season = seasons[-1]
+		self.seasons = seasons
 
 	def validate_date(self, year, season):
 		""" Validates the combination of season and year. """
@@ -64,10 +100,14 @@ class SeasonPaginator(object):
 			year = int(year)
 		except ValueError:
 			raise YearNotAnInteger('The year is not an integer')
+		if self.newest_year is None:
+			raise EmptyPage('There are no events')
 		if year > self.newest_year or (year == self.newest_year and season > self.newest_season):
 			raise EmptyPage('The date is in the future')
 		if year < self.oldest_year:
 			raise EmptyPage('The date is in the past, out of scope')
+		if self.seasons is not None and not (year, season) in self._positions:
+			raise EmptyPage('No events for this date.')
 
 		return year, season
 
@@ -76,41 +116,88 @@ class SeasonPaginator(object):
 		if year is None or season is None:
 			year = self.newest_year
 			season = self.newest_season
+			if self.seasons is not None and year is None:
+				raise EmptyPage('There are no events')
 		else:
 			year, season = self.validate_date(year, season)
-		object_list = self.object_list.filter(year=year, season=season)
-		if object_list.count() <= 0:
+		object_list = for_season(self.object_list, year, season)
+		if self.seasons is None and not object_list.exists():
 			raise EmptyPage('No events for this date.')
 		return Page(object_list, year, season, self)
 
+	def older_date(self, year, season):
+		""" Returns the closest (year, season) before the given one, that has
+		events, or None """
+		if self.seasons is not None:
+			i = self._positions.get((year, season))
+			if i is None or i + 1 >= len(self.seasons):
+				return None
+			return self.seasons[i + 1]
+		return self._closest_date(Q(year__lt=year) | Q(year=year, season__lt=season),
+			('-year', '-season'))
+
+	def newer_date(self, year, season):
+		""" Returns the closest (year, season) after the given one, that has
+		events, or None """
+		if self.seasons is not None:
+			i = self._positions.get((year, season))
+			if i is None or i == 0:
+				return None
+			return self.seasons[i - 1]
+		return self._closest_date(Q(year__gt=year) | Q(year=year, season__gt=season),
+			('year', 'season'))
+
+	def _closest_date(self, q, ordering):
+		""" Returns the first (year, season) of the events that match q, reading
+		only the (game, year, season, id) index """
+		dates = self.object_list.filter(q).order_by(*ordering).values_list(
+			'year', 'season')
+		try:
+			return tuple(dates[0])
+		except IndexError:
+			return None
+
+	def _get_date(self, newest=True):
+		""" Returns the (year, season) of the newest or oldest event, reading
+		only the (game, year, season, id) index. """
+		if newest:
+			ordering = ('-year', '-season', '-id')
+		else:
+			ordering = ('year', 'season', 'id')
+		dates = self.object_list.order_by(*ordering).values_list('year', 'season')
+		try:
+			return dates[0]
+		except IndexError:
+			return None
+
+	def _load_newest(self):
+		if self.seasons is not None:
+			return
+		date = self._get_date(newest=True)
+		if date is not None:
+			self._newest_year, self._newest_season = date
+
 	def _get_newest_year(self):
 		""" Returns the most recent year in the events queryset """
 		if self._newest_year is None:
-			try:
-				self._newest_year = self.object_list[0].year
-			except IndexError:
-				pass
+			self._load_newest()
 		return self._newest_year
 	newest_year = property(_get_newest_year)
 
 	def _get_oldest_year(self):
 		""" Returns the oldest year in the events queryset """
-		if self._oldest_year is None:
-			try:
-				self._oldest_year = self.object_list.reverse()[0].year
-			except IndexError:
-				pass
+		if self._oldest_year is None and self.seasons is None:
+			date = self._get_date(newest=False)
+			if date is not None:
+				self._oldest_year = date[0]
 		return self._oldest_year
 	oldest_year = property(_get_oldest_year)
 
 	def _get_newest_season(self):
 		""" Returns the most recent season in the events queryset """
 		if self._newest_season is None:
-			try:
-				self._newest_season = self.object_list[0].season
-			except IndexError:
-				## there are no seasons yet
-				pass
+			## if there are no seasons yet, it remains None
+			self._load_newest()
 		return self._newest_season
 	newest_season = property(_get_newest_season)
 
@@ -134,6 +221,8 @@ class Page(object):
 		return '<Page for %s %s>' % (self.year, self.season)
 
 	def has_next(self):
+		if self.paginator.seasons is not None:
+			return self.paginator.older_date(self.year, self.season) is not None
 		if self.year > self.paginator.oldest_year:
 			return True
 		if self.year == self.paginator.oldest_year and self.season > self.paginator.oldest_season:
@@ -141,28 +230,44 @@ class Page(object):
 		return False
 
 	def has_previous(self):
+		if self.paginator.seasons is not None:
+			return self.paginator.newer_date(self.year, self.season) is not None
 		if self.year < self.paginator.newest_year:
 			return True
 		if self.year == self.paginator.newest_year and self.season < self.paginator.newest_season:
 			return True
 		return False
 
+	def render(self, language=None):
+		""" Returns the html of all the events in the page. If the paginator
+		knows the game and the events are not filtered, the page has the whole
+		season, from the event tables and from CompactEvent, and it is
+		cached. """
+		if hasattr(self.object_list, 'render'):
+			## archived events are already rendered
+			return self.object_list.render(language)
+		if self.paginator.game is not None and \
+			is_game_log(self.paginator.object_list, self.paginator.game):
+			return season_cache.get_season_html(self.paginator.game.pk,
+				self.year, self.season, language=language)
+		from condottieri_events.models import get_rendered_html
+		return get_rendered_html(self.object_list, language)
+
 	def has_other_pages(self):
 		return self.has_previous() or self.has_next()
 
 	def next_date(self):
-		""" Returns a string with GET parameters """
-		if self.season in (3, 2):
-			params = (self.year, self.season - 1)
-		elif self.season == 1:
-			params = (self.year - 1, 3)
+		""" Returns a string with GET parameters, or an empty string if there
+		is no older season """
+		params = self.paginator.older_date(self.year, self.season)
+		if params is None:
+			return ''
 		return "year=%s&season=%s" % params
 	
 	def previous_date(self):
-		""" Returns a string with GET parameters """
-		if self.season in (2, 1):
-			params = (self.year, self.season + 1)
-		elif self.season == 3:
-			params = (self.year + 1, 1)
+		""" Returns a string with GET parameters, or an empty string if there
+		is no newer season """
+		params = self.paginator.newer_date(self.year, self.season)
+		if params is None:
+			return ''
 		return "year=%s&season=%s" % params
-
@@ -0,0 +1,149 @@
+## Copyright (c) 2010 by Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+## This program is free software: you can redistribute it and/or modify it
+## under the terms of the GNU Affero General Public License as published by the
+## Free Software Foundation, either version 3 of the License, or (at your option
+## any later version.
+##
+## This program is distributed in the hope that it will be useful, but WITHOUT
+## ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+## FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+## for more details.
+##
+## You should have received a copy of the GNU Affero General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/agpl.txt>.
+##
+## This license is also included in the file COPYING
+##
+## AUTHOR: Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+
+""" This module resolves the objects that the signal handlers need to log an
+event (the player, game, country and board area of the sender).
+
+While a resolution context is open, each object is loaded only once and
+then reused by every handler. The context must be open only while a phase
+is being resolved, because the cached relations may change between phases::
+
+	with resolution_context(), event_batch():
+		game.process_orders()
+
+The events take their year, season and phase from the cached game. When a
+game is saved, e.g. because its phase has changed, the saved instance
+replaces the cached one (see game_saved), so the dates are never stale.
+
+Without a context, the relations are followed as usual.
+
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+## number of relations followed to resolve each kind of object
+HOPS = {
+	'player': 1,
+	'game': 1,
+	'country': 2,
+	'area': 2,
+	'board_area': 1,
+}
+
+def current_context():
+	return getattr(_local, 'context', None)
+
+class ResolutionContext(object):
+	"""
+ResolutionContext memoizes the objects resolved by the signal handlers and
+counts how many queries it has saved.
+	"""
+	def __init__(self):
+		self.cache = {}
+		self.depth = 0
+		self.hits = dict([(kind, 0) for kind in HOPS])
+		self.misses = dict([(kind, 0) for kind in HOPS])
+
+	def resolve(self, kind, key, func):
+		try:
+			value = self.cache[(kind, key)]
+		except KeyError:
+			self.misses[kind] += 1
+			value = func()
+			self.cache[(kind, key)] = value
+		else:
+			self.hits[kind] += 1
+		return value
+
+	def queries_saved(self):
+		""" Returns the maximum number of queries that the cache has saved """
+		return sum([self.hits[kind] * HOPS[kind] for kind in HOPS])
+
+	def get_stats(self):
+		return {
+			'hits': dict(self.hits),
+			'misses': dict(self.misses),
+			'queries_saved': self.queries_saved(),
+		}
+
+	def __enter__(self):
+		self.depth += 1
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.depth -= 1
+		if self.depth == 0:
+			_local.context = None
+			_local.last_stats = self.get_stats()
+			logger.debug("Resolution context closed: %s", _local.last_stats)
+		return False
+
+def resolution_context():
+	"""
+Returns a context manager that caches the resolved objects in this thread.
+Nested calls reuse the context that is already open.
+	"""
+	context = current_context()
+	if context is None:
+		context = ResolutionContext()
+		_local.context = context
+	return context
+
+def get_last_stats():
+	""" Returns the stats of the last context closed in this thread """
+	return getattr(_local, 'last_stats', None)
+
+def _resolve(kind, key, func):
+	context = current_context()
+	if context is None or key is None:
+		return func()
+	return context.resolve(kind, key, func)
+
+def player(obj):
+	""" Returns the player of a unit, order, expense, diplomat or area """
+	return _resolve('player', obj.player_id, lambda: obj.player)
+
+def game(obj):
+	""" Returns the game of a player, game area or revolution """
+	return _resolve('game', obj.game_id, lambda: obj.game)
+
+def game_saved(sender, instance, **kwargs):
+	""" Replaces the cached game of the current context with the instance
+	that has just been saved """
+	context = current_context()
+	if context is not None and ('game', instance.pk) in context.cache:
+		context.cache[('game', instance.pk)] = instance
+
+def country(player):
+	""" Returns the country that a player controls """
+	return _resolve('country', player.pk, lambda: player.contender.country)
+
+def area(obj):
+	""" Returns the board area where a unit, expense or diplomat is """
+	return _resolve('area', obj.area_id, lambda: obj.area.board_area)
+
+def board_area(gamearea):
+	""" Returns the board area of a game area, or None """
+	if gamearea is None:
+		return None
+	return _resolve('board_area', gamearea.pk, lambda: gamearea.board_area)
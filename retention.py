@@ -0,0 +1,235 @@
+## Copyright (c) 2010 by Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+## This program is free software: you can redistribute it and/or modify it
+## under the terms of the GNU Affero General Public License as published by the
+## Free Software Foundation, either version 3 of the License, or (at your option
+## any later version.
+##
+## This program is distributed in the hope that it will be useful, but WITHOUT
+## ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+## FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+## for more details.
+##
+## You should have received a copy of the GNU Affero General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/agpl.txt>.
+##
+## This license is also included in the file COPYING
+##
+## AUTHOR: Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+
+
+""" This module applies a retention policy to the logs of finished games.
+
+The policy assigns a tier to each event class:
+
+* ``keep``: the events are never deleted.
+
+* ``drop``: the events are deleted when the game has been finished for the
+  given number of days. Before the events that change the board are deleted,
+  a checkpoint of the board is stored for every season of the game, so that
+  board.reconstruct does not need them any more.
+
+* ``collapse``: like drop, but the events are summarized first. Incomes and
+  expenses are kept as totals in the economy rollups.
+
+EVENTS_RETENTION maps class names to (tier, days). Classes that are not in
+the policy are kept. The tiers apply to the events in every storage: their
+own table, CompactEvent and, for orders, PackedOrders. The rollups, like the
+rest of the log, are kept per season.
+
+"""
+
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min, Sum
+
+import machiavelli.models as machiavelli
+
+from condottieri_events import models
+from condottieri_events import board
+from condottieri_events import cleanup
+from condottieri_events import economy
+from condottieri_events import season_cache
+
+KEEP = 'keep'
+DROP = 'drop'
+COLLAPSE = 'collapse'
+TIERS = (KEEP, DROP, COLLAPSE)
+
+DEFAULT_POLICY = {
+	'OrderEvent': (DROP, 30),
+	'UnitEvent': (DROP, 30),
+	'IncomeEvent': (COLLAPSE, 30),
+	'ExpenseEvent': (COLLAPSE, 30),
+}
+
+POLICY = getattr(settings, 'EVENTS_RETENTION', DEFAULT_POLICY)
+
+## classes whose events can be summarized before they are deleted
+COLLAPSIBLE = ('IncomeEvent', 'ExpenseEvent')
+
+def get_policy(policy=None):
+	""" Returns the policy as a list of (model, tier, days), checking it """
+	if policy is None:
+		policy = POLICY
+	rules = []
+	for classname, (tier, days) in sorted(policy.items()):
+		if not tier in TIERS:
+			raise ValueError("Unknown retention tier: %s" % tier)
+		if tier == COLLAPSE and not classname in COLLAPSIBLE:
+			raise ValueError("%s events cannot be collapsed" % classname)
+		if tier != KEEP:
+			rules.append((getattr(models, classname), tier, days))
+	return rules
+
+def _field_size(field):
+	if field.is_relation or field.get_internal_type() in ('AutoField',
+		'IntegerField', 'PositiveIntegerField'):
+		return 4
+	if field.get_internal_type() in ('PositiveSmallIntegerField', 'SmallIntegerField'):
+		return 2
+	if field.get_internal_type() == 'BooleanField':
+		return 1
+	return getattr(field, 'max_length', None) or 8
+
+def row_size(model):
+	"""
+Returns the approximate size in bytes of an event, including its BaseEvent
+row. In PostgreSQL the size is read from the table statistics; in other
+databases it is estimated from the fields.
+	"""
+	size = 0
+	for m in [model] + model._meta.get_parent_list():
+		table = m._meta.db_table
+		if connection.vendor == 'postgresql':
+			with connection.cursor() as cursor:
+				cursor.execute("SELECT pg_total_relation_size(oid), reltuples "
+					"FROM pg_class WHERE relname = %s", [table])
+				row = cursor.fetchone()
+			if row and row[1] > 0:
+				size += int(row[0] / row[1])
+				continue
+		## tuple header plus the columns
+		size += 24 + sum([_field_size(f) for f in m._meta.local_concrete_fields])
+	return size
+
+def rebuild_season_index(game_id):
+	""" Computes again the season index of a game from its events, in the
+	event tables and in CompactEvent """
+	seasons = {}
+	for s in models.BaseEvent.objects.filter(game__id=game_id).order_by().values(
+		'year', 'season').annotate(events=Count('id'), first=Min('id'), last=Max('id')):
+		seasons[(s['year'], s['season'])] = s
+	for s in models.CompactEvent.objects.filter(game__id=game_id).order_by().values(
+		'year', 'season').annotate(events=Count('id')):
+		key = (s['year'], s['season'])
+		if key in seasons:
+			seasons[key]['events'] += s['events']
+		else:
+			seasons[key] = dict(s, first=None, last=None)
+	seasons = list(seasons.values())
+	with transaction.atomic():
+		models.SeasonIndex.objects.filter(game__id=game_id).delete()
+		models.SeasonIndex.objects.bulk_create([models.SeasonIndex(game_id=game_id,
+			year=s['year'], season=s['season'], events=s['events'],
+			first_event_id=s['first'], last_event_id=s['last']) for s in seasons],
+			batch_size=500)
+	season_cache.invalidate_seasons([(game_id, s['year'], s['season'])
+		for s in seasons])
+
+def collapse(game_id):
+	"""
+Makes sure that the incomes and expenses of a game are summarized in the
+economy rollups before they are deleted. The rollups are always computed
+again: economy.rebuild_economy keeps the rows that already sum more events
+than the log has, so a collapse that was interrupted is not summarized twice.
+	"""
+	economy.rebuild_economy(game_id)
+
+def expired_games(days):
+	""" Returns the ids of the finished games older than the given days """
+	threshold = datetime.now() - timedelta(days)
+	return machiavelli.Game.objects.filter(phase=machiavelli.PHINACTIVE,
+		slots=0, last_phase_change__lt=threshold).values_list('pk', flat=True)
+
+def _storages(model):
+	"""
+Returns the querysets of an event class in every storage, as a list of
+(queryset, model of the rows, function that returns the game ids). The
+events may be in their own table, in CompactEvent and, for orders, in
+PackedOrders.
+	"""
+	classname = model.__name__
+	def games_of(qs):
+		return lambda days: qs.filter(game__in=expired_games(days)).order_by(
+			'game').values_list('game', flat=True).distinct()
+	base = models.BaseEvent.objects.filter(classname=classname)
+	compact = models.CompactEvent.objects.filter(kind=models.KIND_CODES[classname])
+	storages = [(model.objects.all(), model, games_of(base)),
+		(compact, models.CompactEvent, games_of(compact))]
+	if classname == 'OrderEvent':
+		packed = models.PackedOrders.objects.all()
+		storages.append((packed, models.PackedOrders, games_of(packed)))
+	return storages
+
+def _reclaimed(qs, size):
+	""" Returns the number of events of a queryset and their size in bytes.
+	Packed orders count as one event per order. """
+	if qs.model is models.PackedOrders:
+		r = qs.aggregate(orders=Sum('count'), records=Count('id'))
+		return r['orders'] or 0, r['records'] * size
+	n = qs.count()
+	return n, n * size
+
+def apply_policy(policy=None, batch_size=1000, sleep=0, dry_run=False,
+	progress=None):
+	"""
+Applies the retention policy to all the finished games, in all the storages
+of the events (see _storages). The events are deleted in batches (see
+cleanup.delete_events), so the process can be stopped and run again.
+progress is called with (classname, game_id, count) after each batch.
+
+Returns a report {tier: {'rows': n, 'bytes': n, 'classes': {name: rows}}}.
+Packed orders count as one row per order.
+	"""
+	report = dict((tier, {'rows': 0, 'bytes': 0, 'classes': {}})
+		for tier in (DROP, COLLAPSE))
+	for model, tier, days in get_policy(policy):
+		classname = model.__name__
+		storages = [(qs, storage, row_size(storage), game_ids)
+			for qs, storage, game_ids in _storages(model)]
+		games = set()
+		for qs, storage, size, game_ids in storages:
+			games.update(game_ids(days))
+		rows = 0
+		for game_id in sorted(games):
+			if not dry_run:
+				if tier == COLLAPSE:
+					collapse(game_id)
+				if classname in board.BOARD_EVENTS:
+					board.save_all_checkpoints(machiavelli.Game.objects.get(pk=game_id))
+			deleted = 0
+			def batch_progress(count):
+				if progress is not None:
+					progress(classname, game_id, deleted + count)
+			for qs, storage, size, game_ids in storages:
+				events = qs.filter(game__id=game_id)
+				n, reclaimed = _reclaimed(events, size)
+				report[tier]['bytes'] += reclaimed
+				if dry_run:
+					deleted += n
+				elif storage is models.PackedOrders:
+					deleted += cleanup.delete_packed_orders(events, batch_size,
+						sleep, batch_progress)
+				else:
+					deleted += cleanup.delete_events(events, batch_size, sleep,
+						batch_progress)
+			rows += deleted
+			if not dry_run:
+				## the event counts are updated by delete_events with each
+				## batch, and the first and last ids are computed again here
+				rebuild_season_index(game_id)
+		report[tier]['classes'][classname] = rows
+		report[tier]['rows'] += rows
+	return report
@@ -0,0 +1,150 @@
+## Copyright (c) 2010 by Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+## This program is free software: you can redistribute it and/or modify it
+## under the terms of the GNU Affero General Public License as published by the
+## Free Software Foundation, either version 3 of the License, or (at your option
+## any later version.
+##
+## This program is distributed in the hope that it will be useful, but WITHOUT
+## ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+## FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+## for more details.
+##
+## You should have received a copy of the GNU Affero General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/agpl.txt>.
+##
+## This license is also included in the file COPYING
+##
+## AUTHOR: Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+
+
+""" This module searches the log of a game through its inverted index
+(SearchEntry), e.g. all the events in Florence, or all the bribes against
+Venice::
+
+	search(game, area=florence)
+	search(game, country=venice, kind='UnitEvent', message=4)
+
+Only the postings of the given keys and the matching events are read.
+
+"""
+
+from django.db import transaction
+
+from condottieri_events import models
+from condottieri_events.archive import iter_game_chunks
+
+def _key(obj):
+	return getattr(obj, 'pk', obj)
+
+def _postings(game_id, key_type, key):
+	""" Returns the postings of a key as a list of (year, season, compact,
+	event_id), in chronological order (see models.log_key) """
+	return list(models.SearchEntry.objects.filter(game__id=game_id,
+		key_type=key_type, key=key).order_by('year', 'season', '-compact',
+		'event_id').values_list('year', 'season', 'compact', 'event_id'))
+
+def search(game, area=None, country=None, kind=None, message=None,
+	newest_first=False):
+	"""
+Returns the concrete events of a game that match all the given criteria, in
+chronological order. area and country can be instances or ids; kind can be
+a class name or a code of EVENT_KINDS, and message a message code of the
+events of that kind.
+	"""
+	criteria = []
+	if area is not None:
+		criteria.append((models.SEARCH_AREA, _key(area)))
+	if country is not None:
+		criteria.append((models.SEARCH_COUNTRY, _key(country)))
+	if kind is not None:
+		kind = models.KIND_CODES.get(kind, kind)
+		if message is None:
+			criteria.append((models.SEARCH_KIND, kind))
+		else:
+			criteria.append((models.SEARCH_MESSAGE, kind * 100 + message))
+	elif message is not None:
+		raise ValueError("A message can only be searched with a kind")
+	if not criteria:
+		raise ValueError("At least one criterion is needed")
+	game_id = _key(game)
+	packed = _packed(game_id, criteria)
+	matches = None
+	for key_type, key in criteria:
+		postings = _postings(game_id, key_type, key)
+		if matches is None:
+			matches = postings
+		else:
+			found = set(postings)
+			matches = [p for p in matches if p in found]
+		if not matches:
+			break
+	events = _load([p[3] for p in matches if not p[2]],
+		[p[3] for p in matches if p[2]])
+	## postings of deleted events are skipped
+	result = [events[(p[2], p[3])] for p in matches if (p[2], p[3]) in events]
+	if packed:
+		## the packed orders are the oldest events of their season
+		result = sorted(packed + result, key=lambda e: (e.year, e.season))
+	if newest_first:
+		result.reverse()
+	return result
+
+def _packed(game_id, criteria):
+	"""
+Returns the packed orders of a game that match all the criteria, as unsaved
+OrderEvents in chronological order. Packed orders have no postings, so the
+records of the game are unpacked and filtered here.
+	"""
+	kind = models.KIND_CODES['OrderEvent']
+	records = models.PackedOrders.objects.filter(game__id=game_id).order_by(
+		'year', 'season', 'phase', 'id')
+	areas = []
+	for key_type, key in criteria:
+		if key_type == models.SEARCH_MESSAGE or \
+			(key_type == models.SEARCH_KIND and key != kind):
+			return []
+		if key_type == models.SEARCH_COUNTRY:
+			records = records.filter(country__id=key)
+		elif key_type == models.SEARCH_AREA:
+			areas.append(key)
+	result = []
+	for record in records:
+		for order in record.orders():
+			ids = set([getattr(order, f) for f in models.PACKED_AREAS])
+			if all([a in ids for a in areas]):
+				result.append(order)
+	return result
+
+def _load(ids, compact_ids):
+	""" Returns a dictionary {(compact, id): concrete event} """
+	events = {}
+	size = models.CONCRETE_CHUNK_SIZE
+	for i in range(0, len(ids), size):
+		chunk = models.BaseEvent.objects.filter(pk__in=ids[i:i + size])
+		for e in models.load_concrete(chunk):
+			events[(False, e.pk)] = e
+	for i in range(0, len(compact_ids), size):
+		for e in models.CompactEvent.objects.filter(pk__in=compact_ids[i:i + size]):
+			events[(True, e.pk)] = e.as_event()
+	return events
+
+def rebuild_game(game_id, chunk_size=500, progress=None):
+	"""
+Builds again the search index of a game from its events. Returns the number
+of indexed events.
+	"""
+	models.SearchEntry.objects.filter(game__id=game_id).delete()
+	total = 0
+	for chunk in iter_game_chunks(game_id, chunk_size):
+		_index(chunk)
+		total += len(chunk)
+		if progress is not None:
+			progress(total)
+	return total
+
+def _index(events):
+	entries = []
+	for e in events:
+		entries.extend(models.search_entries(e))
+	with transaction.atomic():
+		models.SearchEntry.objects.bulk_create(entries, batch_size=500)
@@ -0,0 +1,103 @@
+## Copyright (c) 2010 by Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+## This program is free software: you can redistribute it and/or modify it
+## under the terms of the GNU Affero General Public License as published by the
+## Free Software Foundation, either version 3 of the License, or (at your option
+## any later version.
+##
+## This program is distributed in the hope that it will be useful, but WITHOUT
+## ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+## FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+## for more details.
+##
+## You should have received a copy of the GNU Affero General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/agpl.txt>.
+##
+## This license is also included in the file COPYING
+##
+## AUTHOR: Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+
+""" This module caches the rendered log of each season, using the Django
+cache framework.
+
+Past seasons never change, so their keys are never invalidated. When new
+events are saved, only the key of their season (the current one) is
+deleted.
+
+"""
+
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+## name of the cache, in settings.CACHES, that stores the season pages
+CACHE_ALIAS = getattr(settings, 'EVENTS_CACHE', 'default')
+## seconds that a season page is kept in the cache
+CACHE_TIMEOUT = getattr(settings, 'EVENTS_CACHE_TIMEOUT', 7 * 24 * 60 * 60)
+
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+def get_stats():
+	""" Returns a dict with the hit, miss and invalidation counters """
+	with _lock:
+		return dict(_stats)
+
+def reset_stats():
+	with _lock:
+		for key in _stats:
+			_stats[key] = 0
+
+def _count(key, n=1):
+	with _lock:
+		_stats[key] += n
+
+def season_key(game_id, year, season, language):
+	return "condottieri_events:season:%s:%s:%s:%s" % (game_id, year, season, language)
+
+def languages():
+	""" Returns the languages in which a season page may have been cached """
+	from condottieri_events.models import RENDER_LANGUAGES, render_language
+	codes = set(RENDER_LANGUAGES)
+	codes.update([render_language(code) for code, name in settings.LANGUAGES])
+	return codes
+
+def get_season_html(game_id, year, season, object_list=None, language=None):
+	""" Returns the html of a season log, from the cache if possible. On a
+	miss, the events of object_list are rendered or, if it is None, those of
+	the whole season in both storages (see models.season_log). """
+	from condottieri_events.models import render_language
+	language = render_language(language)
+	cache = caches[CACHE_ALIAS]
+	key = season_key(game_id, year, season, language)
+	html = cache.get(key)
+	if html is not None:
+		_count('hits')
+		return html
+	_count('misses')
+	from condottieri_events.models import get_rendered_html, get_packed_orders, \
+		render_events, season_log
+	if object_list is None:
+		object_list = season_log(game_id, year, season)
+	html = get_rendered_html(object_list, language)
+	## packed orders are older than the rest of the season
+	orders = get_packed_orders(game_id, year, season)
+	if orders:
+		html += render_events(reversed(orders), language)
+	cache.set(key, html, CACHE_TIMEOUT)
+	return html
+
+def invalidate_season(game_id, year, season):
+	""" Deletes the cached pages of a season in all the languages """
+	caches[CACHE_ALIAS].delete_many([season_key(game_id, year, season, l)
+		for l in languages()])
+	_count('invalidations')
+
+def invalidate_seasons(seasons):
+	""" Deletes the cached pages of a sequence of (game_id, year, season) """
+	for game_id, year, season in set(seasons):
+		invalidate_season(game_id, year, season)
+
+def invalidate_saved_events(sender, events, **kwargs):
+	""" Deletes the cached pages of the seasons that have new events """
+	invalidate_seasons([(e.game_id, e.year, e.season) for e in events])
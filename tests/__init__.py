@@ -1,2 +1,19 @@
 from .commands import *
 from .models import *
+from .paginator import *
+from .writer import *
+from .archive import *
+from .compact import *
+from .resolution import *
+from .board import *
+from .views import *
+from .live import *
+from .benchmarks import *
+from .instrumentation import *
+from .packing import *
+from .admin import *
+from .retention import *
+from .economy import *
+from .search import *
+from .columnar import *
+from .heatmap import *
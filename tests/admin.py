@@ -0,0 +1,69 @@
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.test import TestCase, RequestFactory
+
+from condottieri_events.models import *
+from condottieri_events.admin import (EstimatedCountPaginator, GameFilter,
+    YearFilter, BaseEventAdmin)
+from machiavelli.models import Game
+from condottieri_scenarios.models import Area
+
+class AdminTestCase(TestCase):
+
+    fixtures = ['users.yaml',
+            'settings.yaml',
+            'scenarios.yaml',
+            'games.yaml',
+            ]
+
+    def setUp(self):
+        self.game = Game.objects.get(id=1)
+        self.area_1 = Area.objects.create(setting=self.game.scenario.setting,
+                name_en = "Albacete",
+                code = "ALB")
+        self.event = StandoffEvent.objects.create(game=self.game, year=1454,
+                season=1, phase=2, classname="StandoffEvent", area=self.area_1)
+        update_season_index(BaseEvent, [self.event])
+        self.user = User.objects.create_superuser('events_admin',
+                'events_admin@example.com', 'password')
+        self.model_admin = BaseEventAdmin(BaseEvent, admin.site)
+
+    def changelist(self, params):
+        request = RequestFactory().get('/admin/condottieri_events/baseevent/',
+                params)
+        request.user = self.user
+        return self.model_admin.get_changelist_instance(request), request
+
+    def get_filter(self, changelist, request, filter_class):
+        filters = changelist.get_filters(request)[0]
+        return [f for f in filters if isinstance(f, filter_class)][0]
+
+    def test_paginator_count(self):
+        paginator = EstimatedCountPaginator(BaseEvent.objects.all(), 20)
+        self.assertEqual(paginator.count, 1)
+        paginator = EstimatedCountPaginator(BaseEvent.objects.filter(year=1), 20)
+        self.assertEqual(paginator.count, 0)
+
+    def test_filters(self):
+        changelist, request = self.changelist({'game': str(self.game.pk),
+                'year': '1454'})
+        self.assertEqual(changelist.result_count, 1)
+        game = str(self.game.pk)
+        self.assertEqual(self.get_filter(changelist, request,
+                GameFilter).lookup_choices, [(game, game)])
+        self.assertEqual(self.get_filter(changelist, request,
+                YearFilter).lookup_choices, [('1454', '1454')])
+        changelist, request = self.changelist({'year': '1455'})
+        self.assertEqual(changelist.result_count, 0)
+        changelist, request = self.changelist({'game': '999'})
+        self.assertEqual(self.get_filter(changelist, request,
+                GameFilter).lookup_choices[0], ('999', '999'))
+
+    def test_concrete_changelist(self):
+        changelist, request = self.changelist({})
+        self.assertEqual(len(changelist.result_list), 1)
+        event = changelist.result_list[0]
+        self.assertIsInstance(event, StandoffEvent)
+        self.assertEqual(event.pk, self.event.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(event.game.pk, self.game.pk)
@@ -0,0 +1,53 @@
+import shutil
+import tempfile
+
+from django.test import TestCase
+from django.utils import translation
+
+from condottieri_events.models import *
+from condottieri_events.archive import archive_game, load_archive
+from condottieri_events.paginator import SeasonPaginator
+from machiavelli.models import Game
+from condottieri_scenarios.models import Area
+
+class ArchiveTestCase(TestCase):
+
+    fixtures = ['users.yaml',
+            'settings.yaml',
+            'scenarios.yaml',
+            'games.yaml',
+            ]
+
+    def setUp(self):
+        self.game = Game.objects.get(id=1)
+        self.area_1 = Area.objects.create(setting=self.game.scenario.setting,
+                name_en = "Albacete",
+                code = "ALB")
+        for year, season in ((1454, 1), (1454, 3), (1455, 2)):
+            StandoffEvent.objects.create(game=self.game, year=year,
+                    season=season, phase=2, classname="StandoffEvent",
+                    area=self.area_1)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_archive_and_load(self):
+        path = archive_game(self.game, self.directory, purge=True)
+        self.assertEqual(BaseEvent.objects.filter(game=self.game).count(), 0)
+        log = load_archive(path)
+        self.assertEqual(len(log), 3)
+        self.assertEqual(log.seasons(), [(1455, 2), (1454, 3), (1454, 1)])
+        paginator = SeasonPaginator(log, seasons=log.seasons())
+        page = paginator.page()
+        self.assertEqual((page.year, page.season), (1455, 2))
+        self.assertTrue(page.has_next())
+        self.assertIn("Albacete", page.render("en"))
+        self.assertEqual(log[0].names['area'], "Albacete")
+
+    def test_regional_language(self):
+        log = load_archive(archive_game(self.game, self.directory))
+        with translation.override("en-us"):
+            self.assertEqual(str(log[0]),
+                "Conflicts in Albacete result in a standoff.")
+            self.assertIn("Conflicts in Albacete", log[0].color_output())
@@ -0,0 +1,40 @@
+from django.test import TransactionTestCase
+
+from condottieri_events.models import *
+from condottieri_events.benchmarks import generator, suite
+from machiavelli.models import Game
+from condottieri_scenarios.models import Area
+
+class BenchmarkTestCase(TransactionTestCase):
+    """ The events are written in batches, which are flushed when the
+    transaction is committed, so the tests cannot run in a transaction """
+
+    fixtures = ['users.yaml',
+            'settings.yaml',
+            'scenarios.yaml',
+            'games.yaml',
+            ]
+
+    def setUp(self):
+        self.game = Game.objects.get(id=1)
+        for name, code in (("Albacete", "ALB"), ("Cuenca", "CUE")):
+            Area.objects.create(setting=self.game.scenario.setting,
+                name_en=name, code=code)
+
+    def test_generator(self):
+        first = list(generator.EventGenerator(self.game, seed=1).events(20))
+        second = list(generator.EventGenerator(self.game, seed=1).events(20))
+        self.assertEqual(first, second)
+        count = generator.generate_game(self.game, years=1, events_per_season=20)
+        self.assertEqual(count, 60)
+        self.assertEqual(BaseEvent.objects.for_game(self.game).count(), 60)
+
+    def test_run(self):
+        results = suite.run(self.game, years=1, events_per_season=10,
+            log_count=10, pages=2, concrete_count=10, render_count=10)
+        names = [r['name'] for r in results['results']]
+        self.assertEqual(names, ['generate', 'log_event', 'log_event_batch',
+            'paginator_render_cold', 'paginator_render_warm', 'get_concrete',
+            'load_concrete', 'color_output', 'render_events', 'clean_events'])
+        self.assertEqual(results['results'][-1]['count'], 50)
+        self.assertFalse(BaseEvent.objects.for_game(self.game).exists())
@@ -0,0 +1,46 @@
+from django.test import TestCase
+
+from condottieri_events.models import *
+from condottieri_events import board
+from machiavelli.models import Game
+from condottieri_scenarios.models import Area
+
+class BoardTestCase(TestCase):
+
+    fixtures = ['users.yaml',
+            'settings.yaml',
+            'scenarios.yaml',
+            'games.yaml',
+            ]
+
+    def setUp(self):
+        self.game = Game.objects.get(id=1)
+        setting = self.game.scenario.setting
+        self.a = Area.objects.create(setting=setting, name_en="Albacete", code="ALB")
+        self.b = Area.objects.create(setting=setting, name_en="Bilbao", code="BIL")
+        self.c = Area.objects.create(setting=setting, name_en="Cadiz", code="CAD")
+        ## autonomous units, since the fixtures have no countries
+        DisbandEvent.objects.create(game=self.game, year=1454, season=1,
+                phase=1, classname="DisbandEvent", type="F", area=self.c)
+        MovementEvent.objects.create(game=self.game, year=1454, season=1,
+                phase=2, classname="MovementEvent", type="A",
+                origin=self.a, destination=self.b)
+        MovementEvent.objects.create(game=self.game, year=1454, season=1,
+                phase=2, classname="MovementEvent", type="A",
+                origin=self.b, destination=self.c)
+        MovementEvent.objects.create(game=self.game, year=1454, season=3,
+                phase=2, classname="MovementEvent", type="A",
+                origin=self.c, destination=self.a)
+
+    def test_state(self):
+        state = board.BoardState({self.a.pk: [(None, "A")], self.b.pk: [(None, "A")]})
+        state.replay(MovementEvent.objects.order_by('id')[:2])
+        self.assertEqual(state.units, {self.b.pk: [(None, "A")],
+            self.c.pk: [(None, "A")]})
+        self.assertEqual(board.BoardState.from_json(state.to_json()).units,
+            state.units)
+
+    def test_reconstruct(self):
+        state = board.reconstruct(self.game, 1454, 3, save_checkpoints=False)
+        self.assertEqual(state.units, {self.b.pk: [(None, "A")],
+            self.a.pk: [(None, "A")]})
@@ -0,0 +1,90 @@
+import tempfile
+import shutil
+from unittest import skipIf
+
+from django.test import TestCase
+
+from condottieri_events.models import *
+from condottieri_events import columnar, analytics
+from machiavelli.models import Game
+from condottieri_scenarios.models import Area
+
+@skipIf(columnar.np is None, "NumPy is not installed")
+class ColumnarTestCase(TestCase):
+
+    fixtures = ['users.yaml',
+            'settings.yaml',
+            'scenarios.yaml',
+            'games.yaml',
+            ]
+
+    def setUp(self):
+        self.game = Game.objects.get(id=1)
+        self.area_1 = Area.objects.create(setting=self.game.scenario.setting,
+                name_en = "Albacete",
+                code = "ALB")
+        kwargs = {'game': self.game, 'year': 1454, 'season': 1, 'phase': 2}
+        StandoffEvent.objects.create(classname="StandoffEvent",
+                area=self.area_1, **kwargs)
+        StandoffEvent.objects.create(classname="StandoffEvent",
+                area=self.area_1, **kwargs)
+        DisasterEvent.objects.create(classname="DisasterEvent",
+                area=self.area_1, message=0, **kwargs)
+        UnitEvent.objects.create(classname="UnitEvent", type='A',
+                area=self.area_1, message=5, **kwargs)
+
+    def test_export(self):
+        arrays = columnar.export_arrays([self.game.pk])
+        self.assertEqual(len(arrays['game']), 4)
+        self.assertEqual(sorted(arrays['message'].tolist()), [-1, -1, 0, 5])
+        self.assertEqual(analytics.standoffs_per_area(arrays), {self.area_1.pk: 2})
+        self.assertEqual(analytics.famine_per_area(arrays), {self.area_1.pk: 1})
+        bribes = analytics.bribe_success(arrays)['autonomous']
+        ## no bribe was paid, so the unit became autonomous for other reasons
+        self.assertEqual((bribes['attempts'], bribes['successes']), (0, 0))
+        self.assertIsNone(bribes['rate'])
+
+    def test_bribe_success(self):
+        expense = KIND_CODES['ExpenseEvent']
+        unit = KIND_CODES['UnitEvent']
+        disband = KIND_CODES['DisbandEvent']
+        ## (kind, season, area, message)
+        rows = [(expense, 1, 10, 9), (unit, 1, 10, 4),
+                (expense, 1, 11, 9), (unit, 2, 11, 4),
+                (expense, 1, 12, 7), (unit, 1, 13, 5),
+                (expense, 2, 14, 8), (disband, 2, 14, -1),
+                (expense, 2, 15, 5), (expense, 2, 15, 8), (unit, 2, 15, 2),
+                (disband, 2, 15, -1)]
+        np = columnar.np
+        kind, season, area, message = [np.array(c) for c in zip(*rows)]
+        arrays = {'game': np.ones(len(rows), dtype='int32'),
+                'year': np.full(len(rows), 1454, dtype='int16'),
+                'season': season, 'area': area, 'kind': kind,
+                'message': message}
+        bribes = analytics.bribe_success(arrays)
+        self.assertEqual(bribes['buy'],
+                {'attempts': 2, 'successes': 1, 'rate': 0.5})
+        self.assertEqual(bribes['autonomous'],
+                {'attempts': 1, 'successes': 0, 'rate': 0.0})
+        self.assertEqual(bribes['disband'],
+                {'attempts': 3, 'successes': 2, 'rate': 2.0 / 3})
+
+    def test_packed_orders(self):
+        kwargs = {'game': self.game, 'year': 1454, 'season': 1, 'phase': 2}
+        PackedOrders.from_orders([
+            OrderEvent(type='A', origin=self.area_1, code='-',
+                destination=self.area_1, **kwargs),
+            OrderEvent(type='G', origin=self.area_1, code='B', **kwargs),
+        ]).save()
+        arrays = columnar.export_arrays([self.game.pk])
+        self.assertEqual(len(arrays['game']), 6)
+        self.assertEqual(analytics.order_codes(arrays), {'-': 1, 'B': 1})
+
+    def test_files(self):
+        directory = tempfile.mkdtemp()
+        try:
+            columnar.save_arrays(columnar.export_arrays(), directory)
+            arrays = columnar.load_arrays(directory)
+            self.assertEqual(arrays['kind'].tolist().count(KIND_CODES['StandoffEvent']), 2)
+        finally:
+            shutil.rmtree(directory)
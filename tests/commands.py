@@ -1,12 +1,86 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+from io import StringIO
+import os
+import shutil
+import tempfile
 
+from django.core.management import call_command
 from django.test import TestCase
 
+from condottieri_events.models import *
 from condottieri_events.management.commands.clean_events import Command
+from condottieri_events.archive import load_archive
+import machiavelli.models as machiavelli
+from condottieri_scenarios.models import Area
 
 class CommandTestCase(TestCase):
 
     def test_handle_noargs(self):
         command = Command()
         self.assertIsNone(command.handle_noargs())
-    
+
+class CleanEventsTestCase(TestCase):
+
+    fixtures = ['users.yaml',
+            'settings.yaml',
+            'scenarios.yaml',
+            'games.yaml',
+            ]
+
+    def setUp(self):
+        machiavelli.Game.objects.filter(id=1).update(
+                phase=machiavelli.PHINACTIVE, slots=0,
+                last_phase_change=datetime.now() - timedelta(days=60))
+        self.game = machiavelli.Game.objects.get(id=1)
+        self.area_1 = Area.objects.create(setting=self.game.scenario.setting,
+                name_en = "Albacete",
+                code = "ALB")
+        events = []
+        for year, season in ((1454, 1), (1454, 3), (1455, 2)):
+            events.append(StandoffEvent.objects.create(game=self.game,
+                    year=year, season=season, phase=2,
+                    classname="StandoffEvent", area=self.area_1))
+        update_season_index(BaseEvent, events)
+
+    def test_dry_run(self):
+        out = StringIO()
+        call_command('clean_events', age=0, dry_run=True, stdout=out)
+        self.assertIn("3 events will be deleted in 1 games", out.getvalue())
+        self.assertEqual(BaseEvent.objects.filter(game=self.game).count(), 3)
+        self.assertTrue(SeasonIndex.objects.filter(game=self.game).exists())
+
+    def test_batch_size(self):
+        out = StringIO()
+        call_command('clean_events', age=0, batch_size=2, stdout=out)
+        self.assertIn("2/3 events deleted", out.getvalue())
+        self.assertIn("3 events deleted", out.getvalue())
+        self.assertFalse(BaseEvent.objects.filter(game=self.game).exists())
+        self.assertFalse(SeasonIndex.objects.filter(game=self.game).exists())
+
+    def test_orphaned_index(self):
+        BaseEvent.objects.filter(game=self.game).delete()
+        call_command('clean_events', age=0, stdout=StringIO())
+        self.assertFalse(SeasonIndex.objects.filter(game=self.game).exists())
+
+    def test_archive(self):
+        directory = tempfile.mkdtemp()
+        try:
+            call_command('clean_events', age=0, archive=directory,
+                    stdout=StringIO())
+            self.assertFalse(BaseEvent.objects.filter(game=self.game).exists())
+            paths = os.listdir(directory)
+            self.assertEqual(len(paths), 1)
+            log = load_archive(os.path.join(directory, paths[0]))
+            self.assertEqual(len(log), 3)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_rebuild_rendered_events(self):
+        event = BaseEvent.objects.filter(game=self.game)[0]
+        RenderedEvent.objects.create(event=event, language="en", html="old")
+        call_command('rebuild_rendered_events', game=self.game.pk,
+                stdout=StringIO())
+        stored = RenderedEvent.objects.get(event=event, language="en")
+        self.assertIn("Albacete", stored.html)
+        self.assertEqual(RenderedEvent.objects.filter(event__game=self.game,
+                language="en").count(), 3)
@@ -0,0 +1,102 @@
+import json
+
+from django.core.cache import caches
+from django.test import TestCase, RequestFactory
+
+from condottieri_events.models import *
+from condottieri_events.compact import compact_game
+from condottieri_events.paginator import SeasonPaginator
+from condottieri_events.views import event_feed
+from condottieri_events import board, export, search, season_cache
+from machiavelli.models import Game
+from condottieri_scenarios.models import Area
+
+class CompactEventTestCase(TestCase):
+
+    fixtures = ['users.yaml',
+            'settings.yaml',
+            'scenarios.yaml',
+            'games.yaml',
+            ]
+
+    def setUp(self):
+        self.game = Game.objects.get(id=1)
+        self.area_1 = Area.objects.create(setting=self.game.scenario.setting,
+                name_en = "Albacete",
+                code = "ALB")
+        self.area_2 = Area.objects.create(setting=self.game.scenario.setting,
+                name_en = "Bilbao",
+                code = "BIL")
+        self.events = [
+            StandoffEvent.objects.create(game=self.game, year=1454, season=1,
+                phase=2, classname="StandoffEvent", area=self.area_1),
+            MovementEvent.objects.create(game=self.game, year=1454, season=2,
+                phase=2, classname="MovementEvent", type="A",
+                origin=self.area_1, destination=self.area_2),
+        ]
+
+    def test_from_event(self):
+        for event in self.events:
+            compact = CompactEvent.from_event(event)
+            compact.save()
+            compact = CompactEvent.objects.get(pk=compact.pk)
+            self.assertEqual(compact.classname, event.classname)
+            self.assertEqual(str(compact), str(event))
+            self.assertEqual(compact.color_output(), event.color_output())
+
+    def test_compact_game(self):
+        output = [e.color_output() for e in self.events]
+        self.assertEqual(compact_game(self.game.pk, batch_size=1), 2)
+        self.assertFalse(BaseEvent.objects.filter(game=self.game).exists())
+        events = CompactEvent.objects.for_game(self.game)
+        self.assertEqual([e.color_output() for e in events.order_by('id')], output)
+        paginator = SeasonPaginator(events)
+        self.assertEqual(paginator.page().season, 2)
+
+    def test_search_after_compaction(self):
+        search.rebuild_game(self.game.pk)
+        compact_game(self.game.pk, batch_size=1)
+        found = search.search(self.game, area=self.area_1)
+        self.assertEqual([e.classname for e in found],
+                ["StandoffEvent", "MovementEvent"])
+        self.assertFalse(SearchEntry.objects.filter(game=self.game,
+                compact=False).exists())
+
+    def test_iter_log(self):
+        ## the oldest event is compacted, the newest is not
+        compact_game(self.game.pk, batch_size=1)
+        newest = MovementEvent.objects.create(game=self.game, year=1454,
+                season=2, phase=2, classname="MovementEvent", type="A",
+                origin=self.area_2, destination=self.area_1)
+        log = list(iter_log(self.game.pk))
+        self.assertEqual([log_key(e)[2] for e in log], [0, 0, 1])
+        self.assertEqual(log[-1].pk, newest.pk)
+        log.reverse()
+        self.assertEqual(list(iter_log(self.game.pk, newest_first=True,
+                chunk_size=1)), log)
+        self.assertEqual(list(iter_log(self.game.pk, newest_first=True,
+                after=log_key(log[0]))), log[1:])
+        self.assertEqual(list(iter_log(self.game.pk, after=log_key(log[-1]))),
+                list(reversed(log[:-1])))
+
+    def test_compacted_readers(self):
+        compact_game(self.game.pk)
+        response = event_feed(RequestFactory().get('/', {'limit': 1}),
+                self.game.pk)
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(data['events'][0]['classname'], "MovementEvent")
+        self.assertTrue(data['events'][0]['compact'])
+        response = event_feed(RequestFactory().get('/', {'limit': 1,
+                'before': data['next']}), self.game.pk)
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(data['events'][0]['classname'], "StandoffEvent")
+        self.assertIsNone(data['next'])
+        state = board.reconstruct(self.game, 1454, 2, save_checkpoints=False)
+        self.assertEqual(state.units, {self.area_2.pk: [(None, 'A')]})
+        text = "".join(export.iter_text(self.game, "en"))
+        self.assertIn("Bilbao", text)
+        caches[season_cache.CACHE_ALIAS].clear()
+        paginator = SeasonPaginator(BaseEvent.objects.for_game(self.game),
+                seasons=[(1454, 2), (1454, 1)], game=self.game)
+        self.assertIn("Bilbao", paginator.page(1454, 2).render("en"))
+
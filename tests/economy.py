@@ -0,0 +1,84 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from condottieri_events.models import *
+from condottieri_events import economy
+from machiavelli.models import Game
+from condottieri_scenarios.models import Area, Country
+
+class EconomyTestCase(TestCase):
+
+    fixtures = ['users.yaml',
+            'settings.yaml',
+            'scenarios.yaml',
+            'games.yaml',
+            ]
+
+    def setUp(self):
+        self.game = Game.objects.get(id=1)
+        self.area_1 = Area.objects.create(setting=self.game.scenario.setting,
+                name_en = "Albacete",
+                code = "ALB")
+        self.country = Country.objects.create(setting=self.game.scenario.setting,
+                name_en="Spain", static_name="spain")
+        kwargs = {'game': self.game, 'year': 1454, 'phase': 0,
+            'country': self.country}
+        self.incomes = [
+            IncomeEvent.objects.create(classname="IncomeEvent", season=1,
+                ducats=12, **kwargs),
+            IncomeEvent.objects.create(classname="IncomeEvent", season=2,
+                ducats=8, **kwargs),
+        ]
+        self.expenses = [
+            ExpenseEvent.objects.create(classname="ExpenseEvent", season=1,
+                ducats=3, type=0, area=self.area_1, **kwargs),
+            ExpenseEvent.objects.create(classname="ExpenseEvent", season=1,
+                ducats=4, type=4, area=self.area_1, **kwargs),
+            ExpenseEvent.objects.create(classname="ExpenseEvent", season=1,
+                ducats=2, type=4, area=self.area_1, **kwargs),
+        ]
+
+    def rollups(self):
+        return sorted(EconomyRollup.objects.filter(game=self.game).values_list(
+            'season', 'kind', 'type', 'ducats', 'events'))
+
+    def test_update_economy(self):
+        update_economy(IncomeEvent, self.incomes)
+        update_economy(ExpenseEvent, self.expenses[:2])
+        ## the second expense of the same type is added to the same row
+        update_economy(ExpenseEvent, self.expenses[2:])
+        self.assertEqual(self.rollups(), [(1, 0, 0, 12, 1), (1, 1, 0, 3, 1),
+            (1, 1, 4, 6, 2), (2, 0, 0, 8, 1)])
+
+    def test_series(self):
+        update_economy(IncomeEvent, self.incomes)
+        update_economy(ExpenseEvent, self.expenses)
+        series = economy.economy_series(self.game)
+        self.assertEqual(series, {self.country.pk: [
+            {'year': 1454, 'season': 1, 'income': 12, 'expense': 9,
+                'expenses': {0: 3, 4: 6}},
+            {'year': 1454, 'season': 2, 'income': 8, 'expense': 0,
+                'expenses': {}},
+        ]})
+
+    def test_rebuild(self):
+        update_economy(IncomeEvent, self.incomes)
+        update_economy(ExpenseEvent, self.expenses)
+        expected = self.rollups()
+        EconomyRollup.objects.filter(game=self.game, season=2).delete()
+        self.assertEqual(economy.rebuild_economy(self.game.pk), 4)
+        self.assertEqual(self.rollups(), expected)
+        ## collapsed rollups sum more events than the log has, and are kept
+        self.expenses[0].delete()
+        economy.rebuild_economy(self.game.pk)
+        self.assertEqual(self.rollups(), expected)
+
+    def test_command(self):
+        ## a game whose incomes are only stored in CompactEvent
+        for e in self.incomes:
+            CompactEvent.from_event(e).save()
+        BaseEvent.objects.filter(game=self.game).delete()
+        call_command('rebuild_economy', stdout=StringIO())
+        self.assertEqual(self.rollups(), [(1, 0, 0, 12, 1), (2, 0, 0, 8, 1)])
@@ -0,0 +1,50 @@
+from django.test import TestCase
+
+from condottieri_events.models import *
+from condottieri_events import heatmap
+from machiavelli.models import Game
+from condottieri_scenarios.models import Area
+
+class HeatmapTestCase(TestCase):
+
+    fixtures = ['users.yaml',
+            'settings.yaml',
+            'scenarios.yaml',
+            'games.yaml',
+            ]
+
+    def setUp(self):
+        self.game = Game.objects.get(id=1)
+        self.area_1 = Area.objects.create(setting=self.game.scenario.setting,
+                name_en = "Albacete",
+                code = "ALB")
+        self.area_2 = Area.objects.create(setting=self.game.scenario.setting,
+                name_en = "Bilbao",
+                code = "BIL")
+        for (year, season), event_class, kwargs in (
+                ((1454, 1), MovementEvent, {'type': 'A', 'origin': self.area_1,
+                    'destination': self.area_2}),
+                ((1454, 1), StandoffEvent, {'area': self.area_1}),
+                ((1454, 2), UnitEvent, {'type': 'A', 'area': self.area_2,
+                    'message': 3}),
+                ((1454, 2), DisasterEvent, {'area': self.area_2, 'message': 1})):
+            self.game.year, self.game.season = year, season
+            log_event(event_class, self.game, classname=event_class.__name__,
+                **kwargs)
+
+    def test_heatmap(self):
+        with self.assertNumQueries(1):
+            data = heatmap.heatmap(self.game)
+        self.assertEqual(data[self.area_1.pk]['moves_out'], 1)
+        self.assertEqual(data[self.area_1.pk]['standoffs'], 1)
+        self.assertEqual(data[self.area_2.pk]['moves_in'], 1)
+        self.assertEqual(data[self.area_2.pk]['sieges'], 1)
+        self.assertEqual(data[self.area_2.pk]['disasters'], 1)
+        seasons = heatmap.heatmap(self.game, per_season=True)
+        self.assertEqual(sorted(seasons[self.area_2.pk].keys()), [(1454, 1), (1454, 2)])
+
+    def test_rebuild(self):
+        before = heatmap.heatmap(self.game, per_season=True)
+        AreaActivity.objects.all().delete()
+        self.assertEqual(heatmap.rebuild_activity(self.game.pk), 3)
+        self.assertEqual(heatmap.heatmap(self.game, per_season=True), before)
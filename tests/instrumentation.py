@@ -0,0 +1,40 @@
+from django.test import SimpleTestCase
+
+from condottieri_events import instrumentation
+
+class InstrumentationTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.enabled = instrumentation.enabled
+        instrumentation.reset_stats()
+
+    def tearDown(self):
+        instrumentation.enabled = self.enabled
+        instrumentation.reset_stats()
+
+    def test_disabled(self):
+        instrumentation.enabled = False
+        handler = instrumentation.instrumented(lambda sender: sender)
+        self.assertEqual(handler(1), 1)
+        self.assertEqual(instrumentation.get_stats(), {})
+
+    def test_enabled(self):
+        instrumentation.enabled = True
+        def log_test(sender):
+            if sender is None:
+                raise ValueError
+        handler = instrumentation.instrumented(log_test)
+        handler(1)
+        self.assertRaises(ValueError, handler, None)
+        stats = instrumentation.get_stats()['handler']['log_test']
+        self.assertEqual(stats['calls'], 2)
+        self.assertEqual(stats['failures'], 1)
+        self.assertEqual(stats['queries'], 0)
+
+    def test_snapshots(self):
+        instrumentation.record('event', 'OrderEvent', 0.5, 2, False)
+        instrumentation.save_snapshot()
+        stats = instrumentation.load_snapshots()
+        self.assertEqual(stats['event']['OrderEvent']['queries'], 2)
+        instrumentation.clear_snapshots()
+        self.assertEqual(instrumentation.load_snapshots(), {})
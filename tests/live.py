@@ -0,0 +1,52 @@
+from django.test import SimpleTestCase
+
+from condottieri_events import live, views
+
+class HubTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.hub = live.Hub()
+
+    def test_publish(self):
+        subscription = self.hub.subscribe(1)
+        other = self.hub.subscribe(2)
+        self.hub.publish(1, {'id': 10})
+        self.assertEqual(subscription.get(timeout=0), {'id': 10})
+        self.assertIsNone(other.get(timeout=0))
+        self.hub.unsubscribe(subscription)
+        self.assertFalse(self.hub.has_subscribers(1))
+
+    def test_slow_subscriber(self):
+        slow = self.hub.subscribe(1, maxsize=2)
+        fast = self.hub.subscribe(1, maxsize=10)
+        for i in range(3):
+            self.hub.publish(1, {'id': i})
+        self.assertTrue(slow.closed)
+        self.assertFalse(fast.closed)
+        self.assertEqual(self.hub.get_stats()['dropped'], 1)
+        self.assertEqual(self.hub.subscriptions[1], set([fast]))
+
+    def test_stream(self):
+        subscription = live.hub.subscribe(1)
+        live.hub.publish(1, {'id': 10})
+        subscription.close()
+        stream = views.stream_events(subscription, heartbeat=0)
+        self.assertEqual(next(stream), "retry: 3000\n\n")
+        self.assertTrue(next(stream).startswith("id: 10\n"))
+        self.assertEqual(list(stream), [])
+        self.assertFalse(live.hub.has_subscribers(1))
+
+    def test_lazy_relay(self):
+        ## importing the module binds nothing
+        self.assertIsNone(live._relay)
+        bind = live.RELAY_BIND
+        live.RELAY_BIND = ('127.0.0.1', 0)
+        try:
+            relay = live.get_relay()
+            self.assertIsNotNone(relay)
+            self.assertIs(live.get_relay(), relay)
+            relay.sock.close()
+        finally:
+            live.RELAY_BIND = bind
+            live._relay = None
+        self.assertIsNone(live.get_relay())
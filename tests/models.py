@@ -1,7 +1,9 @@
 from django.test import TestCase #, override_settings
 from django.contrib.auth.models import User
+from django.utils import translation
 
 from condottieri_events.models import *
+from condottieri_events import lookups
 from machiavelli.models import Game
 from condottieri_scenarios.models import Area
 
@@ -34,3 +36,90 @@ class BaseTestCase(TestCase):
 
     def test_event_class(self):
         self.assertEqual(self.event_1.event_class(), "standoff-event")
+
+    def test_with_concrete(self):
+        area_2 = Area.objects.create(setting=self.game.scenario.setting,
+                name_en = "Bilbao",
+                code = "BIL")
+        event_2 = StandoffEvent.objects.create(game=self.game, year=0, season=0,
+                phase=0, classname="StandoffEvent", area=area_2)
+        qs = BaseEvent.objects.for_game(self.game)
+        lookups.warmup(self.game.scenario.setting)
+        with self.assertNumQueries(2):
+            events = qs.with_concrete()
+            output = [str(e) for e in events]
+        self.assertEqual([e.pk for e in events], [event_2.pk, self.event_1.pk])
+        self.assertTrue(all(isinstance(e, StandoffEvent) for e in events))
+        self.assertIn("Bilbao", output[0])
+
+    def test_rendered_html(self):
+        html = get_rendered_html([self.event_1], "en")
+        self.assertIn("Albacete", html)
+        self.assertTrue(html.startswith("<li"))
+
+    def test_rendered_store(self):
+        from condottieri_events import models as event_models
+        store = event_models.RENDER_STORE
+        event_models.RENDER_STORE = True
+        try:
+            html = get_rendered_html([self.event_1], "en-us")
+        finally:
+            event_models.RENDER_STORE = store
+        stored = RenderedEvent.objects.get(event=self.event_1)
+        self.assertEqual(stored.language, "en")
+        self.assertEqual(stored.html, html)
+        with translation.override("en-us"):
+            with self.assertNumQueries(1):
+                self.assertEqual(get_rendered_html([self.event_1]), html)
+
+    def test_render_events(self):
+        kwargs = {'game': self.game, 'year': 1454, 'season': 1, 'phase': 0}
+        area = self.area_1
+        events = [
+            self.event_1,
+            OrderEvent(type='A', origin=area, code='-', destination=area, **kwargs),
+            OrderEvent(type='F', origin=area, code='=', conversion='A', **kwargs),
+            OrderEvent(type='A', origin=area, code='S', subtype='G',
+                suborigin=area, subcode='H', **kwargs),
+            MovementEvent(type='G', origin=area, destination=area, **kwargs),
+            UnitEvent(type='A', area=area, message=4, **kwargs),
+            DisasterEvent(area=area, message=1, **kwargs),
+            ExpenseEvent(ducats=5, type=8, area=area, unit_type='F', **kwargs),
+        ]
+        with translation.override("en"):
+            expected = "".join([e.color_output() for e in events])
+            self.assertEqual(events[1].get_message(),
+                "the army in Albacete tries to go to Albacete.")
+        self.assertEqual(render_events(events, "en"), expected)
+        self.assertIn("bribe-event", expected)
+        self.assertIn("plague-event", expected)
+        self.assertIs(events[1].get_concrete(), events[1])
+
+    def test_alternate_templates(self):
+        kwargs = {'game': self.game, 'year': 1454, 'season': 1, 'phase': 0}
+        events = [self.event_1,
+            MovementEvent(type='A', origin=self.area_1, destination=self.area_1,
+                **kwargs)] * 200
+        with translation.override("en"):
+            expected = [e.color_output() for e in events[:2]] * 200
+        self.assertEqual(render_fragments(events, "en"), expected)
+
+    def test_translator(self):
+        from django.utils.translation import ugettext_lazy
+        t = Translator()
+        with translation.override("en"):
+            for i in range(200):
+                self.assertEqual(t(ugettext_lazy("%(area)s")) % {'area': i},
+                    str(i))
+                self.assertEqual(t(ugettext_lazy("%(ducats)sd")) % {'ducats': i},
+                    "%sd" % i)
+
+    def test_lookups(self):
+        lookups.clear()
+        area = self.event_1.get_area('area')
+        self.assertEqual(area.name, "Albacete")
+        with self.assertNumQueries(0):
+            self.assertIs(self.event_1.get_area('area'), area)
+        self.area_1.name_en = "Alicante"
+        self.area_1.save()
+        self.assertEqual(self.event_1.get_area('area').name, "Alicante")
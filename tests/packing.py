@@ -0,0 +1,91 @@
+import shutil
+import tempfile
+
+from django.test import TestCase
+from django.utils import translation
+
+from condottieri_events.models import *
+from condottieri_events import search, cleanup
+from condottieri_events.archive import archive_game, load_archive
+from machiavelli.models import Game
+from condottieri_scenarios.models import Area
+
+class PackedOrdersTestCase(TestCase):
+
+    fixtures = ['users.yaml',
+            'settings.yaml',
+            'scenarios.yaml',
+            'games.yaml',
+            ]
+
+    def setUp(self):
+        self.game = Game.objects.get(id=1)
+        self.area_1 = Area.objects.create(setting=self.game.scenario.setting,
+                name_en = "Albacete",
+                code = "ALB")
+        self.area_2 = Area.objects.create(setting=self.game.scenario.setting,
+                name_en = "Bilbao",
+                code = "BIL")
+        kwargs = {'game': self.game, 'year': 1454, 'season': 1, 'phase': 2,
+            'classname': 'OrderEvent'}
+        a, b = self.area_1, self.area_2
+        self.orders = [
+            OrderEvent(type='A', origin=a, code='-', destination=b, **kwargs),
+            OrderEvent(type='G', origin=a, code='B', **kwargs),
+            OrderEvent(type='F', origin=b, code='=', conversion='A', **kwargs),
+            OrderEvent(type='F', origin=b, code='C', subtype='A', suborigin=a,
+                subdestination=b, **kwargs),
+            OrderEvent(type='A', origin=a, code='S', subtype='F', suborigin=b,
+                subcode='H', **kwargs),
+            OrderEvent(type='A', origin=a, code='S', subtype='A', suborigin=b,
+                subcode='-', subdestination=a, **kwargs),
+            OrderEvent(type='A', origin=a, code='S', subtype='A', suborigin=b,
+                subcode='=', subconversion='G', **kwargs),
+        ]
+
+    def test_equivalence(self):
+        record = PackedOrders.from_orders(self.orders)
+        self.assertEqual(record.count, 7)
+        self.assertEqual(len(record.data), 1 + 7 * 14)
+        with translation.override("en"):
+            self.assertEqual([o.get_message() for o in record.orders()],
+                [o.get_message() for o in self.orders])
+
+    def test_large_ids(self):
+        self.orders[0].destination_id = 70000
+        record = PackedOrders.from_orders(self.orders[:1])
+        self.assertEqual(record.orders()[0].destination_id, 70000)
+        self.assertIsNone(record.orders()[0].suborigin_id)
+
+    def test_search(self):
+        PackedOrders.from_orders(self.orders).save()
+        found = search.search(self.game, area=self.area_2)
+        self.assertEqual(len(found), 6)
+        self.assertTrue(all(o.classname == 'OrderEvent' for o in found))
+        self.assertEqual(len(search.search(self.game, area=self.area_1,
+            kind='OrderEvent')), 6)
+        self.assertEqual(search.search(self.game, area=self.area_1,
+            kind='StandoffEvent'), [])
+
+    def test_count_and_purge(self):
+        PackedOrders.from_orders(self.orders).save()
+        self.assertEqual(count_log(self.game.pk), 7)
+        self.assertEqual(cleanup.purge_game(self.game.pk), 7)
+        self.assertFalse(PackedOrders.objects.filter(game=self.game).exists())
+        self.assertEqual(count_log(self.game.pk), 0)
+
+    def test_archive(self):
+        PackedOrders.from_orders(self.orders).save()
+        for season in (1, 3):
+            StandoffEvent.objects.create(game=self.game, year=1454,
+                season=season, phase=2, classname="StandoffEvent",
+                area=self.area_1)
+        directory = tempfile.mkdtemp()
+        try:
+            path = archive_game(self.game, directory, purge=True)
+            log = load_archive(path)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual([(e.season, e.classname) for e in log],
+            [(3, 'StandoffEvent'), (1, 'StandoffEvent')] + [(1, 'OrderEvent')] * 7)
+        self.assertEqual(count_log(self.game.pk), 0)
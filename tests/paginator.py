@@ -0,0 +1,125 @@
+from django.core.cache import caches
+from django.test import TestCase
+
+from condottieri_events.models import *
+from condottieri_events import season_cache, cleanup
+from condottieri_events.paginator import SeasonPaginator, EmptyPage
+from machiavelli.models import Game
+from condottieri_scenarios.models import Area
+
+class SeasonPaginatorTestCase(TestCase):
+
+    fixtures = ['users.yaml',
+            'settings.yaml',
+            'scenarios.yaml',
+            'games.yaml',
+            ]
+
+    def setUp(self):
+        self.game = Game.objects.get(id=1)
+        self.area_1 = Area.objects.create(setting=self.game.scenario.setting,
+                name_en = "Albacete",
+                code = "ALB")
+        events = []
+        for year, season in ((1454, 1), (1454, 3), (1455, 2)):
+            events.append(StandoffEvent.objects.create(game=self.game, year=year,
+                    season=season, phase=2, classname="StandoffEvent",
+                    area=self.area_1))
+        update_season_index(StandoffEvent, events)
+        self.paginator = SeasonPaginator(BaseEvent.objects.for_game(self.game))
+
+    def test_bounds(self):
+        self.assertEqual(self.paginator.newest_year, 1455)
+        self.assertEqual(self.paginator.newest_season, 2)
+        self.assertEqual(self.paginator.oldest_year, 1454)
+
+    def test_page(self):
+        page = self.paginator.page()
+        self.assertEqual((page.year, page.season), (1455, 2))
+        self.assertEqual(len(page.object_list), 1)
+        self.assertRaises(EmptyPage, self.paginator.page, 1456, 1)
+
+    def test_season_index(self):
+        index = SeasonIndex.objects.get(game=self.game, year=1454, season=3)
+        self.assertEqual(index.events, 1)
+        paginator = SeasonPaginator(BaseEvent.objects.for_game(self.game),
+                game=self.game)
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.newest_year, 1455)
+            self.assertEqual(paginator.oldest_year, 1454)
+            self.assertRaises(EmptyPage, paginator.validate_date, 1454, 2)
+        page = paginator.page(1455, 2)
+        self.assertFalse(page.has_previous())
+        self.assertEqual(page.next_date(), "year=1454&season=3")
+        page = paginator.page(1454, 1)
+        self.assertFalse(page.has_next())
+
+    def test_season_index_bounds(self):
+        paginator = SeasonPaginator(BaseEvent.objects.for_game(self.game),
+                game=self.game)
+        newest = paginator.page(paginator.newest_year, paginator.newest_season)
+        self.assertEqual(newest.previous_date(), '')
+        self.assertNotEqual(newest.next_date(), '')
+        oldest = paginator.page(paginator.oldest_year, paginator.oldest_season)
+        self.assertEqual(oldest.next_date(), '')
+        self.assertNotEqual(oldest.previous_date(), '')
+        self.assertIn("Albacete", newest.render("en"))
+        oldest.render("en")
+
+    def test_render_cache(self):
+        caches[season_cache.CACHE_ALIAS].clear()
+        season_cache.reset_stats()
+        paginator = SeasonPaginator(BaseEvent.objects.for_game(self.game),
+                game=self.game)
+        page = paginator.page(1455, 2)
+        html = page.render("en")
+        self.assertIn("Albacete", html)
+        self.assertEqual(page.render("en"), html)
+        self.assertEqual(season_cache.get_stats()['hits'], 1)
+        self.assertEqual(season_cache.get_stats()['misses'], 1)
+        season_cache.invalidate_season(self.game.pk, 1455, 2)
+        page.render("en")
+        self.assertEqual(season_cache.get_stats()['misses'], 2)
+
+    def test_render_cache_language(self):
+        caches[season_cache.CACHE_ALIAS].clear()
+        season_cache.reset_stats()
+        paginator = SeasonPaginator(BaseEvent.objects.for_game(self.game),
+                game=self.game)
+        page = paginator.page(1455, 2)
+        html = page.render("en-us")
+        self.assertEqual(page.render("en"), html)
+        self.assertEqual(season_cache.get_stats()['hits'], 1)
+
+    def test_render_cache_delete(self):
+        caches[season_cache.CACHE_ALIAS].clear()
+        season_cache.reset_stats()
+        paginator = SeasonPaginator(BaseEvent.objects.for_game(self.game),
+                game=self.game)
+        paginator.page(1455, 2).render("en")
+        cleanup.delete_events(BaseEvent.objects.filter(game=self.game,
+            year=1455, season=2))
+        key = season_cache.season_key(self.game.pk, 1455, 2, "en")
+        self.assertIsNone(caches[season_cache.CACHE_ALIAS].get(key))
+
+    def test_child_queryset(self):
+        paginator = SeasonPaginator(StandoffEvent.objects.filter(game=self.game))
+        page = paginator.page(1454, 3)
+        self.assertEqual(len(page.object_list), 1)
+        ## the empty seasons are skipped
+        self.assertEqual(page.next_date(), "year=1454&season=1")
+        self.assertEqual(page.previous_date(), "year=1455&season=2")
+        self.assertIn("Albacete", page.render("en"))
+
+    def test_filtered_render(self):
+        caches[season_cache.CACHE_ALIAS].clear()
+        DisasterEvent.objects.create(game=self.game, year=1455, season=2,
+                phase=2, classname="DisasterEvent", area=self.area_1, message=1)
+        paginator = SeasonPaginator(BaseEvent.objects.for_game(self.game).filter(
+                classname="StandoffEvent"), game=self.game)
+        html = paginator.page(1455, 2).render("en")
+        self.assertIn("standoff", html)
+        self.assertNotIn("plague", html)
+        paginator = SeasonPaginator(BaseEvent.objects.for_game(self.game),
+                game=self.game)
+        self.assertIn("plague", paginator.page(1455, 2).render("en"))
@@ -0,0 +1,42 @@
+from django.test import SimpleTestCase
+
+from condottieri_events import resolution
+
+class Stub(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+class ResolutionContextTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.board_area = Stub(pk=10, name="Albacete")
+        self.gamearea = Stub(pk=1, board_area=self.board_area)
+        self.unit_1 = Stub(pk=1, area_id=1, area=self.gamearea)
+        self.unit_2 = Stub(pk=2, area_id=1, area=self.gamearea)
+
+    def test_without_context(self):
+        self.assertIsNone(resolution.current_context())
+        self.assertIs(resolution.area(self.unit_1), self.board_area)
+        self.assertIsNone(resolution.board_area(None))
+
+    def test_context(self):
+        with resolution.resolution_context() as context:
+            self.assertIs(resolution.area(self.unit_1), self.board_area)
+            self.assertIs(resolution.area(self.unit_2), self.board_area)
+            self.assertEqual(context.misses['area'], 1)
+            self.assertEqual(context.hits['area'], 1)
+        self.assertIsNone(resolution.current_context())
+        self.assertEqual(resolution.get_last_stats()['queries_saved'], 2)
+
+    def test_game_saved(self):
+        game = Stub(pk=1, year=1454, season=1, phase=2)
+        player = Stub(pk=1, game_id=1, game=game)
+        with resolution.resolution_context():
+            self.assertIs(resolution.game(player), game)
+            ## the game is saved in the next season by another instance
+            live = Stub(pk=1, year=1454, season=2, phase=0)
+            resolution.game_saved(sender=None, instance=live)
+            self.assertEqual(resolution.game(player).season, 2)
+            self.assertIs(resolution.game(player), live)
+        resolution.game_saved(sender=None, instance=game)
+        self.assertIs(resolution.game(player), game)
@@ -0,0 +1,81 @@
+from django.test import TestCase
+
+from condottieri_events.models import *
+from condottieri_events import retention, cleanup
+from machiavelli.models import Game
+from condottieri_scenarios.models import Area, Country
+
+class RetentionTestCase(TestCase):
+
+    fixtures = ['users.yaml',
+            'settings.yaml',
+            'scenarios.yaml',
+            'games.yaml',
+            ]
+
+    def setUp(self):
+        self.game = Game.objects.get(id=1)
+        self.area_1 = Area.objects.create(setting=self.game.scenario.setting,
+                name_en = "Albacete",
+                code = "ALB")
+        kwargs = {'game': self.game, 'year': 1454, 'season': 1, 'phase': 2}
+        self.standoff = StandoffEvent.objects.create(classname="StandoffEvent",
+                area=self.area_1, **kwargs)
+        self.unit = UnitEvent.objects.create(classname="UnitEvent", type='A',
+                area=self.area_1, message=2, **kwargs)
+        update_season_index(BaseEvent, [self.standoff, self.unit])
+
+    def test_policy(self):
+        self.assertRaises(ValueError, retention.get_policy,
+            {'OrderEvent': ('collapse', 1)})
+        self.assertRaises(ValueError, retention.get_policy,
+            {'OrderEvent': ('archive', 1)})
+        self.assertEqual(retention.get_policy({'OrderEvent': ('keep', 0)}), [])
+
+    def test_apply_policy(self):
+        policy = {'UnitEvent': ('drop', 30), 'StandoffEvent': ('keep', 0)}
+        report = retention.apply_policy(policy, dry_run=True)
+        self.assertEqual(report['drop']['rows'], 1)
+        self.assertTrue(UnitEvent.objects.exists())
+        report = retention.apply_policy(policy)
+        self.assertEqual(report['drop']['classes'], {'UnitEvent': 1})
+        self.assertTrue(report['drop']['bytes'] > 0)
+        self.assertFalse(UnitEvent.objects.exists())
+        self.assertTrue(StandoffEvent.objects.exists())
+        self.assertEqual(SeasonIndex.objects.get(game=self.game).events, 1)
+        ## the board can still be reconstructed without the unit events
+        self.assertTrue(BoardCheckpoint.objects.filter(game=self.game,
+            year=1454, season=1).exists())
+
+    def test_interrupted_drop(self):
+        ## a run that stops before rebuilding the index leaves the counts right
+        cleanup.delete_events(UnitEvent.objects.filter(game=self.game))
+        index = SeasonIndex.objects.get(game=self.game)
+        self.assertEqual(index.events, 1)
+
+    def test_drop_all_storages(self):
+        CompactEvent.from_event(self.unit).save()
+        PackedOrders.from_orders([OrderEvent(game=self.game, year=1454,
+            season=1, phase=0, type='A', origin=self.area_1, code='H')]).save()
+        policy = {'UnitEvent': ('drop', 30), 'OrderEvent': ('drop', 30)}
+        report = retention.apply_policy(policy, dry_run=True)
+        self.assertEqual(report['drop']['classes'],
+            {'UnitEvent': 2, 'OrderEvent': 1})
+        retention.apply_policy(policy)
+        self.assertFalse(UnitEvent.objects.exists())
+        self.assertFalse(CompactEvent.objects.filter(game=self.game).exists())
+        self.assertFalse(PackedOrders.objects.filter(game=self.game).exists())
+
+    def test_collapse_partial_rollups(self):
+        country = Country.objects.create(setting=self.game.scenario.setting,
+                name_en="Spain", static_name="spain")
+        kwargs = {'game': self.game, 'year': 1454, 'phase': 0,
+            'classname': 'IncomeEvent', 'country': country, 'ducats': 10}
+        first = IncomeEvent.objects.create(season=1, **kwargs)
+        IncomeEvent.objects.create(season=2, **kwargs)
+        ## only the first season was summarized
+        update_economy(IncomeEvent, [first])
+        retention.apply_policy({'IncomeEvent': ('collapse', 30)})
+        self.assertFalse(IncomeEvent.objects.exists())
+        self.assertEqual(sorted(EconomyRollup.objects.filter(game=self.game).values_list(
+            'season', 'ducats', 'events')), [(1, 10, 1), (2, 10, 1)])
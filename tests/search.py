@@ -0,0 +1,48 @@
+from django.test import TestCase
+
+from condottieri_events.models import *
+from condottieri_events import search
+from machiavelli.models import Game
+from condottieri_scenarios.models import Area
+
+class SearchTestCase(TestCase):
+
+    fixtures = ['users.yaml',
+            'settings.yaml',
+            'scenarios.yaml',
+            'games.yaml',
+            ]
+
+    def setUp(self):
+        self.game = Game.objects.get(id=1)
+        self.area_1 = Area.objects.create(setting=self.game.scenario.setting,
+                name_en = "Albacete",
+                code = "ALB")
+        self.area_2 = Area.objects.create(setting=self.game.scenario.setting,
+                name_en = "Bilbao",
+                code = "BIL")
+        for (year, season), event_class, kwargs in (
+                ((1455, 1), StandoffEvent, {'area': self.area_1}),
+                ((1454, 2), MovementEvent, {'type': 'A', 'origin': self.area_1,
+                    'destination': self.area_2}),
+                ((1454, 3), UnitEvent, {'type': 'A', 'area': self.area_2,
+                    'message': 4})):
+            self.game.year, self.game.season = year, season
+            log_event(event_class, self.game, classname=event_class.__name__,
+                **kwargs)
+
+    def test_search(self):
+        self.assertEqual([e.classname for e in search.search(self.game, area=self.area_1)],
+            ['MovementEvent', 'StandoffEvent'])
+        self.assertEqual([e.classname for e in search.search(self.game,
+            area=self.area_2, kind='UnitEvent', message=4)], ['UnitEvent'])
+        self.assertEqual(search.search(self.game, area=self.area_1,
+            kind='UnitEvent'), [])
+        self.assertRaises(ValueError, search.search, self.game)
+
+    def test_rebuild(self):
+        SearchEntry.objects.all().delete()
+        self.assertEqual(search.rebuild_game(self.game.pk), 3)
+        self.assertEqual(len(search.search(self.game, kind='MovementEvent')), 1)
+        StandoffEvent.objects.all().delete()
+        self.assertEqual(len(search.search(self.game, area=self.area_1.pk)), 1)
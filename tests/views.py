@@ -0,0 +1,105 @@
+import json
+
+from django.test import TestCase, RequestFactory
+from django.utils import translation
+
+from condottieri_events.models import *
+from condottieri_events.views import event_feed, event_export
+from condottieri_events import export
+from machiavelli.models import Game
+from condottieri_scenarios.models import Area
+
+class EventFeedTestCase(TestCase):
+
+    fixtures = ['users.yaml',
+            'settings.yaml',
+            'scenarios.yaml',
+            'games.yaml',
+            ]
+
+    def setUp(self):
+        self.game = Game.objects.get(id=1)
+        self.area_1 = Area.objects.create(setting=self.game.scenario.setting,
+                name_en = "Albacete",
+                code = "ALB")
+        self.events = [StandoffEvent.objects.create(game=self.game, year=year,
+                season=season, phase=2, classname="StandoffEvent",
+                area=self.area_1)
+                for year, season in ((1454, 1), (1454, 3), (1455, 2))]
+        self.factory = RequestFactory()
+
+    def test_keyset_pagination(self):
+        response = event_feed(self.factory.get('/', {'limit': 2}), self.game.pk)
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual([e['id'] for e in data['events']],
+                [self.events[2].pk, self.events[1].pk])
+        self.assertEqual(data['events'][0]['fields']['area'], "Albacete")
+        response = event_feed(self.factory.get('/', {'limit': 2,
+                'before': data['next']}), self.game.pk)
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual([e['id'] for e in data['events']], [self.events[0].pk])
+        self.assertIsNone(data['next'])
+
+    def test_not_modified(self):
+        response = event_feed(self.factory.get('/'), self.game.pk)
+        etag = response['ETag']
+        ## the events have no timestamp, so only the ETag is sent
+        self.assertFalse(response.has_header('Last-Modified'))
+        response = event_feed(self.factory.get('/', HTTP_IF_NONE_MATCH=etag),
+                self.game.pk)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes(self):
+        with translation.override("en"):
+            etag = event_feed(self.factory.get('/'), self.game.pk)['ETag']
+        with translation.override("es"):
+            response = event_feed(self.factory.get('/', HTTP_IF_NONE_MATCH=etag),
+                    self.game.pk)
+        self.assertEqual(response.status_code, 200)
+        ## deleting an old event changes the ETag too
+        self.events[0].delete()
+        with translation.override("en"):
+            response = event_feed(self.factory.get('/', HTTP_IF_NONE_MATCH=etag),
+                    self.game.pk)
+        self.assertEqual(response.status_code, 200)
+
+    def test_packed_orders(self):
+        kwargs = {'game': self.game, 'year': 1454, 'season': 1, 'phase': 0,
+            'classname': 'OrderEvent'}
+        PackedOrders.from_orders([
+            OrderEvent(type='A', origin=self.area_1, code='H', **kwargs),
+            OrderEvent(type='G', origin=self.area_1, code='B', **kwargs),
+        ]).save()
+        classnames = []
+        cursor = None
+        while True:
+            params = {'limit': 2}
+            if cursor:
+                params['before'] = cursor
+            response = event_feed(self.factory.get('/', params), self.game.pk)
+            data = json.loads(response.content.decode('utf-8'))
+            classnames.extend([(e['season'], e['classname'], e['fields']['code'])
+                    if e['classname'] == 'OrderEvent' else (e['season'], e['classname'])
+                    for e in data['events']])
+            cursor = data['next']
+            if cursor is None:
+                break
+        self.assertEqual(classnames, [(2, 'StandoffEvent'), (3, 'StandoffEvent'),
+                (1, 'StandoffEvent'), (1, 'OrderEvent', 'B'),
+                (1, 'OrderEvent', 'H')])
+
+    def test_export(self):
+        response = event_export(self.factory.get('/', {'format': 'text',
+                'download': 1}), self.game.pk)
+        self.assertIn('attachment', response['Content-Disposition'])
+        text = b"".join(response.streaming_content).decode('utf-8')
+        self.assertEqual(text.count("Albacete"), 3)
+        response = event_export(self.factory.get('/'), self.game.pk)
+        html = b"".join(response.streaming_content).decode('utf-8')
+        self.assertEqual(html.count("<h2>"), 3)
+        self.assertTrue(html.index("1455") < html.index("1454"))
+
+    def test_export_chunks(self):
+        seasons = list(export.iter_seasons(self.game, chunk_size=2))
+        self.assertEqual([(y, s, len(e)) for y, s, e in seasons],
+                [(1455, 2, 1), (1454, 3, 1), (1454, 1, 1)])
@@ -0,0 +1,146 @@
+import pickle
+
+from django.db import IntegrityError
+from django.test import TestCase, TransactionTestCase
+
+from condottieri_events.models import *
+from condottieri_events.writer import event_batch, current_batch
+from condottieri_events.async_writer import (AsyncEventWriter,
+    describe_event, build_event)
+from machiavelli.models import Game
+from condottieri_scenarios.models import Area
+
+class EventBatchTestCase(TestCase):
+
+    fixtures = ['users.yaml',
+            'settings.yaml',
+            'scenarios.yaml',
+            'games.yaml',
+            ]
+
+    def setUp(self):
+        self.game = Game.objects.get(id=1)
+        self.area_1 = Area.objects.create(setting=self.game.scenario.setting,
+                name_en = "Albacete",
+                code = "ALB")
+
+    def test_log_event_without_batch(self):
+        log_event(StandoffEvent, self.game, classname="StandoffEvent",
+                area=self.area_1)
+        self.assertEqual(StandoffEvent.objects.count(), 1)
+
+    def test_log_event_in_batch(self):
+        with event_batch() as batch:
+            for i in range(3):
+                log_event(StandoffEvent, self.game, classname="StandoffEvent",
+                        area=self.area_1)
+            self.assertEqual(len(batch), 3)
+            self.assertEqual(StandoffEvent.objects.count(), 0)
+            batch.flush()
+            self.assertEqual(StandoffEvent.objects.count(), 3)
+            self.assertEqual(BaseEvent.objects.count(), 3)
+        self.assertIsNone(current_batch())
+
+    def test_batch_discarded_on_error(self):
+        try:
+            with event_batch():
+                log_event(StandoffEvent, self.game, classname="StandoffEvent",
+                        area=self.area_1)
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(StandoffEvent.objects.count(), 0)
+
+class AsyncEventWriterTestCase(TestCase):
+
+    fixtures = ['users.yaml',
+            'settings.yaml',
+            'scenarios.yaml',
+            'games.yaml',
+            ]
+
+    def setUp(self):
+        self.game = Game.objects.get(id=1)
+        self.area_1 = Area.objects.create(setting=self.game.scenario.setting,
+                name_en = "Albacete",
+                code = "ALB")
+
+    def test_describe_event(self):
+        description = describe_event(StandoffEvent, self.game,
+                classname="StandoffEvent", area=self.area_1)
+        self.assertEqual(pickle.loads(pickle.dumps(description)), description)
+        event = build_event(description)
+        self.assertIsInstance(event, StandoffEvent)
+        self.assertEqual(event.area_id, self.area_1.pk)
+        self.assertEqual(event.year, self.game.year)
+
+    def test_full_queue(self):
+        async_writer = AsyncEventWriter(maxsize=1, workers=0)
+        description = describe_event(StandoffEvent, self.game,
+                classname="StandoffEvent", area=self.area_1)
+        self.assertTrue(async_writer.submit(description))
+        self.assertFalse(async_writer.submit(description))
+        self.assertEqual(async_writer.get_stats()['dropped'], 1)
+
+class EventBatchErrorTestCase(TransactionTestCase):
+
+    fixtures = ['users.yaml',
+            'settings.yaml',
+            'scenarios.yaml',
+            'games.yaml',
+            ]
+
+    def setUp(self):
+        self.game = Game.objects.get(id=1)
+        self.area_1 = Area.objects.create(setting=self.game.scenario.setting,
+                name_en = "Albacete",
+                code = "ALB")
+
+    def invalid_event(self):
+        ## the year cannot be null
+        return StandoffEvent(game=self.game, year=None, season=1, phase=0,
+                classname="StandoffEvent", area=self.area_1)
+
+    def test_errors_are_logged(self):
+        with self.assertLogs('condottieri_events.writer', 'ERROR'):
+            with event_batch() as batch:
+                batch.add(self.invalid_event())
+        self.assertIsNone(current_batch())
+        self.assertFalse(StandoffEvent.objects.exists())
+
+    def test_errors_are_raised(self):
+        with self.assertRaises(IntegrityError):
+            with event_batch(raise_errors=True) as batch:
+                batch.add(self.invalid_event())
+        self.assertIsNone(current_batch())
+
+class AsyncEventWriterThreadTestCase(TransactionTestCase):
+
+    fixtures = ['users.yaml',
+            'settings.yaml',
+            'scenarios.yaml',
+            'games.yaml',
+            ]
+
+    def setUp(self):
+        self.game = Game.objects.get(id=1)
+        self.area_1 = Area.objects.create(setting=self.game.scenario.setting,
+                name_en = "Albacete",
+                code = "ALB")
+        self.async_writer = AsyncEventWriter(workers=1, batch_size=2)
+
+    def tearDown(self):
+        self.async_writer.shutdown()
+
+    def test_flush(self):
+        description = describe_event(StandoffEvent, self.game,
+                classname="StandoffEvent", area=self.area_1)
+        for i in range(5):
+            self.assertTrue(self.async_writer.submit(description))
+        self.async_writer.flush()
+        self.assertEqual(self.async_writer.queue.unfinished_tasks, 0)
+        self.assertEqual(StandoffEvent.objects.filter(game=self.game).count(), 5)
+        stats = self.async_writer.get_stats()
+        self.assertEqual(stats['queued'], 5)
+        self.assertEqual(stats['written'], 5)
+        self.assertEqual(stats['errors'], 0)
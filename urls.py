@@ -0,0 +1,9 @@
+from django.conf.urls import url
+
+from condottieri_events import views
+
+urlpatterns = [
+	url(r'^(?P<game_id>\d+)/feed/$', views.event_feed, name='events-feed'),
+	url(r'^(?P<game_id>\d+)/stream/$', views.event_stream, name='events-stream'),
+	url(r'^(?P<game_id>\d+)/export/$', views.event_export, name='events-export'),
+]
@@ -1 +1,227 @@
-# Create your views here.
+## Copyright (c) 2010 by Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+## This program is free software: you can redistribute it and/or modify it
+## under the terms of the GNU Affero General Public License as published by the
+## Free Software Foundation, either version 3 of the License, or (at your option
+## any later version.
+##
+## This program is distributed in the hope that it will be useful, but WITHOUT
+## ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+## FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+## for more details.
+##
+## You should have received a copy of the GNU Affero General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/agpl.txt>.
+##
+## This license is also included in the file COPYING
+##
+## AUTHOR: Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+
+""" Views of the events application. """
+
+import heapq
+from itertools import islice
+import json
+import time
+
+from django.db.models import Q
+from django.http import JsonResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import translation
+from django.views.decorators.http import condition, require_GET
+
+import machiavelli.models as machiavelli
+import condottieri_scenarios.models as scenarios
+
+import condottieri_events.models as events
+from condottieri_events import live
+from condottieri_events import export
+
+FEED_LIMIT = 50
+FEED_MAX_LIMIT = 200
+
+def serialize_event(event):
+	""" Returns a dict with the data of a concrete or compact event """
+	compact = isinstance(event, events.CompactEvent)
+	pk = event.pk
+	event = event.get_concrete()
+	fields = {}
+	for f in event._meta.local_concrete_fields:
+		if f.primary_key:
+			continue
+		fields[f.attname] = getattr(event, f.attname)
+		if f.is_relation:
+			if f.related_model is scenarios.Area:
+				area = event.get_area(f.name)
+				fields[f.name] = area and area.name
+			elif f.related_model is scenarios.Country:
+				country = event.get_country()
+				fields[f.name] = country and country.name
+	return {
+		'id': pk,
+		'compact': compact,
+		'classname': event.classname,
+		'year': event.year,
+		'season': event.season,
+		'phase': event.phase,
+		'event_class': event.event_class(),
+		'text': str(event),
+		'fields': fields,
+	}
+
+def parse_cursor(cursor):
+	""" Returns the log key (see models.log_key) in a cursor like 1454-3-1020,
+	or 1454-3-c1020 for a compact event. Packed orders have cursors like
+	1454-3-p20.4 (record 20, fifth order) and keys that sort before the
+	other events of their season. """
+	try:
+		year, season, pk = cursor.split('-')
+		if pk.startswith('p'):
+			record, index = pk[1:].split('.')
+			return int(year), int(season), -1, int(record), int(index)
+		compact = pk.startswith('c')
+		if compact:
+			pk = pk[1:]
+		return int(year), int(season), 0 if compact else 1, int(pk)
+	except ValueError:
+		return None
+
+def format_cursor(key):
+	if key[2] == -1:
+		return "%s-%s-p%s.%s" % (key[0], key[1], key[3], key[4])
+	year, season, rank, pk = key
+	return "%s-%s-%s%s" % (year, season, 'c' if rank == 0 else '', pk)
+
+def iter_packed(game_id, after=None):
+	""" Yields (key, order) for the packed orders of a game, newest first,
+	past the key after """
+	records = events.PackedOrders.objects.filter(game__id=game_id).order_by(
+		'-year', '-season', '-id')
+	if after is not None:
+		records = records.filter(Q(year__lt=after[0]) |
+			Q(year=after[0], season__lte=after[1]))
+	for record in records.iterator():
+		orders = record.orders()
+		for i in reversed(range(len(orders))):
+			key = (record.year, record.season, -1, record.pk, i)
+			if after is None or key < after:
+				yield key, orders[i]
+
+def iter_feed(game_id, after=None, chunk_size=FEED_LIMIT):
+	""" Yields (key, event) for the events of a game, newest first, with its
+	packed orders as the oldest events of each season """
+	log = ((events.log_key(e), e) for e in events.iter_log(game_id,
+		newest_first=True, after=after and after[:4], chunk_size=chunk_size))
+	return heapq.merge(log, iter_packed(game_id, after), key=lambda p: p[0],
+		reverse=True)
+
+def latest_event_id(request, game_id):
+	""" Returns the cursor of the newest event of the game, reading the
+	(game, year, season, id) indexes """
+	latest = next(iter_feed(game_id, chunk_size=1), None)
+	if latest is None:
+		return 0
+	return format_cursor(latest[0])
+
+def feed_etag(request, game_id):
+	"""
+Returns the ETag of a page of the feed. Besides the newest event, it holds
+the number of events in each storage, which changes when events are deleted,
+compacted or packed, and the language of the texts.
+	"""
+	counts = (events.BaseEvent.objects.filter(game__id=game_id).count(),
+		events.CompactEvent.objects.filter(game__id=game_id).count(),
+		events.PackedOrders.objects.filter(game__id=game_id).count())
+	return "%s-%s-%s-%s-%s" % (latest_event_id(request, game_id),
+		".".join([str(n) for n in counts]), events.render_language(),
+		request.GET.get('before', ''), request.GET.get('limit', ''))
+
+@require_GET
+@condition(etag_func=feed_etag)
+def event_feed(request, game_id):
+	"""
+Returns the events of a game as json, newest first, including its packed
+orders. The list is paginated by keys: the 'next' cursor of a response must
+be passed as the 'before' parameter of the next request.
+	"""
+	game = get_object_or_404(machiavelli.Game, pk=game_id)
+	try:
+		limit = min(int(request.GET.get('limit', FEED_LIMIT)), FEED_MAX_LIMIT)
+	except ValueError:
+		return HttpResponseBadRequest("limit must be an integer")
+	if limit <= 0:
+		return HttpResponseBadRequest("limit must be positive")
+	cursor = None
+	before = request.GET.get('before', None)
+	if before:
+		cursor = parse_cursor(before)
+		if cursor is None:
+			return HttpResponseBadRequest("invalid cursor")
+	page = list(islice(iter_feed(game.pk, after=cursor, chunk_size=limit + 1),
+		limit + 1))
+	has_more = len(page) > limit
+	page = page[:limit]
+	data = {
+		'game': game.pk,
+		'events': [serialize_event(e) for key, e in page],
+		'next': None,
+	}
+	if has_more:
+		data['next'] = format_cursor(page[-1][0])
+	return JsonResponse(data)
+
+## seconds between keep-alive comments in the event stream
+STREAM_HEARTBEAT = 15
+## seconds after which the client must reconnect
+STREAM_DURATION = 300
+
+def stream_events(subscription, heartbeat=STREAM_HEARTBEAT, duration=STREAM_DURATION):
+	""" Yields the messages of a subscription as server-sent events """
+	end = time.time() + duration
+	try:
+		yield "retry: 3000\n\n"
+		while time.time() < end:
+			message = subscription.get(timeout=heartbeat)
+			if message is None:
+				if subscription.closed:
+					break
+				yield ": keep-alive\n\n"
+				continue
+			yield "id: %s\ndata: %s\n\n" % (message['id'], json.dumps(message))
+	finally:
+		live.hub.unsubscribe(subscription)
+
+@require_GET
+def event_stream(request, game_id):
+	"""
+Streams the new events of a game as server-sent events, as they are logged.
+	"""
+	game = get_object_or_404(machiavelli.Game, pk=game_id)
+	## the events published by other processes arrive through the relay
+	live.get_relay()
+	subscription = live.hub.subscribe(game.pk)
+	response = StreamingHttpResponse(stream_events(subscription),
+		content_type='text/event-stream')
+	response['Cache-Control'] = 'no-cache'
+	response['X-Accel-Buffering'] = 'no'
+	return response
+
+@require_GET
+def event_export(request, game_id):
+	"""
+Streams the whole log of a game, as html or, with format=text, as plain text.
+With download=1 the log is sent as an attachment.
+	"""
+	game = get_object_or_404(machiavelli.Game, pk=game_id)
+	## the language must be read now, not while the response is streamed
+	language = translation.get_language()
+	if request.GET.get('format', 'html') == 'text':
+		content = export.iter_text(game, language)
+		content_type, extension = 'text/plain; charset=utf-8', 'txt'
+	else:
+		content = export.iter_html(game, language)
+		content_type, extension = 'text/html; charset=utf-8', 'html'
+	response = StreamingHttpResponse(content, content_type=content_type)
+	if request.GET.get('download'):
+		response['Content-Disposition'] = 'attachment; filename="game-%s.%s"' % (
+			game.pk, extension)
+	return response
@@ -0,0 +1,170 @@
+## Copyright (c) 2010 by Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+## This program is free software: you can redistribute it and/or modify it
+## under the terms of the GNU Affero General Public License as published by the
+## Free Software Foundation, either version 3 of the License, or (at your option
+## any later version.
+##
+## This program is distributed in the hope that it will be useful, but WITHOUT
+## ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+## FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+## for more details.
+##
+## You should have received a copy of the GNU Affero General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/agpl.txt>.
+##
+## This license is also included in the file COPYING
+##
+## AUTHOR: Jose Antonio Martin <jantonio.martin AT gmail DOT com>
+
+""" This module defines a buffered writer for game events.
+
+While a batch is open, ``log_event`` does not save the events one by one.
+They are collected, grouped by their concrete class and written with bulk
+inserts when the batch is closed, or when the surrounding transaction
+commits. Typical usage, while resolving a phase::
+
+	with event_batch():
+		game.process_orders()
+
+When no batch is open, events are saved as usual.
+
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+
+from django.db import connections, router, transaction
+
+from condottieri_events.signals import events_saved
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+def current_batch():
+	""" Returns the batch that is open in this thread, or None """
+	return getattr(_local, 'batch', None)
+
+def save_event(event):
+	""" Saves a single event, without batching, and notifies it. """
+	event.save()
+	events_saved.send(sender=event.__class__, events=[event])
+
+class EventBatch(object):
+	"""
+EventBatch collects the events that are logged while it is open and writes
+them in as few queries as possible.
+
+Like log_event, a batch that is closed logs the errors of its writes and
+does not raise them, so that the game processing goes on. With
+raise_errors=True the errors are raised instead. An explicit call to flush
+always raises.
+	"""
+	def __init__(self, using=None, raise_errors=False):
+		self.using = using
+		self.raise_errors = raise_errors
+		self.events = []
+		self.depth = 0
+
+	def __len__(self):
+		return len(self.events)
+
+	def add(self, event):
+		""" Adds an unsaved event to the batch """
+		self.events.append(event)
+
+	def discard(self):
+		self.events = []
+
+	def flush(self):
+		""" Writes all the pending events and empties the batch """
+		events, self.events = self.events, []
+		if not events:
+			return
+		groups = OrderedDict()
+		for e in events:
+			groups.setdefault(e.__class__, []).append(e)
+		using = self.using or router.db_for_write(events[0].__class__)
+		with transaction.atomic(using=using):
+			for model, objs in groups.items():
+				self._write(model, objs, using)
+			for model, objs in groups.items():
+				events_saved.send(sender=model, events=objs)
+
+	def _close(self):
+		""" Flushes the batch when it is closed """
+		count = len(self.events)
+		try:
+			self.flush()
+		except Exception:
+			if self.raise_errors:
+				raise
+			logger.exception("Could not write %s events", count)
+
+	def _write(self, model, objs, using):
+		""" Inserts the events of a concrete class """
+		parents = model._meta.get_parent_list()
+		connection = connections[using]
+		if not parents:
+			if connection.features.can_return_ids_from_bulk_insert:
+				model._base_manager.using(using).bulk_create(objs)
+			else:
+				for obj in objs:
+					obj.save(using=using)
+			return
+		if len(parents) != 1 or not \
+			connection.features.can_return_ids_from_bulk_insert:
+			## the database cannot tell us the ids of the parent rows, so
+			## we save the events one by one inside the transaction
+			for obj in objs:
+				obj.save(using=using)
+			return
+		parent = parents[0]
+		link = model._meta.get_ancestor_link(parent)
+		parent_fields = parent._meta.local_concrete_fields
+		rows = []
+		for obj in objs:
+			row = parent(**dict((f.attname, getattr(obj, f.attname))
+				for f in parent_fields if not f.primary_key))
+			rows.append(row)
+		parent._base_manager.using(using).bulk_create(rows)
+		for obj, row in zip(objs, rows):
+			setattr(obj, parent._meta.pk.attname, row.pk)
+			setattr(obj, link.attname, row.pk)
+			obj._state.adding = False
+			obj._state.db = using
+		fields = [f for f in model._meta.local_concrete_fields]
+		model._base_manager._insert(objs, fields=fields, using=using)
+
+	def __enter__(self):
+		self.depth += 1
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.depth -= 1
+		if self.depth > 0:
+			return False
+		_local.batch = None
+		if exc_type is not None:
+			self.discard()
+			return False
+		using = self.using
+		connection = transaction.get_connection(using)
+		if connection.in_atomic_block:
+			transaction.on_commit(self._close, using=using)
+		else:
+			self._close()
+		return False
+
+def event_batch(using=None, raise_errors=False):
+	"""
+Returns a context manager that buffers the events logged in this thread.
+Nested calls reuse the batch that is already open. See EventBatch for
+raise_errors.
+	"""
+	batch = current_batch()
+	if batch is None:
+		batch = EventBatch(using=using, raise_errors=raise_errors)
+		_local.batch = batch
+	return batch